@@ -0,0 +1,53 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from starlette import status
+from .config import admin_dependency
+from . import metrics, profiling
+from .scheduler import scheduler
+from database.database import engine, async_engine, pool_settings
+from database import pool
+from database.replicas import replica_set
+
+admin = APIRouter()
+
+
+
+@admin.get("/metrics", status_code=status.HTTP_200_OK)
+async def get_metrics(user: admin_dependency):
+    return metrics.snapshot()
+
+
+
+@admin.get("/metrics/prometheus", status_code=status.HTTP_200_OK, response_class=PlainTextResponse)
+async def get_prometheus_metrics(user: admin_dependency):
+    return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+
+
+@admin.get("/profiles/{profile_id}", status_code=status.HTTP_200_OK, response_class=PlainTextResponse)
+async def get_profile(profile_id: str, user: admin_dependency):
+    report = profiling.reports.get(profile_id)
+    if report is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return report
+
+
+
+@admin.get("/database/pool", status_code=status.HTTP_200_OK)
+async def get_pool_status(user: admin_dependency):
+    engines = {"primary": engine}
+    if async_engine is not None:
+        engines["primary_async"] = async_engine.sync_engine
+    for replica in replica_set.replicas:
+        engines[replica.name] = replica.sync_engine
+
+    return {
+        "settings": pool_settings.model_dump(),
+        "engines": {name: pool.status(item) for name, item in engines.items()}
+    }
+
+
+
+@admin.get("/maintenance", status_code=status.HTTP_200_OK)
+async def get_maintenance_status(user: admin_dependency):
+    return scheduler.status()
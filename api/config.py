@@ -1,19 +1,24 @@
 import os
-import smtplib
+import math
+import time
 import random
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request, Response, Header
 from starlette import status
 from typing import Annotated
-from passlib.context import CryptContext
 from dotenv import load_dotenv
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordBearer
+from fastapi.security.utils import get_authorization_scheme_param
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
-from database.database import begin
+from database.database import begin, async_begin, ASYNC_DATABASE, SyncSession
+from database.replicas import replica_set
 from database.model_db import User
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from .hashing import hashed, hash_password, verify_password
+from .mailer import outbox
+from .token_cache import token_cache
+from . import profiling
 
 
 load_dotenv()
@@ -21,29 +26,34 @@ load_dotenv()
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
-SCHEME = os.getenv("SCHEME")
-SENDER_EMAIL = os.getenv("SENDER_EMAIL")
-SENDER_PASSWORD = os.getenv("SENDER_PASSWORD")
+BULK_TODO_LIMIT = int(os.getenv("BULK_TODO_LIMIT", "500"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+IMPORT_ATOMIC = os.getenv("IMPORT_ATOMIC", "false").lower() in ("1", "true", "yes")
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
 
 
-def get_db():
-    db = begin()
+async def get_db():
+    if ASYNC_DATABASE:
+        async with async_begin() as db:
+            yield db
+        return
+
+    db = SyncSession(begin())
     try:
         yield db
     finally:
-        db.close()
-
+        await db.close()
 
-db_dependency = Annotated[Session, Depends(get_db)]
 
-hashed = CryptContext(schemes=[SCHEME])
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
 
-def authorization(username: str, password: str, db):
-    user = db.query(User).filter(User.username == username).first()
+async def authorization(username: str, password: str, db):
+    user = await db.scalar(select(User).where(User.username == username).where(User.deleted_at.is_(None)))
     if not user:
         return False
-    password = hashed.verify(password, user.password)
+    password = await verify_password(password, user.password)
     if not password:
         return False
     return user
@@ -55,19 +65,36 @@ Algorithm = ALGORITHM
 
 
 def authentication(role: str, user_id: str, expiring):
-    encode = {'sub': role, 'id': user_id}
+    # Millisecond iat, truncated so it never reads later than the revocation that follows it.
+    encode = {'sub': role, 'id': user_id, 'iat': int(time.time() * 1000) / 1000}
     expired = datetime.now() + expiring
     encode.update({'exp': expired})
-    return jwt.encode(encode, SECRET, algorithm=Algorithm)
+    with profiling.section("jwt"):
+        return jwt.encode(encode, SECRET, algorithm=Algorithm)
 
 
 bearer = OAuth2PasswordBearer(tokenUrl="user/login")
 otp_bearer = OAuth2PasswordBearer(tokenUrl="user/verify-otp")
 
 
+async def decode_token(token: str):
+    payload = token_cache.get(token)
+    if payload is None:
+        with profiling.section("jwt"):
+            payload = jwt.decode(token, SECRET, algorithms=[Algorithm])
+        token_cache.put(token, payload)
+    if await token_cache.is_revoked(payload):
+        raise JWTError("Token was issued before the user's sessions were revoked")
+    return payload
+
+
+async def revoke_sessions(user_id: str):
+    await token_cache.revoke_user(user_id)
+
+
 async def get_user(token: Annotated[str, Depends(bearer)]):
     try:
-        payload = jwt.decode(token, SECRET, algorithms=[Algorithm])
+        payload = await decode_token(token)
         role: str = payload.get("sub")
         user_id: int = payload.get("id")
         if role is None or user_id is None:
@@ -82,41 +109,37 @@ async def get_user(token: Annotated[str, Depends(bearer)]):
                             detail="Timeout session expired!")
 
 
+async def get_stream_user(authorization: Annotated[str | None, Header()] = None, token: str | None = None):
+    # EventSource and browser WebSockets cannot set headers, so the JWT may also come as ?token=.
+    scheme, credentials = get_authorization_scheme_param(authorization)
+    if scheme.lower() == "bearer":
+        token = credentials
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    return await get_user(token)
+
+
 def otp_authentication(user_id: str):
-    encode = {'id': user_id}
+    encode = {'id': user_id, 'iat': int(time.time() * 1000) / 1000}
     expiring = datetime.now() + timedelta(minutes=15)
     encode.update({'exp': expiring})
-    return jwt.encode(encode, SECRET, algorithm=Algorithm)
+    with profiling.section("jwt"):
+        return jwt.encode(encode, SECRET, algorithm=Algorithm)
 
 
 async def otp_token_verification(token: Annotated[str, Depends(otp_bearer)]):
     try:
-        payload = jwt.decode(token, SECRET, algorithms=[Algorithm])
+        payload = await decode_token(token)
         user_id: int = payload.get("id")
         if user_id is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
         return {"user_id": user_id}
     except JWTError as e:
-        raise HTTPException(status_code=status.HTTP_400_UNAUTHORIZED, detail="Timeout session expired!")
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Timeout session expired!")
     
 
 def send_email(user_email, subject, body):
-    smtp_server = "smtp.gmail.com"
-    smtp_port = 587
-    message = MIMEMultipart()
-    message["From"] = SENDER_EMAIL
-    message["Subject"] = subject
-    
-    message.attach(MIMEText(body, "html"))
-    try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(SENDER_EMAIL, SENDER_PASSWORD)
-            
-            message["To"] = user_email
-            server.sendmail(SENDER_EMAIL, user_email, message.as_string())
-    except smtplib.SMTPEcxeption as e:
-        return "An error occured while trying to send an email"
+    outbox.enqueue(user_email, subject, body)
 
 
 def signup_email(user_email, username):
@@ -225,5 +248,49 @@ def generate_otp():
     return str(otp)
 
 
+async def get_admin(user: Annotated[dict, Depends(get_user)]):
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return user
+
+
 otp_dependency = Annotated[dict, Depends(otp_token_verification)]
 user_dependency = Annotated[str, Depends(get_user)]
+stream_user_dependency = Annotated[dict, Depends(get_stream_user)]
+admin_dependency = Annotated[dict, Depends(get_admin)]
+
+
+async def get_read_db(request: Request, user: user_dependency, db: db_dependency):
+    # The primary session stays unused (no connection checked out) when a replica serves the read.
+    cookie = request.cookies.get(replica_set.cookie) if replica_set.cookie else None
+    replica = replica_set.choose(user.get("user_id"), cookie)
+    if replica is None:
+        yield db
+        return
+
+    read_db = replica.session()
+    try:
+        yield read_db
+    finally:
+        await read_db.close()
+
+
+async def track_writes(request: Request, response: Response, user: user_dependency, db: db_dependency):
+    # Keep the user's reads on the primary until replicas have had time to catch up with this write.
+    if request.method in ("GET", "HEAD"):
+        yield
+        return
+    # Tokens of a deleted account may outlive it on workers that missed the revocation, never let them write.
+    if await db.scalar(select(User.id).where(User.id == user.get("user_id")).where(User.deleted_at.is_not(None))):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
+    replica_set.mark_write(user.get("user_id"))
+    if replica_set.replicas and replica_set.cookie:
+        response.set_cookie(replica_set.cookie, replica_set.sticky_until(), max_age=math.ceil(replica_set.stickiness),
+                            httponly=True, samesite="lax")
+    try:
+        yield
+    finally:
+        replica_set.mark_write(user.get("user_id"))
+
+
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
@@ -0,0 +1,223 @@
+import os
+import json
+import asyncio
+import logging
+from dotenv import load_dotenv
+from sqlalchemy.engine import make_url
+from . import metrics
+
+
+load_dotenv()
+
+
+EVENT_BROKER = os.getenv("EVENT_BROKER", "memory")
+EVENT_CHANNEL = os.getenv("EVENT_CHANNEL", "todo_events")
+EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", "100"))
+EVENT_KEEPALIVE = float(os.getenv("EVENT_KEEPALIVE", "15"))
+# Changes touching more todos than this are announced as a resync, which also keeps NOTIFY payloads small.
+EVENT_MAX_IDS = int(os.getenv("EVENT_MAX_IDS", "100"))
+EVENT_RECONNECT_DELAY = float(os.getenv("EVENT_RECONNECT_DELAY", "1"))
+
+CLOSE = object()
+logger = logging.getLogger("todoapi.events")
+
+
+class Subscription:
+    """One connected client, events wait in a bounded queue on the loop that serves the client.
+
+    A client that falls a full buffer behind loses what it has not read and gets a single
+    resync event instead, so a slow reader never holds memory or blocks the publisher.
+    """
+
+    def __init__(self, bus, user_id, buffer_size):
+        self.bus = bus
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.loop = asyncio.get_running_loop()
+
+    def put(self, event):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.push(event)
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.push, event)
+
+    def push(self, event):
+        if self.queue.full():
+            metrics.counter("events_dropped_total", "Events dropped because a client fell behind").inc(self.queue.qsize())
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            if event is not CLOSE:
+                event = {"event": "resync"}
+        self.queue.put_nowait(event)
+
+    async def events(self, keepalive=None):
+        """Yields events as they arrive, and None whenever keepalive seconds pass without one."""
+        while True:
+            try:
+                event = await asyncio.wait_for(self.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if event is CLOSE:
+                return
+            yield event
+
+    def close(self):
+        self.put(CLOSE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.bus.unsubscribe(self)
+
+
+class PostgresBroker:
+    """Fans events out to every worker through LISTEN/NOTIFY on one dedicated asyncpg connection.
+
+    LISTEN ends with the session, so a dropped connection is replaced in the background, and a
+    publish that finds it gone reconnects once before giving up.
+    """
+
+    def __init__(self, url, channel=EVENT_CHANNEL, reconnect_delay=EVENT_RECONNECT_DELAY):
+        self.dsn = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.connection = None
+        self.reconnecting = None
+        self.stopped = False
+        self.lock = asyncio.Lock()
+
+    async def connect(self):
+        import asyncpg
+        connection = await asyncpg.connect(self.dsn)
+        await connection.add_listener(self.channel, self.notified)
+        connection.add_termination_listener(self.terminated)
+        self.connection = connection
+
+    async def reset(self):
+        if self.connection is not None:
+            try:
+                await self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+        await self.connect()
+        metrics.counter("event_broker_reconnects_total", "Times the event broker connection was replaced").inc()
+
+    async def start(self, bus):
+        self.bus = bus
+        self.stopped = False
+        await self.connect()
+
+    def terminated(self, connection):
+        if not self.stopped and self.reconnecting is None:
+            self.reconnecting = asyncio.ensure_future(self.reconnect())
+
+    async def reconnect(self):
+        try:
+            while not self.stopped:
+                try:
+                    async with self.lock:
+                        if self.connection is None or self.connection.is_closed():
+                            await self.reset()
+                    return
+                except Exception:
+                    logger.warning("Event broker reconnect failed, retrying in %ss", self.reconnect_delay, exc_info=True)
+                    await asyncio.sleep(self.reconnect_delay)
+        finally:
+            self.reconnecting = None
+
+    def notified(self, connection, pid, channel, payload):
+        message = json.loads(payload)
+        self.bus.deliver(message["user_id"], message["event"])
+
+    async def publish(self, user_id, event):
+        # NOTIFY payloads are capped at 8000 bytes, see EVENT_MAX_IDS.
+        payload = json.dumps({"user_id": user_id, "event": event})
+        async with self.lock:
+            try:
+                await self.connection.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+            except Exception:
+                await self.reset()
+                await self.connection.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+
+    async def stop(self):
+        self.stopped = True
+        if self.reconnecting is not None:
+            self.reconnecting.cancel()
+        if self.connection is not None:
+            await self.connection.close()
+            self.connection = None
+
+
+class EventBus:
+    """Per-user pub/sub for todo changes, in process unless a broker relays events between workers."""
+
+    def __init__(self, broker, buffer_size=EVENT_BUFFER_SIZE):
+        self.broker = broker
+        self.buffer_size = buffer_size
+        self.subscribers = {}
+        self.published = metrics.counter("events_published_total", "Todo change events published")
+        self.connected = metrics.gauge("event_subscribers", "Clients connected to the todo change feed")
+
+    async def start(self):
+        if self.broker is not None:
+            await self.broker.start(self)
+
+    async def stop(self):
+        for subscriptions in list(self.subscribers.values()):
+            for subscription in list(subscriptions):
+                subscription.close()
+        if self.broker is not None:
+            await self.broker.stop()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id, self.buffer_size)
+        self.subscribers.setdefault(user_id, set()).add(subscription)
+        self.connected.inc()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscriptions = self.subscribers.get(subscription.user_id, set())
+        if subscription in subscriptions:
+            subscriptions.discard(subscription)
+            self.connected.dec()
+        if not subscriptions:
+            self.subscribers.pop(subscription.user_id, None)
+
+    async def publish_change(self, user_id, event, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        await self.publish(user_id, {"event": event, "ids": ids} if len(ids) <= EVENT_MAX_IDS else {"event": "resync"})
+
+    async def publish(self, user_id, event):
+        """Best effort: the change is already committed, a broker failure must not fail the request."""
+        self.published.inc()
+        if self.broker is None:
+            self.deliver(user_id, event)
+            return
+        try:
+            await self.broker.publish(user_id, event)
+        except Exception:
+            metrics.counter("events_publish_failures_total", "Events the broker failed to relay").inc()
+            logger.exception("Publishing a todo change for %s failed", user_id)
+            # Clients on this worker still hear about it, the others catch up on their next read.
+            self.deliver(user_id, event)
+
+    def deliver(self, user_id, event):
+        for subscription in list(self.subscribers.get(user_id, ())):
+            subscription.put(event)
+
+
+BROKERS = {
+    "memory": lambda: None,
+    "postgres": lambda: PostgresBroker(os.getenv("DATABASE_URL")),
+}
+
+bus = EventBus(BROKERS[EVENT_BROKER]())
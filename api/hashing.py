@@ -0,0 +1,71 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from passlib.context import CryptContext
+from dotenv import load_dotenv
+from . import metrics, profiling
+
+
+load_dotenv()
+
+
+SCHEME = os.getenv("SCHEME")
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "4"))
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")
+
+hashed = CryptContext(schemes=[SCHEME])
+
+queue_depth = metrics.gauge("hash_queue_depth", "Password hash jobs waiting for a worker")
+in_flight = metrics.gauge("hash_in_flight", "Password hash jobs submitted and not yet finished")
+
+executor = None
+
+
+def get_executor():
+    global executor
+    if executor is None:
+        pool = ProcessPoolExecutor if HASH_EXECUTOR == "process" else ThreadPoolExecutor
+        executor = pool(max_workers=HASH_WORKERS)
+    return executor
+
+
+def shutdown():
+    global executor
+    if executor is not None:
+        executor.shutdown(wait=True)
+        executor = None
+
+
+def timed(operation, *args):
+    # Runs inside the worker so the duration excludes time spent queued.
+    started = time.perf_counter()
+    result = getattr(hashed, operation)(*args)
+    return result, time.perf_counter() - started
+
+
+def track(amount):
+    in_flight.inc(amount)
+    queue_depth.set(max(in_flight.value - HASH_WORKERS, 0))
+
+
+async def run(operation, *args):
+    submitted = time.perf_counter()
+    track(1)
+    try:
+        result, duration = await asyncio.wrap_future(get_executor().submit(timed, operation, *args))
+    finally:
+        track(-1)
+    waited = max(time.perf_counter() - submitted - duration, 0)
+    metrics.histogram("hash_wait_seconds", "Time a hash job spent queued", operation=operation).observe(waited)
+    metrics.histogram("hash_duration_seconds", "Time spent hashing or verifying a password", operation=operation).observe(duration)
+    profiling.record("hashing", waited + duration)
+    return result
+
+
+async def hash_password(password: str):
+    return await run("hash", password)
+
+
+async def verify_password(password: str, password_hash: str):
+    return await run("verify", password, password_hash)
@@ -0,0 +1,216 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import smtplib
+from collections import deque
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from dotenv import load_dotenv
+from . import metrics, profiling
+
+
+load_dotenv()
+
+
+SENDER_EMAIL = os.getenv("SENDER_EMAIL")
+SENDER_PASSWORD = os.getenv("SENDER_PASSWORD")
+MAIL_TRANSPORT = os.getenv("MAIL_TRANSPORT", "smtp")
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_RETRY_DELAY = float(os.getenv("MAIL_RETRY_DELAY", "2"))
+MAIL_DEAD_LETTERS = int(os.getenv("MAIL_DEAD_LETTERS", "1000"))
+
+
+class Email:
+
+    def __init__(self, to, subject, body):
+        self.to = to
+        self.subject = subject
+        self.body = body
+        self.attempts = 0
+        self.error = None
+
+    def as_string(self, sender):
+        message = MIMEMultipart()
+        message["From"] = sender
+        message["To"] = self.to
+        message["Subject"] = self.subject
+        message.attach(MIMEText(self.body, "html"))
+        return message.as_string()
+
+
+
+class SMTPTransport:
+    """Keeps one authenticated SMTP connection open and reuses it across batches."""
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, starttls=SMTP_STARTTLS,
+                 username=SENDER_EMAIL, password=SENDER_PASSWORD, sender=SENDER_EMAIL):
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.server = None
+
+    def connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        self.server = server
+
+    def alive(self):
+        if self.server is None:
+            return False
+        try:
+            return self.server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+
+    def send(self, messages):
+        """Returns the messages that failed, each with its error recorded."""
+        if not self.alive():
+            self.close()
+            self.connect()
+        failed = []
+        for message in messages:
+            try:
+                self.server.sendmail(self.sender, message.to, message.as_string(self.sender))
+            except smtplib.SMTPServerDisconnected as e:
+                self.close()
+                message.error = str(e)
+                failed.extend(messages[messages.index(message):])
+                break
+            except smtplib.SMTPException as e:
+                message.error = str(e)
+                failed.append(message)
+        return failed
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+
+
+class MemoryTransport:
+    """Collects messages in a list, for tests and local development."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, messages):
+        self.sent.extend(messages)
+        return []
+
+    def close(self):
+        pass
+
+
+TRANSPORTS = {
+    "smtp": SMTPTransport,
+    "memory": MemoryTransport,
+}
+
+
+
+class Outbox:
+
+    def __init__(self, transport=None, workers=MAIL_WORKERS, batch_size=MAIL_BATCH_SIZE,
+                 max_attempts=MAIL_MAX_ATTEMPTS, retry_delay=MAIL_RETRY_DELAY):
+        self.transport = transport or TRANSPORTS[MAIL_TRANSPORT]
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.queue = asyncio.Queue()
+        self.dead_letters = deque(maxlen=MAIL_DEAD_LETTERS)
+        self.tasks = []
+        self.transports = []
+        self.retries = set()
+        self.depth = metrics.gauge("mail_queue_depth", "Emails waiting to be sent")
+
+    def enqueue(self, to, subject, body):
+        self.queue.put_nowait(Email(to, subject, body))
+        self.depth.inc()
+
+    def start(self):
+        # Rebind the queue to the running loop, keeping anything enqueued before startup.
+        pending, self.queue = self.queue, asyncio.Queue()
+        while not pending.empty():
+            self.queue.put_nowait(pending.get_nowait())
+        for _ in range(self.workers):
+            transport = self.transport()
+            self.transports.append(transport)
+            self.tasks.append(asyncio.create_task(self.worker(transport)))
+
+    async def stop(self, timeout=10):
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning("Outbox stopped with %s unsent emails", self.queue.qsize())
+        if self.retries:
+            logging.warning("Outbox dropped %s emails waiting to be retried", len(self.retries))
+        for task in [*self.tasks, *self.retries]:
+            task.cancel()
+        await asyncio.gather(*self.tasks, *self.retries, return_exceptions=True)
+        for transport in self.transports:
+            await asyncio.to_thread(transport.close)
+        self.tasks, self.transports, self.retries = [], [], set()
+
+    async def worker(self, transport):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            self.depth.dec(len(batch))
+
+            started = time.perf_counter()
+            try:
+                failed = await asyncio.to_thread(transport.send, batch)
+            except Exception as e:
+                for message in batch:
+                    message.error = str(e)
+                failed = batch
+            elapsed = time.perf_counter() - started
+            metrics.histogram("mail_send_seconds", "Time spent delivering one batch of emails").observe(elapsed)
+            profiling.record("email", elapsed)
+            metrics.counter("mail_sent_total", "Emails delivered").inc(len(batch) - len(failed))
+
+            for message in failed:
+                self.retry(message)
+            for _ in batch:
+                self.queue.task_done()
+
+    def retry(self, message):
+        message.attempts += 1
+        if message.attempts >= self.max_attempts:
+            self.dead_letters.append(message)
+            metrics.counter("mail_dead_letter_total", "Emails given up on after repeated failures").inc()
+            logging.error("Dead-lettered email to %s after %s attempts: %s", message.to, message.attempts, message.error)
+            return
+
+        metrics.counter("mail_retry_total", "Email delivery attempts that will be retried").inc()
+        delay = self.retry_delay * 2 ** (message.attempts - 1) * random.uniform(0.8, 1.2)
+        task = asyncio.create_task(self.requeue(message, delay))
+        self.retries.add(task)
+        task.add_done_callback(self.retries.discard)
+
+    async def requeue(self, message, delay):
+        await asyncio.sleep(delay)
+        self.queue.put_nowait(message)
+        self.depth.inc()
+
+
+outbox = Outbox()
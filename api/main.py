@@ -2,23 +2,58 @@ import logging
 from fastapi import FastAPI
 from .routes.todo import todo
 from .routes.user import user
-from database.database import engine
-from database import model_db as model_db
+from .routes.stream import stream
+from .admin import admin
+from . import hashing
+from .mailer import outbox
+from .events import bus
+from .scheduler import scheduler
+from .responses import JSONResponse
+from .ratelimit import RateLimitMiddleware, limiter
+from . import profiling
+from .profiling import ProfilingMiddleware
+from database.database import engine, async_engine, ASYNC_DATABASE
+from database import migrations, pool
+from database.replicas import replica_set
 from contextlib import asynccontextmanager
 
 
+pool.on_instrument(profiling.instrument_engine)
+pool.on_checkout(profiling.pool_checkout)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    model_db.data.metadata.create_all(bind=engine)
+    if ASYNC_DATABASE:
+        async with async_engine.begin() as connection:
+            await connection.run_sync(migrations.upgrade)
+    else:
+        with engine.begin() as connection:
+            migrations.upgrade(connection)
     logging.info("Database connection successful")
+    outbox.start()
+    await bus.start()
+    scheduler.start()
     yield
+    await scheduler.stop()
+    await bus.stop()
+    await outbox.stop()
+    if ASYNC_DATABASE:
+        await async_engine.dispose()
     engine.dispose()
+    await replica_set.dispose()
+    hashing.shutdown()
     logging.info("Database disposal successful")
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=JSONResponse)
+app.add_middleware(RateLimitMiddleware, limiter=limiter)
+# Added last so it is outermost and times rate-limited requests too.
+app.add_middleware(ProfilingMiddleware)
 app.include_router(user, prefix="/user", tags=["User"])
 app.include_router(todo, prefix="/todo", tags=["Todo"])
+app.include_router(stream, prefix="/todo", tags=["Todo"])
+app.include_router(admin, prefix="/admin", tags=["Admin"])
 
 
 @app.get("/")
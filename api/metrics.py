@@ -0,0 +1,125 @@
+import threading
+from bisect import bisect_left
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+registry = {}
+lock = threading.Lock()
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, description, labels):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount=1):
+        with lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value):
+        with lock:
+            self.value = value
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, description, labels, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        with lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "buckets": dict(zip([*map(str, self.buckets), "+Inf"], self.counts)),
+        }
+
+
+def metric(kind, name, description, labels, **kwargs):
+    key = (name, tuple(sorted(labels.items())))
+    with lock:
+        if key not in registry:
+            registry[key] = kind(name, description, dict(key[1]), **kwargs)
+        return registry[key]
+
+
+def counter(name, description="", **labels):
+    return metric(Counter, name, description, labels)
+
+
+def gauge(name, description="", **labels):
+    return metric(Gauge, name, description, labels)
+
+
+def histogram(name, description="", buckets=DEFAULT_BUCKETS, **labels):
+    return metric(Histogram, name, description, labels, buckets=buckets)
+
+
+def snapshot():
+    data = {}
+    for (name, labels), item in list(registry.items()):
+        key = name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+        data[key] = item.snapshot()
+    return data
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}" if pairs else ""
+
+
+def prometheus():
+    """The registry in the Prometheus text exposition format, version 0.0.4."""
+    families = {}
+    for (name, labels), item in sorted(list(registry.items()), key=lambda entry: entry[0]):
+        families.setdefault(name, []).append((labels, item))
+
+    lines = []
+    for name, items in families.items():
+        first = items[0][1]
+        lines.append(f"# HELP {name} {escape(first.description)}")
+        lines.append(f"# TYPE {name} {first.kind}")
+        for labels, item in items:
+            if item.kind != "histogram":
+                lines.append(f"{name}{render_labels(labels)} {item.value}")
+                continue
+            with lock:
+                counts, count, total = list(item.counts), item.count, item.sum
+            cumulative = 0
+            for bucket, bucket_count in zip([*map(str, item.buckets), "+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{render_labels(labels, [('le', bucket)])} {cumulative}")
+            lines.append(f"{name}_sum{render_labels(labels)} {total}")
+            lines.append(f"{name}_count{render_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,169 @@
+import os
+import hmac
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from database.model_db import Otp
+from . import metrics
+
+
+load_dotenv()
+
+
+OTP_BACKEND = os.getenv("OTP_BACKEND", "sql")
+OTP_TTL = int(os.getenv("OTP_TTL", "1200"))
+OTP_STORE_SIZE = int(os.getenv("OTP_STORE_SIZE", "100000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Purposes are the tags the Otp table has always used.
+PASSWORD = "Password"
+DELETION = "Deletion"
+PURPOSES = (PASSWORD, DELETION)
+
+VALID = "valid"
+INVALID = "invalid"
+EXPIRED = "expired"
+USED = "used"
+
+
+class MemoryBackend:
+    """One code per (user, purpose) in an LRU, a used code stays until it expires so reuse reads as used."""
+
+    def __init__(self, maxsize=OTP_STORE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    async def put(self, db, user_id, purpose, code, ttl):
+        with self.lock:
+            self.entries[(user_id, purpose)] = [code, time.monotonic() + ttl, False]
+            self.entries.move_to_end((user_id, purpose))
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    async def consume(self, db, user_id, purpose, code):
+        with self.lock:
+            entry = self.entries.get((user_id, purpose))
+            if entry is None or not hmac.compare_digest(entry[0].encode(), code.encode()):
+                return INVALID
+            if entry[1] <= time.monotonic():
+                del self.entries[(user_id, purpose)]
+                return EXPIRED
+            if entry[2]:
+                return USED
+            entry[2] = True
+            return VALID
+
+    async def discard(self, db, user_id):
+        with self.lock:
+            for purpose in PURPOSES:
+                self.entries.pop((user_id, purpose), None)
+
+
+class RedisBackend:
+    """Codes shared by every worker, Redis expires them and a script checks and marks them used in one step.
+
+    An expired code is gone from Redis, so it reads as invalid rather than expired.
+    """
+
+    CONSUME = """
+    local value = redis.call('GET', KEYS[1])
+    if not value or string.sub(value, 3) ~= ARGV[1] then
+        return 'invalid'
+    end
+    if string.sub(value, 1, 2) == '1:' then
+        return 'used'
+    end
+    redis.call('SET', KEYS[1], '1:' .. ARGV[1], 'KEEPTTL')
+    return 'valid'
+    """
+
+    def __init__(self, client, prefix="todoapi:otp:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url=REDIS_URL):
+        import redis.asyncio as redis
+        return cls(redis.Redis.from_url(url))
+
+    def key(self, user_id, purpose):
+        return f"{self.prefix}{user_id}:{purpose}"
+
+    async def put(self, db, user_id, purpose, code, ttl):
+        await self.client.set(self.key(user_id, purpose), f"0:{code}", ex=ttl)
+
+    async def consume(self, db, user_id, purpose, code):
+        result = await self.client.eval(self.CONSUME, 1, self.key(user_id, purpose), code)
+        return result.decode() if isinstance(result, bytes) else result
+
+    async def discard(self, db, user_id):
+        await self.client.delete(*(self.key(user_id, purpose) for purpose in PURPOSES))
+
+
+class SqlBackend:
+    """The Otp table, one row per (user, purpose) kept by a unique index and replaced by an upsert on every new code.
+
+    Consuming is a single conditional UPDATE, so of two requests racing with the same code only one wins.
+    """
+
+    INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+    async def put(self, db, user_id, purpose, code, ttl):
+        values = {"otp": code, "is_used": False, "expiring": datetime.now() + timedelta(seconds=ttl)}
+        insert = self.INSERTS[db.bind.dialect.name](Otp).values(user_id=user_id, tag=purpose, **values)
+        await db.execute(insert.on_conflict_do_update(index_elements=[Otp.user_id, Otp.tag], set_=values))
+        await db.commit()
+
+    async def consume(self, db, user_id, purpose, code):
+        result = await db.execute(
+            update(Otp)
+            .where(Otp.user_id == user_id, Otp.tag == purpose, Otp.otp == code)
+            .where(Otp.is_used.is_(False), Otp.expiring >= datetime.now())
+            .values(is_used=True)
+        )
+        await db.commit()
+        if result.rowcount:
+            return VALID
+
+        otp = await db.scalar(select(Otp).where(Otp.user_id == user_id).where(Otp.tag == purpose).where(Otp.otp == code))
+        if otp is None:
+            return INVALID
+        return USED if otp.is_used else EXPIRED
+
+    async def discard(self, db, user_id):
+        await db.execute(delete(Otp).where(Otp.user_id == user_id))
+        await db.commit()
+
+
+class OtpStore:
+    """One time codes keyed on (user, purpose), verifying one is a keyed lookup that uses it up."""
+
+    def __init__(self, backend, ttl=OTP_TTL):
+        self.backend = backend
+        self.ttl = ttl
+
+    async def issue(self, db, user_id, purpose, code):
+        metrics.counter("otp_issued_total", "One time codes issued", purpose=purpose).inc()
+        await self.backend.put(db, user_id, purpose, code, self.ttl)
+
+    async def consume(self, db, user_id, purpose, code):
+        result = await self.backend.consume(db, user_id, purpose, code)
+        metrics.counter("otp_verifications_total", "One time code checks by outcome", purpose=purpose, result=result).inc()
+        return result
+
+    async def discard(self, db, user_id):
+        await self.backend.discard(db, user_id)
+
+
+BACKENDS = {
+    "memory": MemoryBackend,
+    "redis": RedisBackend.from_url,
+    "sql": SqlBackend,
+}
+
+otp_store = OtpStore(BACKENDS[OTP_BACKEND]())
@@ -0,0 +1,216 @@
+import os
+import io
+import time
+import uuid
+import pstats
+import logging
+import cProfile
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from . import metrics
+
+
+load_dotenv()
+
+
+# X-Profile exposes SQL and code paths, so it only works where this is switched on.
+PROFILE_HEADER_ENABLED = os.getenv("PROFILE_HEADER_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+logger = logging.getLogger("todoapi.profiling")
+current = ContextVar("profile", default=None)
+reports = OrderedDict()
+
+
+class Profile:
+    """What one request spent its time on, filled in by the hooks while the request runs."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.statements = Counter()
+        self.sections = Counter()
+
+    def summary(self, elapsed):
+        parts = [f"total={elapsed * 1000:.1f}ms", f"sql={self.sql_count}/{self.sql_seconds * 1000:.1f}ms"]
+        parts += [f"{name}={seconds * 1000:.1f}ms" for name, seconds in sorted(self.sections.items())]
+        return "; ".join(parts)
+
+
+def record(section: str, seconds: float):
+    metrics.histogram("section_seconds", "Time spent in instrumented hot paths", section=section).observe(seconds)
+    profile = current.get()
+    if profile is not None:
+        profile.sections[section] += seconds
+
+
+@contextmanager
+def section(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def query_started(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own context, which is dropped with it when the statement fails.
+    context.profile_started = time.perf_counter()
+
+
+def query_finished(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.profile_started
+    metrics.histogram("db_query_seconds", "Time spent executing SQL statements").observe(elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, statement)
+    profile = current.get()
+    if profile is not None:
+        profile.sql_count += 1
+        profile.sql_seconds += elapsed
+        profile.statements[statement] += 1
+
+
+def instrument_engine(engine, name: str):
+    """Wires pool and statement events into metrics, registered on database.pool by api.main.
+
+    Listeners survive engine.dispose(), which recreates the pool with the same dispatch.
+    """
+    in_use = metrics.gauge("db_pool_in_use", "Connections currently checked out", engine=name)
+    overflow = metrics.gauge("db_pool_overflow", "Connections open beyond pool_size", engine=name)
+
+    def sample(change):
+        in_use.inc(change)
+        if isinstance(engine.pool, QueuePool):
+            overflow.set(max(engine.pool.overflow(), 0))
+
+    # checkin fires before the pool takes the connection back, so track in-use by counting.
+    pool = engine.pool
+    event.listen(pool, "checkout", lambda *args: sample(1))
+    event.listen(pool, "checkin", lambda *args: sample(-1))
+    event.listen(pool, "connect", lambda *args: metrics.counter("db_pool_connects_total", "New DBAPI connections opened", engine=name).inc())
+    event.listen(pool, "invalidate", lambda *args: metrics.counter("db_pool_invalidations_total", "Connections invalidated", engine=name).inc())
+    event.listen(pool, "soft_invalidate", lambda *args: metrics.counter("db_pool_invalidations_total", "Connections invalidated", engine=name).inc())
+    event.listen(engine, "before_cursor_execute", query_started)
+    event.listen(engine, "after_cursor_execute", query_finished)
+
+
+def pool_checkout(name: str, seconds: float, timed_out: bool):
+    if timed_out:
+        metrics.counter("db_pool_timeouts_total", "Checkouts that gave up waiting for a connection", engine=name).inc()
+    metrics.histogram("db_pool_checkout_seconds", "Time spent waiting to check out a connection", engine=name).observe(seconds)
+
+
+def report_n_plus_one(profile, route):
+    # Statements keep their placeholders, so the same text run over and over is one query per row.
+    for statement, count in profile.statements.items():
+        if count >= N_PLUS_ONE_THRESHOLD:
+            metrics.counter("n_plus_one_total", "Requests that repeated one statement past the threshold", route=route).inc()
+            logger.warning("Possible N+1 in %s: %d executions of %s", route, count, statement)
+
+
+def profile_report(profiler, profile, elapsed):
+    output = io.StringIO()
+    output.write(profile.summary(elapsed) + "\n\n")
+    for statement, count in profile.statements.most_common():
+        output.write(f"{count:>5}x {statement}\n")
+    output.write("\n")
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(30)
+    return output.getvalue()
+
+
+def keep_report(report):
+    report_id = uuid.uuid4().hex
+    reports[report_id] = report
+    while len(reports) > PROFILE_KEEP:
+        reports.popitem(last=False)
+    return report_id
+
+
+def route_template(scope):
+    """The matched route's path with its parameters left as placeholders, so labels stay bounded."""
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    # Routes of an included router only know the path below the router's prefix, take the prefix from the request path.
+    params = {name: convertor.to_string(scope["path_params"][name]) for name, convertor in route.param_convertors.items()
+              if name in scope.get("path_params", {})}
+    tail = route.path_format.format(**params)
+    prefix = scope["path"][:-len(tail)] if tail and scope["path"].endswith(tail) else ""
+    return prefix + route.path_format
+
+
+class ProfilingMiddleware:
+    """Per-route latency and SQL histograms for every request, plus a cProfile run when X-Profile is sent.
+
+    The profiled response gets an X-Profile summary header and an X-Profile-Id whose full report
+    is served from /admin/profiles/{id}. cProfile sees everything the thread runs meanwhile,
+    concurrent requests included.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = Profile()
+        token = current.set(profile)
+        status_code = 500
+        profiler = None
+        if PROFILE_HEADER_ENABLED and any(name == b"x-profile" for name, _ in scope.get("headers", ())):
+            profiler = cProfile.Profile()
+        held = []
+
+        async def send_wrapper(message):
+            nonlocal status_code, profiler
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if profiler is not None and (b"content-type", b"text/event-stream") in [
+                        (name.lower(), value.split(b";")[0]) for name, value in message.get("headers", ())]:
+                    # A stream never finishes, so it is passed through unprofiled.
+                    profiler.disable()
+                    profiler = None
+            if profiler is None:
+                return await send(message)
+            # Hold the response until the profile is done so its headers can carry the result.
+            held.append(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                await release()
+
+        async def release():
+            elapsed = time.perf_counter() - profile.started
+            profiler.disable()
+            start = dict(held[0])
+            start["headers"] = [*start.get("headers", ()), (b"x-profile", profile.summary(elapsed).encode()),
+                                (b"x-profile-id", keep_report(profile_report(profiler, profile, elapsed)).encode())]
+            await send(start)
+            for message in held[1:]:
+                await send(message)
+            held.clear()
+
+        try:
+            if profiler is not None:
+                profiler.enable()
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current.reset(token)
+            if profiler is not None and held:
+                await release()
+            elapsed = time.perf_counter() - profile.started
+            route = route_template(scope)
+            labels = {"method": scope["method"], "route": route}
+            metrics.histogram("http_request_seconds", "Request latency by route", **labels).observe(elapsed)
+            metrics.counter("http_requests_total", "Requests by route and status", status=str(status_code), **labels).inc()
+            metrics.histogram("http_request_queries", "SQL statements per request", buckets=QUERY_BUCKETS, **labels).observe(profile.sql_count)
+            metrics.histogram("http_request_sql_seconds", "SQL time per request", **labels).observe(profile.sql_seconds)
+            report_n_plus_one(profile, route)
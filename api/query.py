@@ -0,0 +1,128 @@
+import os
+import re
+import shlex
+from datetime import datetime
+from fastapi import HTTPException
+from pydantic import TypeAdapter, ValidationError
+from starlette import status
+from dotenv import load_dotenv
+from sqlalchemy import select
+from database.model_db import Todo
+from database.search import search_query, terms, MIN_TRIGRAM
+
+
+load_dotenv()
+
+
+QUERY_STRICT = os.getenv("QUERY_STRICT", "false").lower() in ("1", "true", "yes")
+
+# Filter name -> column and value type, "text" is the substring search from /todo/search.
+FILTERS = {
+    "status": (Todo.status, bool),
+    "priority": (Todo.priority, int),
+    "due": (Todo.due, datetime),
+    "created": (Todo.created_at, datetime),
+    "task": (Todo.task, str),
+    "text": (None, str),
+}
+SORTS = {"status": Todo.status, "priority": Todo.priority, "due": Todo.due, "created": Todo.created_at,
+         "task": Todo.task, "id": Todo.id}
+OPERATORS = {
+    ":": lambda column, value: column == value,
+    "=": lambda column, value: column == value,
+    "!=": lambda column, value: column != value,
+    "<": lambda column, value: column < value,
+    "<=": lambda column, value: column <= value,
+    ">": lambda column, value: column > value,
+    ">=": lambda column, value: column >= value,
+}
+CLAUSE = re.compile(r"^(\w+)(<=|>=|!=|:|=|<|>)(.+)$", re.DOTALL)
+
+
+def bad_query(detail: str):
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def parse_filter(expression: str | None):
+    """Turns 'status:false priority>=2 text:"renew passport"' into (name, operator, value) clauses."""
+    try:
+        parts = shlex.split(expression or "")
+    except ValueError as e:
+        raise bad_query(f"Invalid filter: {e}")
+
+    clauses = []
+    for part in parts:
+        match = CLAUSE.match(part)
+        if match is None or match.group(1) not in FILTERS:
+            raise bad_query(f"Invalid filter clause {part!r}, expected one of {', '.join(FILTERS)} with an operator")
+        name, operator, raw = match.groups()
+        kind = FILTERS[name][1]
+        if (kind in (bool, str) and operator not in (":", "=", "!=")) or (name == "text" and operator != ":"):
+            raise bad_query(f"Operator {operator} is not supported for {name}")
+        try:
+            value = TypeAdapter(kind).validate_python(raw)
+        except ValidationError:
+            raise bad_query(f"Invalid {kind.__name__} value for {name}: {raw!r}")
+        clauses.append((name, operator, value))
+    return clauses
+
+
+def parse_sort(sort: str | None):
+    keys = []
+    for key in (sort or "").split(","):
+        key = key.strip()
+        if not key:
+            continue
+        descending = key.startswith("-")
+        name = key.lstrip("-+")
+        if name not in SORTS:
+            raise bad_query(f"Invalid sort key {name!r}, expected one of {', '.join(SORTS)}")
+        keys.append((name, descending))
+    return keys
+
+
+def seekable_columns():
+    """Columns an index can seek on once user_id is fixed, the one right after user_id in each index."""
+    columns = set()
+    for index in Todo.__table__.indexes:
+        names = [column.name for column in index.columns]
+        if len(names) > 1 and names[0] == "user_id":
+            columns.add(names[1])
+    return columns
+
+
+def check_indexes(clauses, sort):
+    """Lists the parts of a query that no index serves, they are applied to every row the user has."""
+    seekable = seekable_columns()
+    problems = []
+    for name, operator, value in clauses:
+        if name == "text":
+            short = [term for term in terms(value) if len(term) < MIN_TRIGRAM]
+            if short:
+                problems.append(f"text terms shorter than {MIN_TRIGRAM} characters cannot use the search index: {', '.join(short)}")
+        elif FILTERS[name][0].name not in seekable:
+            problems.append(f"{name} has no index")
+        elif operator == "!=":
+            problems.append(f"{name}!= cannot use an index")
+
+    warnings = []
+    # Only (created, id) comes out of an index already in order.
+    names = [name for name, _ in sort]
+    if sort and (names != ["created", "id"][:len(names)] or len({descending for _, descending in sort}) > 1):
+        warnings.append(f"sorting by {', '.join(names)} needs a separate sort step")
+    return problems, warnings
+
+
+def compile_query(dialect: str, where, clauses, sort):
+    """Builds the one SELECT for a parsed query, text clauses reuse the ranked search."""
+    conditions = [OPERATORS[operator](FILTERS[name][0], value) for name, operator, value in clauses if name != "text"]
+    text = " ".join(value for name, _, value in clauses if name == "text")
+
+    query = search_query(dialect, text, where) if text else select(Todo).where(where).order_by(Todo.created_at, Todo.id)
+    query = query.where(*conditions)
+    if sort:
+        columns = [SORTS[name].desc() if descending else SORTS[name] for name, descending in sort]
+        if "id" not in [name for name, _ in sort]:
+            columns.append(Todo.id.desc() if sort[-1][1] else Todo.id)
+        query = query.order_by(None).order_by(*columns)
+    return query
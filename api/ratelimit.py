@@ -0,0 +1,240 @@
+import os
+import json
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from . import metrics
+from .responses import dumps
+
+
+load_dotenv()
+
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DEFAULT = os.getenv("RATE_LIMIT_DEFAULT", "600/60")
+RATE_LIMIT_SIZE = int(os.getenv("RATE_LIMIT_SIZE", "100000"))
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() in ("1", "true", "yes")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Bodies of throttled routes are read to find the username, anything bigger is refused outright.
+MAX_BODY = 16 * 1024
+
+# Per route buckets: "ip" is the client address, "route" is one bucket shared by every client,
+# any other scope is a field of the JSON body.
+ROUTE_LIMITS = {
+    "/user/login": (("ip", "20/60"), ("username", "5/60")),
+    "/user/signup": (("ip", "10/60"),),
+    "/user/generate-otp": (("ip", "5/60"), ("email", "3/600")),
+    "/user/verify-otp": (("ip", "10/60"), ("email", "5/600"), ("route", "300/60")),
+    "/user/delete-user": (("ip", "10/60"),),
+}
+
+
+def parse_rate(rate: str):
+    """'5/60' -> (capacity 5, refilled at 5 tokens per 60 seconds)."""
+    count, seconds = rate.split("/")
+    return int(count), int(count) / float(seconds)
+
+
+def take(buckets, now):
+    """Token bucket step over every bucket of a request, buckets are (tokens, updated, capacity, rate).
+
+    Returns the new token counts and how long each bucket makes the request wait (0 when allowed).
+    Tokens are only taken when every bucket has one, so a refused request drains none of them.
+    """
+    levels = [min(capacity, tokens + (now - updated) * rate) for tokens, updated, capacity, rate in buckets]
+    waits = [0.0 if level >= 1 else (1 - level) / rate for level, (_, _, _, rate) in zip(levels, buckets)]
+    if not any(waits):
+        levels = [level - 1 for level in levels]
+    return levels, waits
+
+
+class MemoryBackend:
+    """Buckets in an LRU, a bucket that is evicted simply starts full again."""
+
+    def __init__(self, maxsize=RATE_LIMIT_SIZE):
+        self.maxsize = maxsize
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    async def take(self, buckets):
+        """buckets are (key, capacity, rate), returns the wait per bucket."""
+        now = time.monotonic()
+        with self.lock:
+            states = [(*self.buckets.get(key, (capacity, now)), capacity, rate) for key, capacity, rate in buckets]
+            levels, waits = take(states, now)
+            for (key, _, _), tokens in zip(buckets, levels):
+                self.buckets[key] = (tokens, now)
+                self.buckets.move_to_end(key)
+            while len(self.buckets) > self.maxsize:
+                self.buckets.popitem(last=False)
+        return waits
+
+
+class RedisBackend:
+    """Buckets shared by every worker, all of a request's buckets step in one atomic script on the Redis clock."""
+
+    SCRIPT = """
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local levels, waits, refused = {}, {}, false
+    for i, key in ipairs(KEYS) do
+        local capacity, rate = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+        local state = redis.call('HMGET', key, 'tokens', 'updated')
+        local tokens = tonumber(state[1]) or capacity
+        local updated = tonumber(state[2]) or now
+        levels[i] = math.min(capacity, tokens + (now - updated) * rate)
+        if levels[i] >= 1 then
+            waits[i] = '0'
+        else
+            waits[i] = tostring((1 - levels[i]) / rate)
+            refused = true
+        end
+    end
+    for i, key in ipairs(KEYS) do
+        local capacity, rate = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+        local tokens = levels[i]
+        if not refused then
+            tokens = tokens - 1
+        end
+        redis.call('HSET', key, 'tokens', tokens, 'updated', now)
+        redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+    end
+    return waits
+    """
+
+    def __init__(self, client, prefix="todoapi:ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url=REDIS_URL):
+        import redis.asyncio as redis
+        return cls(redis.Redis.from_url(url))
+
+    async def take(self, buckets):
+        keys = [self.prefix + key for key, _, _ in buckets]
+        args = [value for _, capacity, rate in buckets for value in (capacity, rate)]
+        return [float(wait) for wait in await self.client.eval(self.SCRIPT, len(keys), *keys, *args)]
+
+
+class RateLimiter:
+
+    def __init__(self, backend, limits=ROUTE_LIMITS, default=RATE_LIMIT_DEFAULT):
+        self.backend = backend
+        self.default = (("ip", parse_rate(default)),)
+        self.limits = {path: tuple((scope, parse_rate(rate)) for scope, rate in rules) for path, rules in limits.items()}
+
+    def rules(self, path):
+        return self.limits.get(path, self.default)
+
+    async def check(self, path, ip, body=None):
+        """Takes a token from every bucket the request falls in, or from none when any is empty.
+
+        Returns the longest wait, so a client over its own limit never drains a bucket it shares with others.
+        """
+        buckets, scopes = [], []
+        for scope, (capacity, rate) in self.rules(path):
+            if scope == "ip":
+                key = ip
+            elif scope == "route":
+                key = "*"
+            else:
+                value = body.get(scope) if isinstance(body, dict) else None
+                if not isinstance(value, str):
+                    continue
+                # Digest the client supplied value so bucket keys stay small whatever was sent.
+                key = hashlib.blake2b(value.strip().lower().encode(), digest_size=16).hexdigest()
+            buckets.append((f"{path}:{scope}:{key}", capacity, rate))
+            scopes.append(scope)
+        if not buckets:
+            return 0.0
+
+        waits = await self.backend.take(buckets)
+        route = path if path in self.limits else "default"
+        for scope, wait in zip(scopes, waits):
+            if wait:
+                metrics.counter("rate_limited_total", "Requests refused by the rate limiter", route=route, scope=scope).inc()
+        return max(waits)
+
+
+class RateLimitMiddleware:
+    """ASGI middleware answering 429 with Retry-After once a bucket for the request is empty."""
+
+    def __init__(self, app, limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.limiter
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED or limiter.backend is None:
+            return await self.app(scope, receive, send)
+
+        body = None
+        if any(scope_name not in ("ip", "route") for scope_name, _ in limiter.rules(scope["path"])):
+            raw, receive = await read_body(receive)
+            if raw is None:
+                return await respond(send, 413, {"detail": "Request body too large"})
+            try:
+                body = json.loads(raw) if raw else None
+            except ValueError:
+                body = None
+
+        retry_after = await limiter.check(scope["path"], client_ip(scope), body)
+        if retry_after:
+            return await respond(send, 429, {"detail": "Too many requests"}, [(b"retry-after", str(math.ceil(retry_after)).encode())])
+        await self.app(scope, receive, send)
+
+
+def client_ip(scope):
+    if RATE_LIMIT_TRUST_PROXY:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+async def read_body(receive):
+    """Buffers the request body and returns it with a receive that replays it, or None when over MAX_BODY."""
+    chunks, size, more = [], 0, True
+    while more:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        size += len(chunks[-1])
+        if size > MAX_BODY:
+            return None, receive
+        more = message.get("more_body", False)
+    raw = b"".join(chunks)
+    replayed = False
+
+    async def replay():
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": raw, "more_body": False}
+        return await receive()
+
+    return raw, replay
+
+
+async def respond(send, status_code, content, headers=()):
+    body = dumps(content)
+    await send({"type": "http.response.start", "status": status_code,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers]})
+    await send({"type": "http.response.body", "body": body})
+
+
+BACKENDS = {
+    "memory": MemoryBackend,
+    "redis": RedisBackend.from_url,
+    "none": lambda: None,
+}
+
+limiter = RateLimiter(BACKENDS[RATE_LIMIT_BACKEND]())
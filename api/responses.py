@@ -0,0 +1,27 @@
+import json
+from datetime import date
+from starlette.responses import JSONResponse as StarletteJSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=default).encode("utf-8")
+
+
+class JSONResponse(StarletteJSONResponse):
+    """Renders with orjson when it is installed, compact stdlib json otherwise."""
+
+    def render(self, content):
+        return dumps(content)
@@ -0,0 +1,50 @@
+import anyio
+from fastapi import APIRouter, WebSocket
+from fastapi.responses import StreamingResponse
+from starlette import status
+from ..config import stream_user_dependency
+from ..events import bus, EVENT_KEEPALIVE
+from ..responses import dumps
+
+stream = APIRouter()
+
+
+async def sse_events(user_id: str):
+    with bus.subscribe(user_id) as subscription:
+        yield b"retry: 3000\n\n"
+        async for event in subscription.events(EVENT_KEEPALIVE):
+            if event is None:
+                # Comment lines keep idle proxies from closing the connection.
+                yield b": keepalive\n\n"
+                continue
+            yield b"event: " + event["event"].encode() + b"\ndata: " + dumps(event) + b"\n\n"
+
+
+
+@stream.get("/stream", status_code=status.HTTP_200_OK)
+async def stream_events(user: stream_user_dependency):
+    return StreamingResponse(sse_events(user.get("user_id")), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+
+@stream.websocket("/stream")
+async def stream_events_websocket(websocket: WebSocket, user: stream_user_dependency):
+    with bus.subscribe(user.get("user_id")) as subscription:
+        await websocket.accept()
+
+        async with anyio.create_task_group() as tasks:
+            async def send():
+                async for event in subscription.events():
+                    await websocket.send_text(dumps(event).decode())
+                await websocket.close()
+                tasks.cancel_scope.cancel()
+
+            async def receive():
+                # Incoming messages are ignored, this only notices the client going away.
+                while (await websocket.receive())["type"] != "websocket.disconnect":
+                    pass
+                tasks.cancel_scope.cancel()
+
+            tasks.start_soon(send)
+            tasks.start_soon(receive)
@@ -1,65 +1,328 @@
+import io
+import csv
 import json
-from fastapi import APIRouter, HTTPException, Path
+import base64
+from datetime import datetime
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Body, UploadFile, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, insert, update, tuple_, and_
+from sqlalchemy.exc import SQLAlchemyError
+from pydantic import ValidationError
 from starlette import status
-from schema.todo_schema import CreateTodo, UpdateTodo
-from ..config import db_dependency, user_dependency
-from database.model_db import Todo
+from schema.todo_schema import CreateTodo, UpdateTodo, TodoResponse, TodoPage, TodoSearchPage, TodoQueryPage, TodoArchivePage, BulkUpdateTodo, BulkCompleteTodo, BulkResponse
+from ..config import db_dependency, read_db_dependency, track_writes, user_dependency, BULK_TODO_LIMIT, EXPORT_BATCH_SIZE, IMPORT_CHUNK_SIZE, IMPORT_ATOMIC, IMPORT_MAX_ERRORS
+from ..responses import dumps
+from ..todo_cache import todo_cache
+from ..events import bus
+from ..query import parse_filter, parse_sort, check_indexes, compile_query, QUERY_STRICT
+from database.model_db import Todo, TodoArchive, User
+from database.archive import remove_todos
+from database.search import search_query, filters
+
+todo = APIRouter(dependencies=[Depends(track_writes)])
+
+TODO_FIELDS = {column.name: column for column in Todo.__table__.columns}
 
-todo = APIRouter()
 
+def encode_cursor(created_at: datetime, todo_id: int):
+    raw = json.dumps([created_at.isoformat(), todo_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
-
-@todo.get("/get-todo/all", status_code=status.HTTP_200_OK,)
-async def get_all_task(user: user_dependency, db: db_dependency):
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, todo_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(todo_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def projection(fields: str | None):
+    if not fields:
+        return list(TODO_FIELDS)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in TODO_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+async def commit_changes(db, user_id: str, event: str, ids):
+    # The counter moves in the same transaction as the write, so an ETag never outlives the rows it stands for.
+    await db.execute(update(User).where(User.id == user_id).values(todo_version=User.todo_version + 1))
+    await db.commit()
+    await bus.publish_change(user_id, event, ids)
+
+
+async def todo_etag(request: Request, response: Response, user: user_dependency, db: read_db_dependency):
+    user_id = user.get("user_id")
+    version = await db.scalar(select(User.todo_version).where(User.id == user_id))
+    etag = f'"{user_id}-{version or 0}"'
+
+    # If-None-Match uses the weak comparison, so W/ prefixed tags match too.
+    tags = {tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")}
+    if etag in tags or "*" in tags:
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return version or 0
+
+
+# The todo_version the ETag was built from, cached reads are keyed on it too.
+etag_version = Annotated[int, Depends(todo_etag)]
+
+
+async def export_ndjson(result):
+    async for rows in result.partitions():
+        yield b"".join(dumps(dict(row._mapping)) + b"\n" for row in rows)
+
+
+async def export_csv(result):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(TODO_FIELDS)
+    async for rows in result.partitions():
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    "ndjson": (export_ndjson, "application/x-ndjson"),
+    "csv": (export_csv, "text/csv"),
+}
+
+
+def import_rows(file, format: str):
+    """Yields (line, row) from the spooled upload one record at a time, row is None when it can't be parsed."""
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    if format == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line, raw in enumerate(text, start=1):
+        if not raw.strip():
+            continue
+        try:
+            yield line, json.loads(raw)
+        except ValueError:
+            yield line, None
+
+
+def import_todo(row):
+    # Accept the column names written by /todo/export as well as CreateTodo's own.
+    if isinstance(row, dict):
+        row = {"tasks": row.get("tasks", row.get("task")), "note": row.get("note") or ""}
+    return CreateTodo.model_validate(row)
+
+
+async def run_import(db, user_id: str, file, format: str, chunk_size: int, atomic: bool):
+    counts = {"rows": 0, "inserted": 0, "failed": 0}
+    chunk = []
+    created = []
+
+    async def flush():
+        created.extend((await db.scalars(insert(Todo).returning(Todo.id), chunk)).all())
+        if not atomic:
+            await commit_changes(db, user_id, "created", created)
+            created.clear()
+        counts["inserted"] += len(chunk)
+        chunk.clear()
+
+    try:
+        for line, row in import_rows(file, format):
+            counts["rows"] += 1
+            try:
+                if row is None:
+                    raise ValueError("Invalid JSON")
+                item = import_todo(row)
+            except (ValidationError, ValueError) as e:
+                counts["failed"] += 1
+                if counts["failed"] <= IMPORT_MAX_ERRORS:
+                    errors = [error["msg"] for error in e.errors()] if isinstance(e, ValidationError) else [str(e)]
+                    yield dumps({"event": "error", "line": line, "errors": errors}) + b"\n"
+                continue
+
+            chunk.append({"task": item.tasks, "note": item.note, "user_id": user_id})
+            if len(chunk) >= chunk_size:
+                # An atomic import with a failed row is rolled back at the end, so stop writing chunks.
+                if atomic and counts["failed"]:
+                    chunk.clear()
+                else:
+                    await flush()
+                yield dumps({"event": "progress", **counts}) + b"\n"
+
+        if chunk and not (atomic and counts["failed"]):
+            await flush()
+        if atomic and counts["failed"]:
+            await db.rollback()
+            counts["inserted"] = 0
+        elif atomic:
+            await commit_changes(db, user_id, "created", created)
+    except SQLAlchemyError as e:
+        await db.rollback()
+        yield dumps({"event": "aborted", "detail": str(e.__cause__ or e), **counts}) + b"\n"
+        return
+    except (UnicodeDecodeError, csv.Error) as e:
+        # Raised by the reader itself, the upload cannot be read past this point.
+        await db.rollback()
+        yield dumps({"event": "aborted", "detail": f"Unreadable upload: {e}", **counts}) + b"\n"
+        return
+
+    yield dumps({"event": "done", **counts}) + b"\n"
+
+
+
+@todo.get("/get-todo/all", status_code=status.HTTP_200_OK, response_model=TodoPage, response_model_exclude_unset=True)
+async def get_all_task(user: user_dependency, db: read_db_dependency, version: etag_version, limit: int = Query(50, gt=0, le=500),
+                       cursor: str | None = None, fields: str | None = None):
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized User")
 
-    data = db.query(Todo).filter(Todo.user_id == user.get("user_id")).all()
+    names = projection(fields)
+    # created_at and id are always selected so the next cursor can be built from the last row.
+    columns = [TODO_FIELDS[name] for name in dict.fromkeys([*names, "created_at", "id"])]
+
+    query = select(*columns).where(Todo.user_id == user.get("user_id"))
+    if cursor:
+        query = query.where(tuple_(Todo.created_at, Todo.id) > tuple_(*decode_cursor(cursor)))
+    query = query.order_by(Todo.created_at, Todo.id).limit(limit + 1)
+
+    async def load():
+        rows = (await db.execute(query)).mappings().all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
 
-    if data is not None:
-        return json.dumps(data)
+        return {
+            "todos": [{name: row[name] for name in names} for row in rows],
+            "next_cursor": next_cursor
+        }
 
+    return await todo_cache.fetch(user.get("user_id"), version, f"all:{limit}:{cursor}:{','.join(names)}", load)
 
 
-@todo.get("/get-todo/id/{todo_id}", status_code=status.HTTP_200_OK)
-async def get_task_by_id(user: user_dependency, db: db_dependency, todo_id: int = Path(gt=0)):
+
+@todo.get("/get-todo/id/{todo_id}", status_code=status.HTTP_200_OK, response_model=TodoResponse)
+async def get_task_by_id(user: user_dependency, db: read_db_dependency, version: etag_version, todo_id: int = Path(gt=0)):
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    data = db.query(Todo).filter(Todo.user_id == user.get("user_id")).filter(Todo.id == todo_id).first()
+    async def load():
+        data = await db.scalar(select(Todo).where(Todo.user_id == user.get("user_id")).where(Todo.id == todo_id))
 
-    if not data:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+        if not data:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+
+        return TodoResponse.model_validate(data).model_dump()
 
-    return json.dumps(data)
+    return await todo_cache.fetch(user.get("user_id"), version, f"id:{todo_id}", load)
 
 
 
-@todo.get("/get-todo/name/{todo_name}", status_code=status.HTTP_200_OK)
-async def get_task_by_name(user: user_dependency, db: db_dependency, todo_name: str = Path(max_length=55)):
+@todo.get("/get-todo/name/{todo_name}", status_code=status.HTTP_200_OK, dependencies=[Depends(todo_etag)], response_model=list[TodoResponse])
+async def get_task_by_name(user: user_dependency, db: read_db_dependency, todo_name: str = Path(max_length=55)):
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    data = db.query(Todo).filter(Todo.user_id == user.get("user_id")).filter(Todo.task == todo_name).all()
+    data = (await db.scalars(select(Todo).where(Todo.user_id == user.get("user_id")).where(Todo.task == todo_name))).all()
 
     if not data:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
 
-    return json.dumps(data)
+    return data
 
 
 
-@todo.get("/get-todo/status/{completed}", status_code=status.HTTP_200_OK)
-async def get_task_by_status(user: user_dependency, db: db_dependency, completed: bool):
+@todo.get("/get-todo/status/{completed}", status_code=status.HTTP_200_OK, response_model=list[TodoResponse])
+async def get_task_by_status(user: user_dependency, db: read_db_dependency, version: etag_version, completed: bool):
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    data = db.query(Todo).filter(Todo.user_id == user.get("user_id")).filter(Todo.completed == completed).all()
+    async def load():
+        data = (await db.scalars(select(Todo).where(Todo.user_id == user.get("user_id")).where(Todo.status == completed))).all()
 
-    if not data:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+        if not data:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+
+        return [TodoResponse.model_validate(item).model_dump() for item in data]
+
+    return await todo_cache.fetch(user.get("user_id"), version, f"status:{completed}", load)
+
+
+
+@todo.get("/search", status_code=status.HTTP_200_OK, response_model=TodoSearchPage)
+async def search_tasks(user: user_dependency, db: read_db_dependency, q: str = Query(min_length=1, max_length=100),
+                       completed: bool | None = None, priority: int | None = None,
+                       due_before: datetime | None = None, due_after: datetime | None = None,
+                       limit: int = Query(20, gt=0, le=100), offset: int = Query(0, ge=0, le=10000)):
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
+
+    where = filters(user.get("user_id"), completed, priority, due_before, due_after)
+    query = search_query(db.bind.dialect.name, q, where).limit(limit + 1).offset(offset)
+    data = (await db.scalars(query)).all()
+
+    return {
+        "todos": data[:limit],
+        "next_offset": offset + limit if len(data) > limit else None
+    }
 
-    return json.dumps(data)
+
+
+@todo.get("/archive", status_code=status.HTTP_200_OK, response_model=TodoArchivePage)
+async def get_archived_tasks(user: user_dependency, db: read_db_dependency, limit: int = Query(50, gt=0, le=500),
+                             cursor: str | None = None):
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
+
+    # Newest first, walking ix_TodoArchive_user_id_archived_at_id backwards from the cursor.
+    query = select(TodoArchive).where(TodoArchive.user_id == user.get("user_id"))
+    if cursor:
+        query = query.where(tuple_(TodoArchive.archived_at, TodoArchive.id) < tuple_(*decode_cursor(cursor)))
+    query = query.order_by(TodoArchive.archived_at.desc(), TodoArchive.id.desc()).limit(limit + 1)
+    data = (await db.scalars(query)).all()
+
+    next_cursor = None
+    if len(data) > limit:
+        data = data[:limit]
+        next_cursor = encode_cursor(data[-1].archived_at, data[-1].id)
+
+    return {
+        "todos": data,
+        "next_cursor": next_cursor
+    }
+
+
+
+@todo.get("/query", status_code=status.HTTP_200_OK, response_model=TodoQueryPage)
+async def query_tasks(user: user_dependency, db: read_db_dependency, filter: str | None = Query(None, max_length=500),
+                      sort: str | None = Query(None, max_length=100), limit: int = Query(20, gt=0, le=100),
+                      offset: int = Query(0, ge=0, le=10000), strict: bool = QUERY_STRICT):
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
+
+    clauses, keys = parse_filter(filter), parse_sort(sort)
+    problems, warnings = check_indexes(clauses, keys)
+    if strict and problems:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Query cannot use an index: {'; '.join(problems)}")
+
+    query = compile_query(db.bind.dialect.name, filters(user.get("user_id")), clauses, keys)
+    data = (await db.scalars(query.limit(limit + 1).offset(offset))).all()
+
+    return {
+        "todos": data[:limit],
+        "next_offset": offset + limit if len(data) > limit else None,
+        "warnings": problems + warnings
+    }
 
 
 
@@ -75,8 +338,9 @@ async def create_task(user: user_dependency, db: db_dependency, payload: CreateT
     )
 
     db.add(todo)
-    db.commit()
-    db.refresh(todo)
+    await db.flush()
+    await commit_changes(db, user.get("user_id"), "created", [todo.id])
+    await db.refresh(todo)
 
 
 
@@ -85,15 +349,15 @@ async def update_task_status(user: user_dependency, db: db_dependency, status: b
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    task = db.query(Todo).filter(Todo.user_id == user.get("user_id")).filter(Todo.id == todo_id).first()
+    task = await db.scalar(select(Todo).where(Todo.user_id == user.get("user_id")).where(Todo.id == todo_id))
     if task is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
+        raise HTTPException(status_code=404, detail="Todo not found")
 
-    task.completed = status
+    task.status = status
 
-    db.add(todo_update)
-    db.commit()
-    db.refresh(todo_update)
+    db.add(task)
+    await commit_changes(db, user.get("user_id"), "updated", [todo_id])
+    await db.refresh(task)
 
 
 
@@ -102,19 +366,110 @@ async def update_todo(user: user_dependency, db: db_dependency, payload: UpdateT
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    task = db.query(Todo).filter(Todo.user_id == user.get("user_id")).filter(Todo.id == todo_id).first()
+    task = await db.scalar(select(Todo).where(Todo.user_id == user.get("user_id")).where(Todo.id == todo_id))
 
     if task is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
 
     task.task = payload.tasks
     task.note = payload.note
-    task.status = payload.status
+    task.status = payload.completed
     task.due = payload.due
 
-    db.add(todo_data)
-    db.commit()
-    db.refresh(todo_data)
+    db.add(task)
+    await commit_changes(db, user.get("user_id"), "updated", [todo_id])
+    await db.refresh(task)
+
+
+
+@todo.get("/export", status_code=status.HTTP_200_OK)
+async def export_tasks(user: user_dependency, db: read_db_dependency, format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
+
+    # yield_per streams from a server-side cursor, so only one batch of rows is held at a time.
+    query = (select(*TODO_FIELDS.values()).where(Todo.user_id == user.get("user_id"))
+             .order_by(Todo.created_at, Todo.id).execution_options(yield_per=EXPORT_BATCH_SIZE))
+    result = await db.stream(query)
+
+    encode, media_type = EXPORT_FORMATS[format]
+    return StreamingResponse(encode(result), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="todos.{format}"'})
+
+
+
+@todo.post("/import", status_code=status.HTTP_200_OK)
+async def import_tasks(user: user_dependency, db: db_dependency, file: UploadFile,
+                       format: str | None = Query(None, pattern="^(ndjson|csv)$"),
+                       chunk_size: int = Query(IMPORT_CHUNK_SIZE, gt=0, le=10000), atomic: bool = IMPORT_ATOMIC):
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
+
+    if format is None:
+        format = "csv" if (file.filename or "").lower().endswith(".csv") else "ndjson"
+
+    # Rows are inserted while the progress stream is being sent, one chunk per executemany.
+    return StreamingResponse(run_import(db, user.get("user_id"), file.file, format, chunk_size, atomic),
+                             media_type="application/x-ndjson")
+
+
+# Bulk tasks router, each request is applied in a single transaction
+@todo.post("/bulk", status_code=status.HTTP_201_CREATED, response_model=BulkResponse)
+async def bulk_create_tasks(user: user_dependency, db: db_dependency,
+                            payload: Annotated[list[CreateTodo], Body(min_length=1, max_length=BULK_TODO_LIMIT)]):
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
+
+    rows = [{"task": item.tasks, "note": item.note, "user_id": user.get("user_id")} for item in payload]
+    ids = (await db.scalars(insert(Todo).returning(Todo.id, sort_by_parameter_order=True), rows)).all()
+    await commit_changes(db, user.get("user_id"), "created", ids)
+
+    return {"results": [{"index": index, "id": todo_id, "result": "created"} for index, todo_id in enumerate(ids)]}
+
+
+
+@todo.put("/bulk", status_code=status.HTTP_202_ACCEPTED, response_model=BulkResponse)
+async def bulk_update_tasks(user: user_dependency, db: db_dependency,
+                            payload: Annotated[list[BulkUpdateTodo], Body(min_length=1, max_length=BULK_TODO_LIMIT)]):
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
+
+    ids = {item.id for item in payload}
+    owned = set((await db.scalars(select(Todo.id).where(Todo.user_id == user.get("user_id")).where(Todo.id.in_(ids)))).all())
+
+    rows = {item.id: {"id": item.id, "task": item.tasks, "note": item.note, "status": item.completed, "due": item.due}
+            for item in payload if item.id in owned}
+    # Nothing matched means nothing changed, so the ETag version stays put.
+    if rows:
+        await db.execute(update(Todo), list(rows.values()))
+        await commit_changes(db, user.get("user_id"), "updated", list(rows))
+
+    return {"results": [{"index": index, "id": item.id, "result": "updated" if item.id in owned else "not_found"}
+                        for index, item in enumerate(payload)]}
+
+
+
+@todo.put("/bulk/complete", status_code=status.HTTP_202_ACCEPTED, response_model=BulkResponse)
+async def bulk_update_task_status(user: user_dependency, db: db_dependency,
+                                  payload: Annotated[list[BulkCompleteTodo], Body(min_length=1, max_length=BULK_TODO_LIMIT)]):
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
+
+    # The last entry wins when an id is repeated, then one UPDATE per target status.
+    wanted = {item.id: item.completed for item in payload}
+    updated = set()
+    for completed in (True, False):
+        ids = [todo_id for todo_id, value in wanted.items() if value is completed]
+        if not ids:
+            continue
+        query = (update(Todo).where(Todo.user_id == user.get("user_id")).where(Todo.id.in_(ids))
+                 .values(status=completed).returning(Todo.id).execution_options(synchronize_session=False))
+        updated.update((await db.scalars(query)).all())
+    if updated:
+        await commit_changes(db, user.get("user_id"), "updated", sorted(updated))
+
+    return {"results": [{"index": index, "id": item.id, "result": "updated" if item.id in updated else "not_found"}
+                        for index, item in enumerate(payload)]}
 
 
 # Delete tasks router
@@ -125,7 +480,7 @@ async def delete_single_task(user: user_dependency, db: db_dependency, todo_id:
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    todo_delete = db.query(Todo).filter(Todo.user_id == user.get("user_id")).filter(Todo.id == todo_id).first()
+    todo_delete = await db.scalar(select(Todo).where(Todo.user_id == user.get("user_id")).where(Todo.id == todo_id))
 
     if todo_delete is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
@@ -134,8 +489,8 @@ async def delete_single_task(user: user_dependency, db: db_dependency, todo_id:
     if delete_todo is not True:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad Request, Please try again later")
 
-    db.delete(todo_delete)
-    db.commit()
+    await db.delete(todo_delete)
+    await commit_changes(db, user.get("user_id"), "deleted", [todo_id])
 
 
 # Delete tasks router with completed todo
@@ -145,11 +500,10 @@ async def delete_all_completed_tasks(user: user_dependency, db: db_dependency, c
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    data = db.query(Todo).filter(Todo.user_id == user.get("user_id")).filter(Todo.completed == completed_todo).all()
+    # One DELETE ... RETURNING, the returned ids tell whether anything matched.
+    rows = await db.run_sync(remove_todos, and_(Todo.user_id == user.get("user_id"), Todo.status == completed_todo))
 
-    if not data:
+    if not rows:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No Todo available")
 
-    db.query(Todo).filter(Todo.user_id == user.get("user_id")).filter(Todo.completed == completed_todo).delete()
-
-    db.commit()
+    await commit_changes(db, user.get("user_id"), "deleted", [todo_id for _, todo_id in rows])
@@ -1,53 +1,75 @@
 import uuid
-import json
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from starlette import status
-from datetime import timedelta
-from ..config import hashed, db_dependency, authentication, authorization, user_dependency, otp_authentication, otp_token_verification, otp_dependency, otp_email, password_email, signup_email, delete_email, generate_otp
-from schema.user_schema import SignupForm, LoginForm, Token, UserDetails, UpdateUser, NewPassword, ForgotPassowrd, OTPGeneration, OTPVerification
-from database.model_db import Todo, User, Otp
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from ..config import read_db_dependency, track_writes, revoke_sessions, hash_password, verify_password, db_dependency, authentication, authorization, user_dependency, otp_authentication, otp_token_verification, otp_dependency, otp_email, password_email, signup_email, delete_email, generate_otp
+from ..otp_store import otp_store, PASSWORD, DELETION, VALID, EXPIRED, USED
+from schema.user_schema import SignupForm, LoginForm, Token, UserDetails, UpdateUser, NewPassword, ForgotPassowrd, OTPGeneration, OTPVerification, OTPEmailVerification, OTPToken, Message
+from database.model_db import User
 
 
 user = APIRouter()
 
+UNIQUE_FIELDS = {"uq_User_username": "username", "uq_User_email": "email"}
 
 
-@user.post("/signup", status_code=status.HTTP_201_CREATED)
-async def user_signup(payload: SignupForm, db: db_dependency):
-    existing_username = db.query(User).filter(User.username == payload.username).first()
-    existing_email = db.query(User).filter(User.email == payload.email).first()
-    
-    if existing_email and existing_username:
-        raise HTTPException(status_code=status.HTTP_226_IM_USED, detail="username and email already in use!")
-    elif existing_username:
-        raise HTTPException(status_code=status.HTTP_226_IM_USED, detail="username is already in use!")
-    elif existing_email:
-        raise HTTPException(status_code=status.HTTP_226_IM_USED, detail="email is already in use!")
+def taken_field(error: IntegrityError):
+    # Postgres names the constraint that failed, SQLite the column.
+    message = str(error.orig)
+    for name, field in UNIQUE_FIELDS.items():
+        if name in message or f"User.{field}" in message:
+            return field
+    raise error
+
+
+
+def check_otp(result: str):
+    if result == EXPIRED:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expired otp!")
+    if result == USED:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Used otp!")
+    if result != VALID:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Invalid otp!")
+
 
+
+@user.post("/signup", status_code=status.HTTP_201_CREATED, response_model=Message)
+async def user_signup(payload: SignupForm, db: db_dependency):
     user = User(
         id=str(uuid.uuid4()),
         firstname=payload.firstname,
         lastname=payload.lastname,
         username=payload.username,
         email=payload.email,
-        password=hashed.hash(payload.password)
+        password=await hash_password(payload.password)
 
     )
     
 
+    # The unique constraints decide, so two signups racing for a name cannot both get it.
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    try:
+        await db.commit()
+    except IntegrityError as error:
+        await db.rollback()
+        field = taken_field(error)
+        # The database stops at the first clash, the other field may be taken too.
+        other = "email" if field == "username" else "username"
+        if await db.scalar(select(User.id).where(getattr(User, other) == getattr(payload, other))):
+            raise HTTPException(status_code=status.HTTP_226_IM_USED, detail="username and email already in use!")
+        raise HTTPException(status_code=status.HTTP_226_IM_USED, detail=f"{field} is already in use!")
 
-    signup_email(user.email, user.username)
+    signup_email(payload.email, payload.username)
     
-    return json.dumps({"message": "User Signed up sucessfully"})
+    return {"message": "User Signed up sucessfully"}
 
 
 
-@user.post("/login", status_code=status.HTTP_202_ACCEPTED)
+@user.post("/login", status_code=status.HTTP_202_ACCEPTED, response_model=Token)
 async def user_login(payload: LoginForm, db: db_dependency):
-    user = authorization(payload.username, payload.password, db)
+    user = await authorization(payload.username, payload.password, db)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid username or password!")
 
@@ -57,167 +79,137 @@ async def user_login(payload: LoginForm, db: db_dependency):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="Error trying to log you in please try again later")
 
-    return json.dumps(Token(
+    return Token(
         access_token=token,
         token_type="bearer"
-    ).dict())
+    )
 
 
 
-@user.get("/get-user-details", status_code=status.HTTP_200_OK)
-async def get_current_user_details(user: user_dependency, db: db_dependency):
+@user.get("/get-user-details", status_code=status.HTTP_200_OK, response_model=UserDetails)
+async def get_current_user_details(user: user_dependency, db: read_db_dependency):
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
-    user_data = db.query(User).filter(User.id == user.get("user_id")).first()
+    user_data = await db.scalar(select(User).where(User.id == user.get("user_id")))
 
     if not user_data:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to fetch user info")
 
-    userDetails = UserDetails(
-        firstname=user_data.firstname,
-        lastname=user_data.lastname,
-        username=user_data.username
-        email=user_data.email
-    )
-    
-    return json.dumps(userDetails.dict())
+    return UserDetails.model_validate(user_data)
 
 
 
-@user.put("/update-user-details", status_code=status.HTTP_202_ACCEPTED)
+@user.put("/update-user-details", status_code=status.HTTP_202_ACCEPTED, response_model=Message, dependencies=[Depends(track_writes)])
 async def update_user_details(user: user_dependency, payload: UpdateUser, db: db_dependency):
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    user_details = db.query(User).filter(User.id == user.get("user_id")).first()
-
-    existing_email = db.query(User).filter(User.email == payload.email).first()
-    existing_username = db.query(User).filter(User.username == payload.username).first()
-
-    if existing_email is not None and existing_email.email != user_details.email:
-        raise HTTPException(status_code=status.HTTP_226_IM_USED, detail="email is already in use")
-
-    if existing_username is not None and existing_username.username != user1.username:
-        raise HTTPException(status_code=status.HTTP_226_IM_USED, detail="username is already in use")
-
-    user_details.firstname = payload.firstname
-    user_details.lastname = payload.lastname
-    user_details.email = payload.email
-    user_details.username = payload.username
-
-
-    db.add(user_details)
-    db.commit()
-    db.refresh(user_details)
+    try:
+        result = await db.execute(update(User).where(User.id == user.get("user_id")).values(
+            firstname=payload.firstname,
+            lastname=payload.lastname,
+            email=payload.email,
+            username=payload.username
+        ))
+        await db.commit()
+    except IntegrityError as error:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_226_IM_USED, detail=f"{taken_field(error)} is already in use")
+
+    if not result.rowcount:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to fetch user details")
 
-    return json.dumps({"message": "User details has been updated successfully."})
+    return {"message": "User details has been updated successfully."}
 
 
 
-@user.put("/update-user-password", status_code=status.HTTP_202_ACCEPTED)
+@user.put("/update-user-password", status_code=status.HTTP_202_ACCEPTED, response_model=Message)
 async def change_user_password(user: user_dependency, payload: NewPassword, db: db_dependency):
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    user_details = db.query(User).filter(User.id == user.get("user_id")).first()
+    user_details = await db.scalar(select(User).where(User.id == user.get("user_id")))
 
     if not user_details:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to fetch user details")
 
-    password = hashed.verify(payload.password, user_details.password)
+    password = await verify_password(payload.password, user_details.password)
     if not password:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Password!")
 
     if payload.new_password != payload.confirm_password:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Password does not match")
 
-    user_details.password = hashed.hash(payload.new_password)
+    user_details.password = await hash_password(payload.new_password)
 
 
     db.add(user_details)
-    db.commit()
-    db.refresh(user_details)
+    await db.commit()
+    await db.refresh(user_details)
+    await revoke_sessions(user_details.id)
     
     password_email(user_details.email, user_details.username)
 
-    return json.dumps({"message": "Password has been updated successfully"})
+    return {"message": "Password has been updated successfully"}
 
 
 
-@user.get("/generate-otp", status_code=status.HTTP_200_OK)
+@user.get("/generate-otp", status_code=status.HTTP_200_OK, response_model=Message)
 async def user_forgot_password(db: db_dependency, payload: OTPGeneration):
-    user = db.query(User).filter(User.email == payload.email).first()
+    user = await db.scalar(select(User).where(User.email == payload.email).where(User.deleted_at.is_(None)))
 
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Email not found!")
 
     otp = generate_otp()
-    
-    otp_obj = Otp(
-        otp=otp,
-        user_id=user.id
-    )
-    
-    otp_email(user.email, user.username, otp)
+    await otp_store.issue(db, user.id, PASSWORD, otp)
 
-    db.add(otp_obj)
-    db.commit()
-    db.refresh(otp_obj)
+    otp_email(user.email, user.username, otp)
     
-    return json.dumps({"message": "Email sent successfully"})
+    return {"message": "Email sent successfully"}
 
 
 
-@user.get("/verify-otp", status_code=status.HTTP_200_OK)
-async def verify_otp(db: db_dependency, payload: OTPVerification):
-    otp = db.query(Otp).filter(Otp.otp == payload.otp).first()
+@user.get("/verify-otp", status_code=status.HTTP_200_OK, response_model=OTPToken)
+async def verify_otp(db: db_dependency, payload: OTPEmailVerification):
+    user_id = await db.scalar(select(User.id).where(User.email == payload.email).where(User.deleted_at.is_(None)))
     
-    if not otp or otp.tag != "Password":
+    if not user_id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Invalid otp!")
     
-    if otp.expiring > datetime.now():
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expired otp!")
-    
-    if otp.is_used:
-        raised HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Used otp!")
+    check_otp(await otp_store.consume(db, user_id, PASSWORD, payload.otp))
     
-    
-    token = otp_authentication(otp.user_id)
+    token = otp_authentication(user_id)
     
     if not token:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="An error occured while validating otp")
     
-    otp.is_used = True
-    
-    db.add(otp)
-    db.commit()
-    db.refresh(otp)
+    return OTPToken(token=token)
     
-    return json.dumps({"token": token})
     
     
-    
-@user.put("/change-user-password", status_code=status.HTTP_202_ACCEPTED)
-async def change_user_password(db: db_dependency, otp: otp_dependency, payload: ForgotPassword):
+@user.put("/change-user-password", status_code=status.HTTP_202_ACCEPTED, response_model=Message)
+async def change_user_password(db: db_dependency, otp: otp_dependency, payload: ForgotPassowrd):
     if not otp:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid session token")
     
-    user = db.query(User).filter(User.id == otp.get("user_id")).first()
+    user = await db.scalar(select(User).where(User.id == otp.get("user_id")))
     
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found!")
     
-    hashed_password = hashed.hash(payload.new_password)
+    hashed_password = await hash_password(payload.new_password)
     
     user.password = hashed_password
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    await revoke_sessions(user.id)
     
     password_email(user.email, user.username)
     
-    return json.dumps({"message": "Password Changed Successfully"})
+    return {"message": "Password Changed Successfully"}
 
 
 
@@ -225,24 +217,15 @@ async def change_user_password(db: db_dependency, otp: otp_dependency, payload:
 async def delete_user_request(user: user_dependency, db: db_dependency):
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
-    user_details = db.query(User).filter(User.id == user.get("user_id")).first()
+    user_details = await db.scalar(select(User).where(User.id == user.get("user_id")))
     
     if not user_details:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to fetch user details")
     
     otp = generate_otp()
+    await otp_store.issue(db, user_details.id, DELETION, otp)
     
-    otp_obj = Otp(
-        otp=otp,
-        tag="Deletion"
-        user_id=user.id
-    )
-    
-    delete_email(user.email, user.username, otp)
-    
-    db.add(otp_obj)
-    db.commit()
-    db.refresh(otp_obj)
+    delete_email(user_details.email, user_details.username, otp)
     
     
 @user.delete("/delete-user", status_code=status.HTTP_204_NO_CONTENT)
@@ -250,19 +233,11 @@ async def delete_user(user: user_dependency, db: db_dependency, payload: OTPVeri
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized user")
 
-    otp = db.query(Otp).filter(Otp.user_id == user.get("user_id")).filter(Otp.otp == payload.otp).first()
-    
-    if not otp or otp.tag != "Deletion":
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Invalid otp!")
-    
-    if otp.expiring > datetime.now():
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expired otp!")
-    
-    if otp.is_used:
-        raised HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Used otp!")
+    check_otp(await otp_store.consume(db, user.get("user_id"), DELETION, payload.otp))
     
-    db.query(Todo).filter(Todo.user_id == user.get("user_id")).delete()
-    db.query(Otp).filter(Otp.user_id == user.get("user_id")).delete()
-    db.query(User).filter(User.id == user.get("user_id")).delete()
+    # Only marked here, the scheduler's account_deletion job removes the rows in chunks.
+    await db.execute(update(User).where(User.id == user.get("user_id")).values(deleted_at=datetime.now()))
 
-    db.commit()
+    await db.commit()
+    await revoke_sessions(user.get("user_id"))
+    await otp_store.discard(db, user.get("user_id"))
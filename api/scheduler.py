@@ -0,0 +1,258 @@
+import os
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Callable, Awaitable
+from dotenv import load_dotenv
+from sqlalchemy import select, update, delete, text, func, tuple_
+from database.database import engine
+from database.model_db import User, Todo, TodoArchive, Otp
+from database.archive import remove_todos, month_start, partition_ddl
+from .events import bus
+from . import metrics
+
+
+load_dotenv()
+
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+SCHEDULER_TICK = float(os.getenv("SCHEDULER_TICK", "5"))
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "500"))
+# Any constant the other applications on the database do not use.
+SCHEDULER_LOCK_ID = int(os.getenv("SCHEDULER_LOCK_ID", "7041825"))
+OTP_PURGE_INTERVAL = float(os.getenv("OTP_PURGE_INTERVAL", "300"))
+STATS_REFRESH_INTERVAL = float(os.getenv("STATS_REFRESH_INTERVAL", "3600"))
+# Completed todos created longer ago than this are removed, 0 keeps them forever.
+TODO_RETENTION_DAYS = int(os.getenv("TODO_RETENTION_DAYS", "0"))
+TODO_PURGE_INTERVAL = float(os.getenv("TODO_PURGE_INTERVAL", "3600"))
+ACCOUNT_DELETION_INTERVAL = float(os.getenv("ACCOUNT_DELETION_INTERVAL", "30"))
+ARCHIVE_PARTITION_INTERVAL = float(os.getenv("ARCHIVE_PARTITION_INTERVAL", "86400"))
+# Monthly archive partitions kept ready beyond the current one.
+ARCHIVE_PARTITIONS_AHEAD = int(os.getenv("ARCHIVE_PARTITIONS_AHEAD", "2"))
+
+logger = logging.getLogger("todoapi.scheduler")
+
+
+@dataclass
+class Job:
+    """A periodic job made of batches, each batch runs in its own short transaction.
+
+    step(connection, batch_size) returns the rows it touched, the job repeats it until a batch
+    comes back short. after(rows) runs on the event loop once a batch has committed.
+    """
+
+    name: str
+    interval: float
+    step: Callable
+    after: Callable[[list], Awaitable] | None = None
+    next_run: float = 0
+    last_run: dict = field(default_factory=dict)
+
+
+def purge_otps(connection, batch_size):
+    # Used codes are kept until they expire so a second attempt still reads as used.
+    batch = select(Otp.id).where(Otp.expiring < datetime.now()).limit(batch_size).scalar_subquery()
+    return connection.execute(delete(Otp).where(Otp.id.in_(batch)).returning(Otp.id)).all()
+
+
+def purge_completed_todos(connection, batch_size):
+    cutoff = datetime.now() - timedelta(days=TODO_RETENTION_DAYS)
+    batch = select(Todo.id).where(Todo.status.is_(True), Todo.created_at < cutoff).limit(batch_size).scalar_subquery()
+    rows = remove_todos(connection, Todo.id.in_(batch))
+    # Same transaction as the delete, like every other todo write, so ETags move with the rows.
+    user_ids = {user_id for user_id, _ in rows}
+    if user_ids:
+        connection.execute(update(User).where(User.id.in_(user_ids)).values(todo_version=User.todo_version + 1))
+    return rows
+
+
+async def announce_deleted_todos(rows):
+    deleted = defaultdict(list)
+    for user_id, todo_id in rows:
+        deleted[user_id].append(todo_id)
+    for user_id, ids in deleted.items():
+        await bus.publish_change(user_id, "deleted", ids)
+
+
+def delete_accounts(connection, batch_size):
+    """Removes accounts marked deleted, oldest first, a chunk of their todos at a time.
+
+    The account row goes last, once its todos and codes are gone. ON DELETE CASCADE would remove them
+    with the account on Postgres too, but as one statement that grows with the account.
+    """
+    pending = select(User.id).where(User.deleted_at.is_not(None))
+    rows = []
+    while len(rows) < batch_size:
+        user_id = connection.scalar(pending.order_by(User.deleted_at).limit(1))
+        if user_id is None:
+            break
+        limit = batch_size - len(rows)
+        chunk = select(Todo.id).where(Todo.user_id == user_id).limit(limit).scalar_subquery()
+        deleted = connection.execute(delete(Todo).where(Todo.id.in_(chunk)).returning(Todo.id)).all()
+        if len(deleted) < limit:
+            # The archive keeps no foreign key to cascade from, its rows go in chunks after the todos.
+            archived = (select(TodoArchive.id, TodoArchive.archived_at).where(TodoArchive.user_id == user_id)
+                        .limit(limit - len(deleted)))
+            deleted += connection.execute(delete(TodoArchive).where(tuple_(TodoArchive.id, TodoArchive.archived_at).in_(archived))
+                                          .returning(TodoArchive.id)).all()
+        rows += deleted
+        if len(deleted) == limit:
+            break
+        connection.execute(delete(Otp).where(Otp.user_id == user_id))
+        connection.execute(delete(User).where(User.id == user_id))
+        rows.append(user_id)
+        logger.info("Deleted account %s", user_id)
+    metrics.gauge("accounts_pending_deletion", "Accounts marked deleted whose rows are still being removed").set(
+        connection.scalar(select(func.count()).select_from(pending.subquery())))
+    return rows
+
+
+def create_archive_partitions(connection, batch_size):
+    # A month whose rows already sit in the default partition can no longer get its own, so stay ahead.
+    if connection.dialect.name == "postgresql":
+        for months in range(ARCHIVE_PARTITIONS_AHEAD + 1):
+            connection.exec_driver_sql(partition_ddl(month_start(date.today(), months)))
+    return []
+
+
+def refresh_stats(connection, batch_size):
+    # VACUUM cannot run inside a transaction and locks SQLite whole, autovacuum covers Postgres.
+    if connection.dialect.name == "postgresql":
+        for table in ("User", "Todo", "TodoArchive", "Otp"):
+            connection.exec_driver_sql(f'ANALYZE "{table}"')
+    elif connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("PRAGMA optimize")
+    return []
+
+
+class Scheduler:
+    """Runs registered jobs on one worker of the fleet.
+
+    Leadership is a Postgres advisory lock held by a dedicated connection: when the leader dies
+    its session ends, the lock is released and another worker takes over on its next tick. Other
+    databases run in a single process, so the scheduler there is always the leader. Batches run in
+    a thread on the sync engine, so maintenance never waits on or blocks the request loop.
+    """
+
+    def __init__(self, engine, jobs=(), batch_size=SCHEDULER_BATCH_SIZE, tick=SCHEDULER_TICK, lock_id=SCHEDULER_LOCK_ID):
+        self.engine = engine
+        self.jobs = {job.name: job for job in jobs}
+        self.batch_size = batch_size
+        self.tick = tick
+        self.lock_id = lock_id
+        self.lock_connection = None
+        self.task = None
+        self.is_leader = metrics.gauge("scheduler_leader", "1 while this worker runs the maintenance jobs")
+
+    def register(self, job: Job):
+        self.jobs[job.name] = job
+
+    def start(self):
+        if SCHEDULER_ENABLED and self.task is None:
+            self.task = asyncio.create_task(self.loop())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await asyncio.to_thread(self.resign)
+
+    async def loop(self):
+        while True:
+            try:
+                if await asyncio.to_thread(self.elect):
+                    await self.run_pending()
+            except Exception:
+                logger.exception("Scheduler tick failed")
+            await asyncio.sleep(self.tick)
+
+    def elect(self):
+        if self.engine.dialect.name != "postgresql":
+            self.is_leader.set(1)
+            return True
+        try:
+            if self.lock_connection is not None:
+                # The lock lives as long as this session, make sure it still does.
+                self.lock_connection.scalar(text("SELECT 1"))
+                # End the ping's implicit transaction, the session lock does not need one.
+                self.lock_connection.commit()
+                return True
+            connection = self.engine.connect()
+            if connection.scalar(text("SELECT pg_try_advisory_lock(:id)"), {"id": self.lock_id}):
+                connection.commit()
+                self.lock_connection = connection
+                self.is_leader.set(1)
+                logger.info("Scheduler leadership acquired")
+                return True
+            connection.close()
+        except Exception:
+            logger.exception("Scheduler election failed")
+            self.resign()
+        return False
+
+    def resign(self):
+        if self.lock_connection is not None:
+            try:
+                self.lock_connection.close()
+            except Exception:
+                pass
+            self.lock_connection = None
+        self.is_leader.set(0)
+
+    async def run_pending(self):
+        now = time.monotonic()
+        for job in list(self.jobs.values()):
+            if job.next_run <= now:
+                await self.run(job)
+                job.next_run = time.monotonic() + job.interval
+
+    def batch(self, job):
+        with self.engine.begin() as connection:
+            return job.step(connection, self.batch_size)
+
+    async def run(self, job: Job):
+        started = time.perf_counter()
+        touched = 0
+        result = "ok"
+        try:
+            while True:
+                rows = await asyncio.to_thread(self.batch, job)
+                touched += len(rows)
+                if job.after is not None and rows:
+                    await job.after(rows)
+                if len(rows) < self.batch_size:
+                    break
+        except Exception:
+            result = "error"
+            logger.exception("Maintenance job %s failed", job.name)
+        elapsed = time.perf_counter() - started
+
+        metrics.histogram("maintenance_job_seconds", "Run time of a maintenance job", job=job.name).observe(elapsed)
+        metrics.counter("maintenance_rows_total", "Rows touched by maintenance jobs", job=job.name).inc(touched)
+        metrics.counter("maintenance_runs_total", "Maintenance job runs by outcome", job=job.name, result=result).inc()
+        job.last_run = {"finished_at": datetime.now().isoformat(timespec="seconds"), "seconds": round(elapsed, 4),
+                        "rows": touched, "result": result}
+        return touched
+
+    def status(self):
+        return {
+            "leader": bool(self.is_leader.value),
+            "jobs": {name: {"interval": job.interval, **job.last_run} for name, job in self.jobs.items()},
+        }
+
+
+scheduler = Scheduler(engine, [
+    Job("otp_purge", OTP_PURGE_INTERVAL, purge_otps),
+    Job("account_deletion", ACCOUNT_DELETION_INTERVAL, delete_accounts),
+    Job("stats_refresh", STATS_REFRESH_INTERVAL, refresh_stats),
+    Job("archive_partitions", ARCHIVE_PARTITION_INTERVAL, create_archive_partitions),
+])
+if TODO_RETENTION_DAYS > 0:
+    scheduler.register(Job("completed_todo_purge", TODO_PURGE_INTERVAL, purge_completed_todos, announce_deleted_todos))
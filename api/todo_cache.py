@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from . import metrics
+from .responses import dumps
+
+
+load_dotenv()
+
+
+TODO_CACHE_BACKEND = os.getenv("TODO_CACHE_BACKEND", "memory")
+TODO_CACHE_SIZE = int(os.getenv("TODO_CACHE_SIZE", "10000"))
+TODO_CACHE_TTL = int(os.getenv("TODO_CACHE_TTL", "300"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class MemoryBackend:
+    """In-process LRU with a TTL per entry."""
+
+    def __init__(self, maxsize=TODO_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    async def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    async def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+class RedisBackend:
+    """Stores entries in Redis through any client with the redis.asyncio get/set interface."""
+
+    def __init__(self, client, prefix="todoapi:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url=REDIS_URL):
+        import redis.asyncio as redis
+        return cls(redis.Redis.from_url(url))
+
+    async def get(self, key):
+        value = await self.client.get(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+    async def set(self, key, value, ttl):
+        await self.client.set(self.prefix + key, dumps(value), ex=ttl)
+
+
+class TodoCache:
+    """Caches per-user todo reads under the User.todo_version the request's ETag was built from.
+
+    Every todo write bumps that column in its own transaction, so the next read on any worker
+    looks under a new key and entries of older versions are never read again and age out.
+    """
+
+    def __init__(self, backend, ttl=TODO_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = metrics.counter("todo_cache_hits_total", "Todo reads served from the cache")
+        self.misses = metrics.counter("todo_cache_misses_total", "Todo reads that went to the database")
+        self.hit_ratio = metrics.gauge("todo_cache_hit_ratio", "Share of todo reads served from the cache")
+        self.saved = metrics.counter("todo_cache_saved_seconds_total", "Database time the cached reads took when they were loaded")
+
+    def record(self, hit):
+        (self.hits if hit else self.misses).inc()
+        self.hit_ratio.set(round(self.hits.value / (self.hits.value + self.misses.value), 4))
+
+    async def fetch(self, user_id, version, key, load):
+        if self.backend is None:
+            return await load()
+
+        entry_key = f"todo:{user_id}:{version}:{key}"
+        entry = await self.backend.get(entry_key)
+        if entry is not None:
+            self.record(hit=True)
+            self.saved.inc(entry["cost"])
+            return entry["value"]
+
+        self.record(hit=False)
+        started = time.perf_counter()
+        value = await load()
+        await self.backend.set(entry_key, {"value": value, "cost": time.perf_counter() - started}, self.ttl)
+        return value
+
+
+BACKENDS = {
+    "memory": MemoryBackend,
+    "redis": RedisBackend.from_url,
+    "none": lambda: None,
+}
+
+todo_cache = TodoCache(BACKENDS[TODO_CACHE_BACKEND]())
@@ -0,0 +1,136 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from . import metrics
+
+
+load_dotenv()
+
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# Longest lifetime of any token we issue, revocations older than this can be forgotten.
+TOKEN_MAX_AGE = int(os.getenv("TOKEN_MAX_AGE", "3600"))
+# memory keeps revocations in this process, redis shares them with every worker.
+TOKEN_REVOCATION_BACKEND = os.getenv("TOKEN_REVOCATION_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class MemoryRevocations:
+    """When each user's sessions were last revoked, seen only by this process."""
+
+    def __init__(self):
+        self.revoked = {}
+        self.lock = threading.Lock()
+
+    async def revoked_at(self, user_id):
+        return self.revoked.get(user_id)
+
+    async def revoke(self, user_id, at, ttl):
+        with self.lock:
+            self.revoked = {user: since for user, since in self.revoked.items() if since > at - ttl}
+            self.revoked[user_id] = at
+
+    def clear(self):
+        with self.lock:
+            self.revoked.clear()
+
+
+class RedisRevocations:
+    """Revocation times in Redis, so a password change or account deletion reaches every worker."""
+
+    def __init__(self, client, prefix="todoapi:revoked:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url=REDIS_URL):
+        import redis.asyncio as redis
+        return cls(redis.Redis.from_url(url))
+
+    async def revoked_at(self, user_id):
+        value = await self.client.get(self.prefix + user_id)
+        return None if value is None else float(value)
+
+    async def revoke(self, user_id, at, ttl):
+        await self.client.set(self.prefix + user_id, repr(at), ex=ttl)
+
+    def clear(self):
+        pass
+
+
+class TokenCache:
+    """LRU of decoded JWT claims keyed by token digest, each entry living until the token's exp.
+
+    revoke_user drops the user's cached entries and records the time in the revocation backend,
+    any of their tokens issued up to then is rejected. Claims are only cached per process, so
+    every check still asks the backend whether the user was revoked since.
+    """
+
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE, max_age=TOKEN_MAX_AGE, revocations=None):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.entries = OrderedDict()
+        self.revocations = revocations or MemoryRevocations()
+        self.lock = threading.Lock()
+        self.hits = metrics.counter("token_cache_hits_total", "Tokens served from the verified-token cache")
+        self.misses = metrics.counter("token_cache_misses_total", "Tokens that needed a full jwt.decode")
+        self.size = metrics.gauge("token_cache_size", "Tokens held in the verified-token cache")
+
+    @staticmethod
+    def key(token: str):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str):
+        key = self.key(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry["exp"] > time.time():
+                self.entries.move_to_end(key)
+                self.hits.inc()
+                return entry
+            if entry is not None:
+                del self.entries[key]
+                self.size.set(len(self.entries))
+        self.misses.inc()
+        return None
+
+    def put(self, token: str, claims: dict):
+        if claims.get("exp") is None:
+            return
+        with self.lock:
+            self.entries[self.key(token)] = claims
+            self.entries.move_to_end(self.key(token))
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+            self.size.set(len(self.entries))
+
+    async def is_revoked(self, claims: dict):
+        revoked_at = await self.revocations.revoked_at(claims.get("id"))
+        if revoked_at is None:
+            return False
+        # A token issued in the same millisecond as the revocation is revoked with it.
+        return claims.get("iat", 0) <= revoked_at
+
+    async def revoke_user(self, user_id: str):
+        await self.revocations.revoke(user_id, time.time(), self.max_age)
+        with self.lock:
+            for key in [key for key, claims in self.entries.items() if claims.get("id") == user_id]:
+                del self.entries[key]
+            self.size.set(len(self.entries))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size.set(0)
+        self.revocations.clear()
+
+
+REVOCATION_BACKENDS = {
+    "memory": MemoryRevocations,
+    "redis": RedisRevocations.from_url,
+}
+
+token_cache = TokenCache(revocations=REVOCATION_BACKENDS[TOKEN_REVOCATION_BACKEND]())
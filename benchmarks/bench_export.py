@@ -0,0 +1,113 @@
+"""Streams a 1M-row todo export and asserts peak RSS growth stays under a ceiling.
+
+Run with: python -m benchmarks.bench_export [rows] [ceiling_mb]
+
+ru_maxrss is a process-lifetime peak, so each format is exported in its own subprocess
+against the database the parent seeded.
+"""
+import os
+import sys
+import time
+import subprocess
+import sqlite3
+import asyncio
+import resource
+import tempfile
+from datetime import datetime
+
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+RSS_CEILING_MB = float(sys.argv[2]) if len(sys.argv) > 2 else 64
+FORMAT = sys.argv[3] if len(sys.argv) > 3 else None
+
+path = os.getenv("EXPORT_BENCH_DB") or os.path.join(tempfile.mkdtemp(), "export.sqlite")
+os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+os.environ.setdefault("SECRET_KEY", "bench-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("SCHEME", "bcrypt")
+os.environ.setdefault("MAIL_TRANSPORT", "memory")
+
+from fastapi.testclient import TestClient
+from api.main import app
+from api.config import get_user
+
+
+def current_rss_mb():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed(rows):
+    now = datetime(2026, 1, 1).isoformat(sep=" ")
+    connection = sqlite3.connect(path)
+    connection.execute("INSERT INTO User (id, firstname, lastname, username, email, password, timezone, created_at, role) "
+                       "VALUES ('1', 'Bench', 'User', 'benchuser', 'bench@gmail.com', 'x', 'UTC', ?, 'user')", (now,))
+    batch = 50_000
+    for start in range(0, rows, batch):
+        connection.executemany(
+            "INSERT INTO Todo (task, note, status, priority, created_at, due, user_id) VALUES (?, ?, 0, 1, ?, ?, '1')",
+            ((f"Task {i}", "Exported note", now, now) for i in range(start, min(start + batch, rows))),
+        )
+    connection.commit()
+    connection.close()
+
+
+async def export(format):
+    # Drive the ASGI app directly and drop each chunk, TestClient would buffer the whole body.
+    totals = {"size": 0, "lines": 0}
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/todo/export", "raw_path": b"/todo/export", "root_path": "", "query_string": f"format={format}".encode(),
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+
+    requested = asyncio.Event()
+
+    async def receive():
+        if requested.is_set():
+            # Block like a connected client until the response is done.
+            await asyncio.Event().wait()
+        requested.set()
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200, message
+        elif message["type"] == "http.response.body":
+            totals["size"] += len(message.get("body", b""))
+            totals["lines"] += message.get("body", b"").count(b"\n")
+
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    return time.perf_counter() - started, totals["size"], totals["lines"]
+
+
+def measure(format):
+    app.dependency_overrides[get_user] = lambda: {"role": "user", "user_id": "1"}
+    with TestClient(app) as client:
+        baseline = current_rss_mb()
+        elapsed, size, lines = client.portal.call(export, format)
+        growth = peak_rss_mb() - baseline
+    print(f"{format:>6}: {lines:,} lines, {size / 2**20:.1f} MiB in {elapsed:.1f}s, peak RSS growth {growth:.1f} MiB")
+    assert lines >= ROWS, f"expected {ROWS} rows, streamed {lines}"
+    assert growth < RSS_CEILING_MB, f"{format} export grew RSS by {growth:.1f} MiB, ceiling is {RSS_CEILING_MB} MiB"
+
+
+def main():
+    # Starting the app runs the migrations, then the parent only seeds.
+    with TestClient(app):
+        seed(ROWS)
+    env = dict(os.environ, EXPORT_BENCH_DB=path)
+    failed = False
+    for format in ("ndjson", "csv"):
+        command = [sys.executable, "-m", "benchmarks.bench_export", str(ROWS), str(RSS_CEILING_MB), format]
+        failed |= subprocess.run(command, env=env).returncode != 0
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    measure(FORMAT) if FORMAT else main()
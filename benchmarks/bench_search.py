@@ -0,0 +1,95 @@
+"""Times /todo/search against a naive LIKE '%term%' query on a large seeded SQLite database.
+
+Run with: python -m benchmarks.bench_search [rows]
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+import statistics
+from datetime import datetime
+
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+QUERIES = ("invoice", "dentist", "renew passport", "voic")
+MISSING = "zyzzyva"
+REPEAT = 5
+
+path = os.path.join(tempfile.mkdtemp(), "search.sqlite")
+os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+os.environ["ASYNC_DATABASE"] = "false"
+os.environ.setdefault("SECRET_KEY", "bench-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("SCHEME", "bcrypt")
+os.environ.setdefault("MAIL_TRANSPORT", "memory")
+os.environ.setdefault("TODO_CACHE_BACKEND", "none")
+
+from fastapi.testclient import TestClient
+from api.main import app
+from api.config import get_user
+
+
+def word(rng):
+    return "".join(rng.choice("bcdfghklmnprstvz") + rng.choice("aeiou") for _ in range(rng.randint(2, 4)))
+
+
+def seed(rows):
+    now = datetime(2026, 1, 1).isoformat(sep=" ")
+    rng = random.Random(0)
+    vocabulary = [word(rng) for _ in range(20_000)]
+    # Each query term shows up in about one todo in a thousand, like a real name or place would.
+    planted = [term for q in QUERIES for term in q.split()]
+
+    def text(count):
+        words = rng.sample(vocabulary, count)
+        if rng.random() < 0.001 * len(planted):
+            words[0] = rng.choice(planted)
+        return " ".join(words)
+
+    connection = sqlite3.connect(path)
+    connection.execute("INSERT INTO User (id, firstname, lastname, username, email, password, timezone, created_at, role) "
+                       "VALUES ('1', 'Bench', 'User', 'benchuser', 'bench@gmail.com', 'x', 'UTC', ?, 'user')", (now,))
+    batch = 50_000
+    for start in range(0, rows, batch):
+        connection.executemany(
+            "INSERT INTO Todo (task, note, status, priority, created_at, due, user_id) VALUES (?, ?, ?, 1, ?, ?, '1')",
+            ((text(3), text(8), i % 2, now, now) for i in range(start, min(start + batch, rows))),
+        )
+    connection.commit()
+    connection.close()
+
+
+def median_ms(run):
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def naive(q):
+    connection = sqlite3.connect(path)
+    sql = "SELECT * FROM Todo WHERE user_id = '1'" + " AND (task LIKE ? OR note LIKE ?)" * len(q.split())
+    parameters = [f"%{term}%" for term in q.split() for _ in range(2)]
+    connection.execute(sql + " ORDER BY created_at, id LIMIT 21", parameters).fetchall()
+    connection.close()
+
+
+def main():
+    app.dependency_overrides[get_user] = lambda: {"role": "user", "user_id": "1"}
+    with TestClient(app) as client:
+        started = time.perf_counter()
+        seed(ROWS)
+        print(f"seeded {ROWS:,} todos (FTS kept in sync by triggers) in {time.perf_counter() - started:.1f}s")
+
+        for q in (*QUERIES, MISSING):
+            endpoint = median_ms(lambda: client.get("/todo/search", params={"q": q, "completed": False}).raise_for_status())
+            baseline = median_ms(lambda: naive(q))
+            print(f"{q!r:>16}: search {endpoint:8.1f} ms   naive LIKE {baseline:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
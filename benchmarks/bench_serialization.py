@@ -0,0 +1,60 @@
+"""Per-response encode cost of todo lists, from ORM-like rows to JSON bytes.
+
+Run with: python -m benchmarks.bench_serialization
+"""
+import json
+import timeit
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from pydantic import TypeAdapter
+from api import responses
+from api.responses import JSONResponse
+from schema.todo_schema import TodoResponse
+
+
+SIZES = (1, 100, 10_000)
+
+todos = TypeAdapter(list[TodoResponse])
+
+
+def rows(count):
+    now = datetime(2026, 1, 1)
+    return [
+        SimpleNamespace(id=i, task=f"Task {i}", note="Some note", status=i % 2 == 0, priority=1,
+                        created_at=now + timedelta(seconds=i), due=now + timedelta(days=1), user_id="1")
+        for i in range(count)
+    ]
+
+
+def stdlib(data):
+    orjson, responses.orjson = responses.orjson, None
+    try:
+        return JSONResponse(todos.dump_python(todos.validate_python(data), mode="json")).body
+    finally:
+        responses.orjson = orjson
+
+
+def fast(data):
+    return JSONResponse(todos.dump_python(todos.validate_python(data), mode="json")).body
+
+
+def pydantic_json(data):
+    return todos.dump_json(todos.validate_python(data))
+
+
+def main():
+    encoders = {"stdlib json": stdlib, "JSONResponse": fast, "pydantic dump_json": pydantic_json}
+    if responses.orjson is None:
+        print("orjson is not installed, JSONResponse falls back to stdlib json")
+    assert json.loads(fast(rows(3))) == json.loads(stdlib(rows(3))) == json.loads(pydantic_json(rows(3)))
+
+    print(f"{'todos':>8} " + " ".join(f"{name:>20}" for name in encoders))
+    for size in SIZES:
+        data = rows(size)
+        number = max(1, 20_000 // size)
+        timings = [min(timeit.repeat(lambda: encode(data), number=number, repeat=5)) / number for encode in encoders.values()]
+        print(f"{size:>8} " + " ".join(f"{timing * 1000:>17.3f} ms" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""Drives a realistic request mix through the API and writes per-endpoint latency and query counts to JSON.
+
+Seeds --users users with --todos todos each, then --concurrency clients log in and loop over a weighted
+mix of list, create, complete and delete-completed requests for --duration seconds. Requests go through
+an in-process ASGI client, or through a uvicorn worker over HTTP with --mode uvicorn. Query counts come
+from the server's own http_request_queries histograms, read from /admin/metrics before and after the run.
+
+Run with: python -m benchmarks.load [--users 20] [--todos 100] [--mode asgi|uvicorn] [--database-url URL]
+                                    [--output baseline.json] [--compare previous.json]
+
+Without --database-url a fresh SQLite file is used; a Postgres URL is seeded in place, after removing the
+rows a previous run left behind. --compare exits 1 when p95 latency grew by more than --tolerance or an
+endpoint runs at least QUERY_GROWTH more queries per request on average.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+
+parser = argparse.ArgumentParser(description="Load test the todo API")
+parser.add_argument("--users", type=int, default=20)
+parser.add_argument("--todos", type=int, default=100, help="todos seeded per user")
+parser.add_argument("--concurrency", type=int, default=20)
+parser.add_argument("--duration", type=float, default=20, help="seconds of load after the warm-up logins")
+parser.add_argument("--mode", choices=("asgi", "uvicorn"), default="asgi")
+parser.add_argument("--database-url", default=None)
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--output", default=None, help="write the results to this JSON file")
+parser.add_argument("--compare", default=None, help="JSON results of an earlier run to diff against")
+parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative p95 growth before --compare fails")
+args = parser.parse_args()
+
+DATABASE_URL = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "load.sqlite")
+PASSWORD = "Benchmark1."
+PREFIX = "bench-"
+# Averages move a little with the mix of 200s and 404s, an N+1 moves them by whole queries.
+QUERY_GROWTH = 0.5
+
+os.environ["DATABASE_URL"] = DATABASE_URL
+os.environ.setdefault("SECRET_KEY", "bench-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("SCHEME", "bcrypt")
+os.environ.setdefault("MAIL_TRANSPORT", "memory")
+# Every client comes from one address, the limiter would turn most of the run into 429s.
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+from sqlalchemy import insert, delete
+from api.main import app
+from api.hashing import hashed
+from database import migrations
+from database.database import engine
+from database.model_db import User, Todo, Otp
+
+
+# Operation -> (method, route template as labelled by the server, weight, expected status codes).
+OPERATIONS = {
+    "list": ("GET", "/todo/get-todo/all", 50, {200, 304}),
+    "create": ("POST", "/todo/create-todo", 20, {201}),
+    "complete": ("PUT", "/todo/update-todo/complete-todo/{todo_id}", 20, {202, 404}),
+    "delete_completed": ("DELETE", "/todo/delete/all/{completed_todo}", 5, {204, 404}),
+    "login": ("POST", "/user/login", 5, {202}),
+}
+
+
+def seed():
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+    password = hashed.hash(PASSWORD)
+    now = datetime.now()
+    rng = random.Random(args.seed)
+    with engine.begin() as connection:
+        connection.execute(delete(Todo).where(Todo.user_id.startswith(PREFIX)))
+        connection.execute(delete(Otp).where(Otp.user_id.startswith(PREFIX)))
+        connection.execute(delete(User).where(User.id.startswith(PREFIX)))
+        users = [{"id": f"{PREFIX}{i}", "firstname": "Bench", "lastname": "User", "username": f"benchuser{i}",
+                  "email": f"benchuser{i}@gmail.com", "password": password, "role": "user", "created_at": now}
+                 for i in range(args.users)]
+        users.append({"id": f"{PREFIX}admin", "firstname": "Bench", "lastname": "Admin", "username": "benchadmin",
+                      "email": "benchadmin@gmail.com", "password": password, "role": "admin", "created_at": now})
+        connection.execute(insert(User), users)
+        for user in users[:-1]:
+            todos = [{"task": f"Seeded task {i}", "note": "Seeded by the load test", "status": rng.random() < 0.3,
+                      "priority": rng.randint(1, 3), "created_at": now, "due": now, "user_id": user["id"]}
+                     for i in range(args.todos)]
+            if todos:
+                connection.execute(insert(Todo), todos)
+    return [user["username"] for user in users[:-1]]
+
+
+async def login(client, username):
+    response = await client.post("/user/login", json={"username": username, "password": PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": "Bearer " + response.json()["access_token"]}
+
+
+async def worker(client, username, headers, deadline, samples, rng):
+    open_ids = []
+    names = list(OPERATIONS)
+    weights = [OPERATIONS[name][2] for name in names]
+
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        if name == "list":
+            response = await client.get("/todo/get-todo/all", headers=headers, params={"limit": 50})
+            if response.status_code == 200:
+                open_ids = [item["id"] for item in response.json()["todos"] if not item["status"]]
+        elif name == "create":
+            response = await client.post("/todo/create-todo", headers=headers,
+                                         json={"tasks": f"Load test task {rng.randint(0, 10**6)}", "note": "Created under load"})
+        elif name == "complete":
+            todo_id = open_ids.pop(rng.randrange(len(open_ids))) if open_ids else 1
+            response = await client.put(f"/todo/update-todo/complete-todo/{todo_id}", headers=headers, params={"status": True})
+        elif name == "delete_completed":
+            response = await client.delete("/todo/delete/all/true", headers=headers)
+        else:
+            response = await client.post("/user/login", json={"username": username, "password": PASSWORD})
+        elapsed = time.perf_counter() - started
+        samples.append((name, elapsed, response.status_code in OPERATIONS[name][3]))
+
+
+async def server_queries(client, headers):
+    response = await client.get("/admin/metrics", headers=headers)
+    response.raise_for_status()
+    return {key: value for key, value in response.json().items() if key.startswith("http_request_queries{")}
+
+
+def queries_per_request(before, after, method, route):
+    key = f"http_request_queries{{method={method},route={route}}}"
+    start = before.get(key, {"count": 0, "sum": 0})
+    end = after.get(key, {"count": 0, "sum": 0})
+    count = end["count"] - start["count"]
+    return round((end["sum"] - start["sum"]) / count, 2) if count else None
+
+
+def percentile(timings, q):
+    if len(timings) == 1:
+        return timings[0]
+    return statistics.quantiles(timings, n=100, method="inclusive")[q - 1]
+
+
+async def drive(client, usernames):
+    admin = await login(client, "benchadmin")
+    before = await server_queries(client, admin)
+
+    clients = [usernames[i % len(usernames)] for i in range(args.concurrency)]
+    sessions = await asyncio.gather(*(login(client, username) for username in clients))
+
+    samples = []
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(worker(client, username, headers, deadline, samples, random.Random(args.seed + i))
+                           for i, (username, headers) in enumerate(zip(clients, sessions))))
+    elapsed = time.perf_counter() - started
+    after = await server_queries(client, admin)
+
+    endpoints = {}
+    for name, (method, route, _, _) in OPERATIONS.items():
+        timings = [seconds * 1000 for operation, seconds, _ in samples if operation == name]
+        if not timings:
+            continue
+        endpoints[name] = {
+            "method": method,
+            "route": route,
+            "requests": len(timings),
+            "errors": sum(1 for operation, _, ok in samples if operation == name and not ok),
+            "throughput": round(len(timings) / elapsed, 2),
+            "p50_ms": round(percentile(timings, 50), 2),
+            "p95_ms": round(percentile(timings, 95), 2),
+            "p99_ms": round(percentile(timings, 99), 2),
+            "queries_per_request": queries_per_request(before, after, method, route),
+        }
+    return {"elapsed_seconds": round(elapsed, 2), "requests": len(samples), "throughput": round(len(samples) / elapsed, 2),
+            "endpoints": endpoints}
+
+
+async def run_asgi(usernames):
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            return await drive(client, usernames)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_uvicorn(usernames):
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning"],
+                              env=os.environ.copy())
+    base_url = f"http://127.0.0.1:{port}"
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            return await drive(client, usernames)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    regressions = []
+    for name, current in results["endpoints"].items():
+        previous = baseline["endpoints"].get(name)
+        if previous is None:
+            continue
+        growth = current["p95_ms"] / previous["p95_ms"] - 1 if previous["p95_ms"] else 0
+        print(f"{name:>18}: p95 {previous['p95_ms']:8.2f} -> {current['p95_ms']:8.2f} ms ({growth:+.0%})   "
+              f"queries {previous['queries_per_request']} -> {current['queries_per_request']}")
+        if growth > args.tolerance:
+            regressions.append(f"{name} p95 grew {growth:.0%}")
+        if (current["queries_per_request"] or 0) >= (previous["queries_per_request"] or 0) + QUERY_GROWTH:
+            regressions.append(f"{name} runs more queries per request")
+    return regressions
+
+
+def main():
+    started = time.perf_counter()
+    usernames = seed()
+    print(f"seeded {args.users} users with {args.todos} todos each in {time.perf_counter() - started:.1f}s")
+
+    results = asyncio.run(run_uvicorn(usernames) if args.mode == "uvicorn" else run_asgi(usernames))
+    results["meta"] = {
+        "commit": git_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "mode": args.mode,
+        "database": engine.dialect.name,
+        "python": platform.python_version(),
+        "users": args.users,
+        "todos_per_user": args.todos,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "seed": args.seed,
+    }
+
+    print(f"{results['requests']} requests in {results['elapsed_seconds']}s, {results['throughput']} req/s")
+    for name, endpoint in results["endpoints"].items():
+        print(f"{name:>18}: {endpoint['requests']:6} req {endpoint['throughput']:8.1f}/s   p50 {endpoint['p50_ms']:7.2f}   "
+              f"p95 {endpoint['p95_ms']:7.2f}   p99 {endpoint['p99_ms']:7.2f} ms   "
+              f"queries {endpoint['queries_per_request']}   errors {endpoint['errors']}")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    if args.compare:
+        with open(args.compare) as previous:
+            regressions = compare(results, json.load(previous))
+        if regressions:
+            print("regressions: " + "; ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
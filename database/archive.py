@@ -0,0 +1,60 @@
+import os
+from datetime import datetime, date
+from dotenv import load_dotenv
+from sqlalchemy import select, delete, literal, DateTime
+from sqlalchemy.engine import Connection
+from .model_db import Todo, TodoArchive
+
+
+load_dotenv()
+
+
+# Off: removed todos are deleted. On: they move to TodoArchive, out of the hot Todo table and its indexes.
+TODO_ARCHIVE = os.getenv("TODO_ARCHIVE", "false").lower() in ("1", "true", "yes")
+
+# On Postgres TodoArchive is partitioned by month of archived_at, the partitions are not part of the models.
+PARTITION_PREFIX = "TodoArchive_"
+
+todo_table = Todo.__table__
+archive_table = TodoArchive.__table__
+COLUMNS = [column.name for column in todo_table.columns]
+
+
+def move_statement(where, now):
+    """One Postgres statement that deletes the todos and inserts them into the archive."""
+    moved = delete(todo_table).where(where).returning(*todo_table.c).cte("moved")
+    columns = [*COLUMNS, "archived_at"]
+    return (archive_table.insert()
+            .from_select(columns, select(*moved.c, literal(now, DateTime)))
+            .returning(archive_table.c.user_id, archive_table.c.id))
+
+
+def remove_todos(session, where):
+    """Removes the todos matching where, archiving them when TODO_ARCHIVE is on, returns their (user_id, id).
+
+    session is a sync Session or Connection, async callers go through run_sync.
+    """
+    if not TODO_ARCHIVE:
+        return session.execute(delete(todo_table).where(where).returning(todo_table.c.user_id, todo_table.c.id)).all()
+
+    now = datetime.now()
+    bind = session if isinstance(session, Connection) else session.get_bind()
+    if bind.dialect.name == "postgresql":
+        return session.execute(move_statement(where, now)).all()
+
+    # SQLite cannot write from a WITH clause, the insert follows in the same transaction.
+    rows = session.execute(delete(todo_table).where(where).returning(*todo_table.c)).all()
+    if rows:
+        session.execute(archive_table.insert(), [{**row._asdict(), "archived_at": now} for row in rows])
+    return [(row.user_id, row.id) for row in rows]
+
+
+def month_start(day: date, months: int = 0):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_ddl(start: date):
+    end = month_start(start, 1)
+    return (f'CREATE TABLE IF NOT EXISTS "{PARTITION_PREFIX}{start:%Y_%m}" PARTITION OF "TodoArchive" '
+            f"FOR VALUES FROM ('{start}') TO ('{end}')")
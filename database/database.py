@@ -2,12 +2,109 @@ import os
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from dotenv import load_dotenv
+from .pool import PoolSettings, engine_options, instrument
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+ASYNC_DATABASE = os.getenv("ASYNC_DATABASE", "true").lower() in ("1", "true", "yes")
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_url(url: str):
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+pool_settings = PoolSettings.from_env()
+
 database = DATABASE_URL
-engine = create_engine(database)
+engine = instrument(create_engine(database, **engine_options(database, pool_settings, "primary")), "primary")
 begin = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_url(database)
+async_engine = None
+if ASYNC_DATABASE:
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, pool_settings, "primary_async", is_async=True))
+    instrument(async_engine.sync_engine, "primary_async")
+async_begin = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 data = declarative_base()
+
+
+class SyncStream:
+    """Async iteration over a sync streaming Result, mirroring AsyncResult."""
+
+    def __init__(self, result):
+        self.result = result
+
+    async def partitions(self, size=None):
+        for partition in self.result.partitions(size):
+            yield partition
+
+    async def __aiter__(self):
+        for row in self.result:
+            yield row
+
+    async def close(self):
+        self.result.close()
+
+
+class SyncSession:
+    """Awaitable facade over a sync Session so routers use one API in both modes."""
+
+    def __init__(self, session):
+        self.session = session
+
+    @property
+    def bind(self):
+        return self.session.bind
+
+    def add(self, instance):
+        self.session.add(instance)
+
+    def add_all(self, instances):
+        self.session.add_all(instances)
+
+    async def execute(self, statement, *args, **kwargs):
+        return self.session.execute(statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return self.session.scalar(statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return self.session.scalars(statement, *args, **kwargs)
+
+    async def stream(self, statement, *args, **kwargs):
+        return SyncStream(self.session.execute(statement, *args, **kwargs))
+
+    async def get(self, entity, ident):
+        return self.session.get(entity, ident)
+
+    async def flush(self):
+        self.session.flush()
+
+    async def commit(self):
+        self.session.commit()
+
+    async def rollback(self):
+        self.session.rollback()
+
+    async def refresh(self, instance):
+        self.session.refresh(instance)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return fn(self.session, *args, **kwargs)
+
+    async def delete(self, instance):
+        self.session.delete(instance)
+
+    async def close(self):
+        self.session.close()
@@ -0,0 +1,37 @@
+import os
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, text
+
+
+MIGRATIONS = os.path.dirname(os.path.abspath(__file__))
+ALEMBIC_INI = os.path.join(MIGRATIONS, "..", "..", "alembic.ini")
+MIGRATION_LOCK_ID = int(os.getenv("MIGRATION_LOCK_ID", "7041826"))
+BASELINE = "0001_initial"
+
+
+def alembic_config(connection=None):
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", MIGRATIONS)
+    config.attributes["connection"] = connection
+    return config
+
+
+def is_legacy(connection):
+    """Tables built by the old metadata.create_all, before alembic tracked the schema."""
+    tables = inspect(connection).get_table_names()
+    return "User" in tables and "alembic_version" not in tables
+
+
+def upgrade(connection=None, revision="head"):
+    if connection is None:
+        from database.database import engine
+        with engine.begin() as connection:
+            return upgrade(connection, revision)
+
+    if connection.dialect.name == "postgresql":
+        # Every worker migrates at startup, the transaction scoped lock lets one run while the rest wait.
+        connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+    if is_legacy(connection):
+        command.stamp(alembic_config(connection), BASELINE)
+    command.upgrade(alembic_config(connection), revision)
@@ -0,0 +1,60 @@
+"""Initial schema, as previously built by metadata.create_all
+
+Revision ID: 0001_initial
+Revises:
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001_initial"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "User",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("firstname", sa.String(), nullable=False),
+        sa.Column("lastname", sa.String(), nullable=False),
+        sa.Column("username", sa.String(20), nullable=False, unique=True),
+        sa.Column("email", sa.String(), nullable=False, unique=True),
+        sa.Column("password", sa.String(), nullable=False),
+        sa.Column("timezone", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("role", sa.String(10), nullable=False),
+    )
+    op.create_table(
+        "Todo",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("task", sa.String(50), nullable=False),
+        sa.Column("note", sa.String(50), nullable=True),
+        sa.Column("status", sa.Boolean(), nullable=False),
+        sa.Column("priority", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("due", sa.DateTime(), nullable=False),
+        sa.Column("user_id", sa.String(), sa.ForeignKey("User.id"), nullable=True),
+    )
+    op.create_index("ix_Todo_id", "Todo", ["id"])
+    op.create_table(
+        "Otp",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("otp", sa.String(6), nullable=False),
+        sa.Column("is_used", sa.Boolean(), nullable=False),
+        sa.Column("tag", sa.String(10), nullable=False),
+        sa.Column("expiring", sa.DateTime(), nullable=False),
+        sa.Column("user_id", sa.String(), sa.ForeignKey("User.id"), nullable=True),
+    )
+    op.create_index("ix_Otp_id", "Otp", ["id"])
+
+
+def downgrade():
+    op.drop_index("ix_Otp_id", table_name="Otp")
+    op.drop_table("Otp")
+    op.drop_index("ix_Todo_id", table_name="Todo")
+    op.drop_table("Todo")
+    op.drop_table("User")
@@ -0,0 +1,30 @@
+"""Composite indexes for the per-user todo and otp lookups
+
+Revision ID: 0002_hot_path_indexes
+Revises: 0001_initial
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+
+revision = "0002_hot_path_indexes"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_Todo_user_id_created_at_id", "Todo", ["user_id", "created_at", "id"])
+    op.create_index("ix_Todo_user_id_status", "Todo", ["user_id", "status"])
+    op.create_index("ix_Todo_user_id_task", "Todo", ["user_id", "task"])
+    op.create_index("ix_Otp_otp", "Otp", ["otp"])
+    op.create_index("ix_Otp_user_id_otp", "Otp", ["user_id", "otp"])
+
+
+def downgrade():
+    op.drop_index("ix_Otp_user_id_otp", table_name="Otp")
+    op.drop_index("ix_Otp_otp", table_name="Otp")
+    op.drop_index("ix_Todo_user_id_task", table_name="Todo")
+    op.drop_index("ix_Todo_user_id_status", table_name="Todo")
+    op.drop_index("ix_Todo_user_id_created_at_id", table_name="Todo")
@@ -0,0 +1,25 @@
+"""Per-user todo change counter
+
+Revision ID: 0003_user_todo_version
+Revises: 0002_hot_path_indexes
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003_user_todo_version"
+down_revision = "0002_hot_path_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("User") as batch:
+        batch.add_column(sa.Column("todo_version", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade():
+    with op.batch_alter_table("User") as batch:
+        batch.drop_column("todo_version")
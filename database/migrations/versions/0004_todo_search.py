@@ -0,0 +1,43 @@
+"""Search indexes over todo task and note
+
+FTS5 trigram table kept in sync by triggers on SQLite, pg_trgm GIN indexes on Postgres.
+Batch migrations that recreate the Todo table on SQLite drop the triggers and must add them back.
+
+Revision ID: 0004_todo_search
+Revises: 0003_user_todo_version
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+from database.search import FTS_TRIGGERS
+
+
+revision = "0004_todo_search"
+down_revision = "0003_user_todo_version"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        op.execute("""CREATE VIRTUAL TABLE "Todo_fts" USING fts5(task, note, content='Todo', content_rowid='id', tokenize='trigram')""")
+        for trigger in FTS_TRIGGERS:
+            op.execute(trigger)
+        op.execute("""INSERT INTO "Todo_fts" ("Todo_fts") VALUES ('rebuild')""")
+    elif dialect == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute('CREATE INDEX "ix_Todo_task_trgm" ON "Todo" USING gin (task gin_trgm_ops)')
+        op.execute('CREATE INDEX "ix_Todo_note_trgm" ON "Todo" USING gin (note gin_trgm_ops)')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        op.execute('DROP TRIGGER "Todo_fts_update"')
+        op.execute('DROP TRIGGER "Todo_fts_delete"')
+        op.execute('DROP TRIGGER "Todo_fts_insert"')
+        op.execute('DROP TABLE "Todo_fts"')
+    elif dialect == "postgresql":
+        op.execute('DROP INDEX "ix_Todo_note_trgm"')
+        op.execute('DROP INDEX "ix_Todo_task_trgm"')
@@ -0,0 +1,32 @@
+"""Otp rows keyed on user and purpose, with an expiry index for purges
+
+Only the newest code of each user and purpose is kept, the others could no longer be the one sent last.
+
+Revision ID: 0005_otp_store
+Revises: 0004_todo_search
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005_otp_store"
+down_revision = "0004_todo_search"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index("ix_Otp_user_id_otp", table_name="Otp")
+    op.drop_index("ix_Otp_otp", table_name="Otp")
+    op.execute(sa.text('DELETE FROM "Otp" WHERE id NOT IN (SELECT max(id) FROM "Otp" GROUP BY user_id, tag)'))
+    op.create_index("ix_Otp_user_id_tag", "Otp", ["user_id", "tag"], unique=True)
+    op.create_index("ix_Otp_expiring", "Otp", ["expiring"])
+
+
+def downgrade():
+    op.drop_index("ix_Otp_expiring", table_name="Otp")
+    op.drop_index("ix_Otp_user_id_tag", table_name="Otp")
+    op.create_index("ix_Otp_otp", "Otp", ["otp"])
+    op.create_index("ix_Otp_user_id_otp", "Otp", ["user_id", "otp"])
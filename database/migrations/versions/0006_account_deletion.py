@@ -0,0 +1,49 @@
+"""Soft-deleted accounts and cascading user foreign keys
+
+Accounts are marked with deleted_at and purged in chunks by the scheduler. The initial foreign keys were
+unnamed: Postgres named them <table>_user_id_fkey, on SQLite the naming convention below finds them.
+
+Revision ID: 0006_account_deletion
+Revises: 0005_otp_store
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from database.search import FTS_TRIGGERS
+
+
+revision = "0006_account_deletion"
+down_revision = "0005_otp_store"
+branch_labels = None
+depends_on = None
+
+NAMING = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+TABLES = ("Todo", "Otp")
+
+
+def replace_foreign_keys(old_name, new_name, ondelete):
+    sqlite = op.get_bind().dialect.name == "sqlite"
+    for table in TABLES:
+        with op.batch_alter_table(table, naming_convention=NAMING) as batch:
+            batch.drop_constraint(old_name(table, sqlite), type_="foreignkey")
+            batch.create_foreign_key(new_name(table), "User", ["user_id"], ["id"], ondelete=ondelete)
+    if sqlite:
+        # Recreating Todo dropped its search triggers.
+        for trigger in FTS_TRIGGERS:
+            op.execute(trigger)
+
+
+def upgrade():
+    with op.batch_alter_table("User") as batch:
+        batch.add_column(sa.Column("deleted_at", sa.DateTime(), nullable=True))
+        batch.create_index("ix_User_deleted_at", ["deleted_at"])
+    replace_foreign_keys(lambda table, sqlite: f"fk_{table}_user_id_User" if sqlite else f"{table}_user_id_fkey",
+                         lambda table: f"fk_{table}_user_id_User", "CASCADE")
+
+
+def downgrade():
+    replace_foreign_keys(lambda table, sqlite: f"fk_{table}_user_id_User", lambda table: f"fk_{table}_user_id_User", None)
+    with op.batch_alter_table("User") as batch:
+        batch.drop_index("ix_User_deleted_at")
+        batch.drop_column("deleted_at")
@@ -0,0 +1,61 @@
+"""Archive table for removed todos
+
+Holds the todos removed by delete-completed and the retention purge when TODO_ARCHIVE is on. Postgres
+partitions it by month of archived_at, the scheduler creates the partitions ahead of time and the
+default partition catches anything outside them.
+
+Revision ID: 0007_todo_archive
+Revises: 0006_account_deletion
+Create Date: 2026-10-18
+
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+from database.archive import month_start, partition_ddl
+
+
+revision = "0007_todo_archive"
+down_revision = "0006_account_deletion"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute('''CREATE TABLE "TodoArchive" (
+            id INTEGER NOT NULL,
+            archived_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            task VARCHAR(50) NOT NULL,
+            note VARCHAR(50),
+            status BOOLEAN NOT NULL,
+            priority INTEGER NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            due TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            user_id VARCHAR,
+            PRIMARY KEY (id, archived_at)
+        ) PARTITION BY RANGE (archived_at)''')
+        op.execute('CREATE TABLE "TodoArchive_default" PARTITION OF "TodoArchive" DEFAULT')
+        for months in (0, 1):
+            op.execute(partition_ddl(month_start(date.today(), months)))
+    else:
+        op.create_table(
+            "TodoArchive",
+            sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column("archived_at", sa.DateTime(), nullable=False),
+            sa.Column("task", sa.String(length=50), nullable=False),
+            sa.Column("note", sa.String(length=50), nullable=True),
+            sa.Column("status", sa.Boolean(), nullable=False),
+            sa.Column("priority", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("due", sa.DateTime(), nullable=False),
+            sa.Column("user_id", sa.String(), nullable=True),
+            sa.PrimaryKeyConstraint("id", "archived_at"),
+        )
+    op.create_index("ix_TodoArchive_user_id_archived_at_id", "TodoArchive", ["user_id", "archived_at", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_TodoArchive_user_id_archived_at_id", table_name="TodoArchive")
+    # Dropping the parent drops its partitions with it.
+    op.drop_table("TodoArchive")
@@ -0,0 +1,39 @@
+"""Named unique constraints on User username and email
+
+Signup and profile updates insert first and read the failed constraint's name to tell which field
+was taken. The initial constraints were unnamed: Postgres named them User_<column>_key, on SQLite
+the naming convention below finds them.
+
+Revision ID: 0008_user_unique_names
+Revises: 0007_todo_archive
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+
+revision = "0008_user_unique_names"
+down_revision = "0007_todo_archive"
+branch_labels = None
+depends_on = None
+
+NAMING = {"uq": "uq_%(table_name)s_%(column_0_name)s"}
+COLUMNS = ("username", "email")
+
+
+def rename_constraints(old_name, new_name):
+    sqlite = op.get_bind().dialect.name == "sqlite"
+    with op.batch_alter_table("User", naming_convention=NAMING) as batch:
+        for column in COLUMNS:
+            batch.drop_constraint(old_name(column, sqlite), type_="unique")
+            batch.create_unique_constraint(new_name(column, sqlite), [column])
+
+
+def upgrade():
+    rename_constraints(lambda column, sqlite: f"uq_User_{column}" if sqlite else f"User_{column}_key",
+                       lambda column, sqlite: f"uq_User_{column}")
+
+
+def downgrade():
+    rename_constraints(lambda column, sqlite: f"uq_User_{column}",
+                       lambda column, sqlite: f"uq_User_{column}" if sqlite else f"User_{column}_key")
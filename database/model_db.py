@@ -1,54 +1,93 @@
 from .database import data
 from datetime import datetime, timedelta
-from sqlalchemy import Column, Integer, ForeignKey, Boolean, String, DateTime, func
+from sqlalchemy import Column, Integer, ForeignKey, Boolean, String, DateTime, Index, UniqueConstraint, func
 
 
 def additional_time():
     return datetime.now() + timedelta(days=1)
 
 
-def otp_addtional_time():
+def otp_additional_time():
     return datetime.now() + timedelta(minutes=20)
 
 
 class User(data):
 
     __tablename__ = "User"
+    # Named so a signup or profile update that collides can tell which field was taken.
+    __table_args__ = (
+        UniqueConstraint("username", name="uq_User_username"),
+        UniqueConstraint("email", name="uq_User_email"),
+        Index("ix_User_deleted_at", "deleted_at"),
+    )
 
     id = Column(String, primary_key=True)
     firstname = Column(String, nullable=False)
     lastname = Column(String, nullable=False)
-    username = Column(String(20), unique=True, nullable=False)
-    email = Column(String, unique=True, nullable=False)
+    username = Column(String(20), nullable=False)
+    email = Column(String, nullable=False)
     password = Column(String, nullable=False)
     timezone = Column(String, nullable=False, default="UTC")
     created_at = Column(DateTime, nullable=False, default=func.now())
     role = Column(String(10), nullable=False, default="user")
+    # Bumped in the same transaction as every todo write, todo reads use it as their ETag.
+    todo_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Set when the owner deletes the account, the scheduler then removes it and its rows in chunks.
+    deleted_at = Column(DateTime, nullable=True)
 
 
 
 class Todo(data):
 
     __tablename__ = "Todo"
+    __table_args__ = (
+        Index("ix_Todo_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_Todo_user_id_status", "user_id", "status"),
+        Index("ix_Todo_user_id_task", "user_id", "task"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     task = Column(String(50), nullable=False)
     note = Column(String(50), nullable=True)
     status = Column(Boolean, nullable=False, default=False)
     priority = Column(Integer, nullable=False, default=1)
-    created_at = Column(DateTime, nullable=False, default=datetime.now())
-    due = Column(DateTime, nullable=False, default=additional_time())
-    user_id = Column(String, ForeignKey("User.id"))
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+    due = Column(DateTime, nullable=False, default=additional_time)
+    user_id = Column(String, ForeignKey("User.id", name="fk_Todo_user_id_User", ondelete="CASCADE"))
+
+
+
+class TodoArchive(data):
+
+    __tablename__ = "TodoArchive"
+    __table_args__ = (
+        Index("ix_TodoArchive_user_id_archived_at_id", "user_id", "archived_at", "id"),
+    )
+
+    # archived_at is in the key because Postgres partitions the table on it.
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    archived_at = Column(DateTime, primary_key=True, default=datetime.now)
+    task = Column(String(50), nullable=False)
+    note = Column(String(50), nullable=True)
+    status = Column(Boolean, nullable=False)
+    priority = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    due = Column(DateTime, nullable=False)
+    user_id = Column(String)
 
 
 
 class Otp(data):
     
     __tablename__ = "Otp"
+    __table_args__ = (
+        Index("ix_Otp_user_id_tag", "user_id", "tag", unique=True),
+        Index("ix_Otp_expiring", "expiring"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     otp = Column(String(6), nullable=False)
     is_used = Column(Boolean, nullable=False, default=False)
     tag = Column(String(10), nullable=False, default="Password")
-    expiring = Column(DateTime, nullable=False, default=otp_additional_time())
-    user_id = Column(String, ForeignKey("User.id"))
+    expiring = Column(DateTime, nullable=False, default=otp_additional_time)
+    user_id = Column(String, ForeignKey("User.id", name="fk_Otp_user_id_User", ondelete="CASCADE"))
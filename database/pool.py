@@ -0,0 +1,116 @@
+import os
+import time
+from pydantic import BaseModel
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+
+# The database layer only exposes hooks, api registers its metrics and profiling listeners on them.
+instrumented = []
+instrument_hooks = []
+checkout_hooks = []
+
+
+class PoolSettings(BaseModel):
+    pool_size: int = 10
+    max_overflow: int = 20
+    pool_timeout: float = 30
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+    statement_timeout_ms: int = 0
+
+    @classmethod
+    def from_env(cls):
+        env = {
+            "pool_size": os.getenv("DB_POOL_SIZE"),
+            "max_overflow": os.getenv("DB_MAX_OVERFLOW"),
+            "pool_timeout": os.getenv("DB_POOL_TIMEOUT"),
+            "pool_recycle": os.getenv("DB_POOL_RECYCLE"),
+            "pool_pre_ping": os.getenv("DB_POOL_PRE_PING"),
+            "statement_timeout_ms": os.getenv("DB_STATEMENT_TIMEOUT_MS"),
+        }
+        return cls(**{key: value for key, value in env.items() if value is not None})
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    @property
+    def name(self):
+        return self.logging_name or "default"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            for hook in checkout_hooks:
+                hook(self.name, time.perf_counter() - started, timed_out)
+
+
+class TimedAsyncQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url: str, settings: PoolSettings, name: str, is_async: bool = False):
+    url = make_url(url)
+    options = {"pool_logging_name": name}
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite keeps its single-connection pool.
+        return options
+
+    options.update(
+        poolclass=TimedAsyncQueuePool if is_async else TimedQueuePool,
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.pool_timeout,
+        pool_recycle=settings.pool_recycle,
+        pool_pre_ping=settings.pool_pre_ping,
+    )
+    if settings.statement_timeout_ms and url.get_backend_name() == "postgresql":
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(settings.statement_timeout_ms)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={settings.statement_timeout_ms}"}
+    return options
+
+
+def on_instrument(hook):
+    """Registers hook(engine, name) for every instrumented engine, including those created before it."""
+    instrument_hooks.append(hook)
+    for engine, name in instrumented:
+        hook(engine, name)
+    return hook
+
+
+def on_checkout(hook):
+    """Registers hook(name, seconds, timed_out) for every checkout from a timed pool."""
+    checkout_hooks.append(hook)
+    return hook
+
+
+def instrument(engine, name: str):
+    """Hands engine to the registered instrument hooks, engine can be sync or the sync_engine of an async one."""
+    instrumented.append((engine, name))
+    for hook in instrument_hooks:
+        hook(engine, name)
+    return engine
+
+
+def status(engine):
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "timeout": pool.timeout(),
+    }
@@ -0,0 +1,105 @@
+import os
+import time
+import threading
+from itertools import count
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from .database import ASYNC_DATABASE, SyncSession, async_url, pool_settings
+from .pool import engine_options, instrument
+
+
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_SELECTION = os.getenv("REPLICA_SELECTION", "round_robin")
+REPLICA_STICKINESS_SECONDS = float(os.getenv("REPLICA_STICKINESS_SECONDS", "5"))
+# Carries a user's stickiness to the other workers, empty keeps it in the worker that took the write.
+REPLICA_STICKINESS_COOKIE = os.getenv("REPLICA_STICKINESS_COOKIE", "read_primary_until")
+
+
+class Replica:
+
+    def __init__(self, name: str, url: str, is_async: bool = ASYNC_DATABASE):
+        self.name = name
+        self.is_async = is_async
+        if is_async:
+            url = async_url(url)
+            self.engine = create_async_engine(url, **engine_options(url, pool_settings, name, is_async=True))
+            self.begin = async_sessionmaker(bind=self.engine, autoflush=False, expire_on_commit=False)
+            instrument(self.engine.sync_engine, name)
+        else:
+            self.engine = instrument(create_engine(url, **engine_options(url, pool_settings, name)), name)
+            self.begin = sessionmaker(bind=self.engine, autocommit=False, autoflush=False)
+
+    @property
+    def sync_engine(self):
+        return self.engine.sync_engine if self.is_async else self.engine
+
+    def in_use(self):
+        pool = self.sync_engine.pool
+        return pool.checkedout() if isinstance(pool, QueuePool) else 0
+
+    def session(self):
+        return self.begin() if self.is_async else SyncSession(self.begin())
+
+    async def dispose(self):
+        if self.is_async:
+            await self.engine.dispose()
+        else:
+            self.engine.dispose()
+
+
+class ReplicaSet:
+    """Picks a replica for read-only work, unless the user wrote recently and must read from the primary.
+
+    Recent writes are remembered by the worker that took them. Behind a load balancer the next read
+    may land on another worker, so writes also hand the client a cookie holding the wall clock time
+    until which its reads stay on the primary.
+    """
+
+    def __init__(self, replicas, selection=REPLICA_SELECTION, stickiness=REPLICA_STICKINESS_SECONDS,
+                 cookie=REPLICA_STICKINESS_COOKIE):
+        if selection not in ("round_robin", "least_connections"):
+            raise ValueError(f"Unknown replica selection {selection!r}")
+        self.replicas = list(replicas)
+        self.selection = selection
+        self.stickiness = stickiness
+        self.cookie = cookie
+        self.turn = count()
+        self.writes = {}
+        self.lock = threading.Lock()
+
+    def mark_write(self, user_id):
+        now = time.monotonic()
+        with self.lock:
+            if len(self.writes) > 10000:
+                self.writes = {user: at for user, at in self.writes.items() if at > now}
+            self.writes[user_id] = now + self.stickiness
+
+    def is_sticky(self, user_id):
+        return self.writes.get(user_id, 0) > time.monotonic()
+
+    def sticky_until(self):
+        return f"{time.time() + self.stickiness:.3f}"
+
+    def cookie_is_sticky(self, value):
+        try:
+            until = float(value or 0)
+        except ValueError:
+            return False
+        # Bounded so a forged cookie cannot pin a client to the primary for longer than a write would.
+        return time.time() < until <= time.time() + self.stickiness + 1
+
+    def choose(self, user_id=None, cookie=None):
+        if not self.replicas or (user_id is not None and self.is_sticky(user_id)) or self.cookie_is_sticky(cookie):
+            return None
+        if self.selection == "least_connections":
+            return min(self.replicas, key=lambda replica: replica.in_use())
+        return self.replicas[next(self.turn) % len(self.replicas)]
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.dispose()
+
+
+replica_set = ReplicaSet(Replica(f"replica_{index}", url) for index, url in enumerate(DATABASE_REPLICA_URLS))
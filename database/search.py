@@ -0,0 +1,96 @@
+import re
+from sqlalchemy import select, func, literal_column, or_, and_, true, table, column
+from .model_db import Todo
+from .archive import PARTITION_PREFIX
+
+
+# FTS5 (SQLite) and pg_trgm (Postgres) objects created by migration 0004, they are not part of the models.
+FTS_TABLE = "Todo_fts"
+TRIGRAM_INDEXES = {"ix_Todo_task_trgm", "ix_Todo_note_trgm"}
+todo_fts = table(FTS_TABLE, column("rowid"))
+
+# Keep Todo_fts in step with Todo, SQLite drops them with the table so batch migrations that recreate Todo run them again.
+FTS_TRIGGERS = (
+    """CREATE TRIGGER "Todo_fts_insert" AFTER INSERT ON "Todo" BEGIN
+        INSERT INTO "Todo_fts" (rowid, task, note) VALUES (new.id, new.task, new.note);
+    END""",
+    """CREATE TRIGGER "Todo_fts_delete" AFTER DELETE ON "Todo" BEGIN
+        INSERT INTO "Todo_fts" ("Todo_fts", rowid, task, note) VALUES ('delete', old.id, old.task, old.note);
+    END""",
+    """CREATE TRIGGER "Todo_fts_update" AFTER UPDATE OF task, note ON "Todo" BEGIN
+        INSERT INTO "Todo_fts" ("Todo_fts", rowid, task, note) VALUES ('delete', old.id, old.task, old.note);
+        INSERT INTO "Todo_fts" (rowid, task, note) VALUES (new.id, new.task, new.note);
+    END""",
+)
+
+# The FTS5 trigram tokenizer cannot match terms shorter than this.
+MIN_TRIGRAM = 3
+
+
+def include_name(name, type_, parent_names):
+    """Keeps the search objects and the archive's monthly partitions out of autogenerate and drift checks."""
+    name = name or ""
+    return not name.startswith(FTS_TABLE) and not name.startswith(PARTITION_PREFIX) and name not in TRIGRAM_INDEXES
+
+
+def terms(q: str):
+    return [term for term in q.split() if term]
+
+
+def like_pattern(term: str):
+    return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def contains(term: str):
+    pattern = like_pattern(term)
+    return or_(Todo.task.ilike(pattern, escape="\\"), Todo.note.ilike(pattern, escape="\\"))
+
+
+def filters(user_id: str, completed=None, priority=None, due_before=None, due_after=None):
+    conditions = [Todo.user_id == user_id]
+    if completed is not None:
+        conditions.append(Todo.status == completed)
+    if priority is not None:
+        conditions.append(Todo.priority == priority)
+    if due_before is not None:
+        conditions.append(Todo.due < due_before)
+    if due_after is not None:
+        conditions.append(Todo.due >= due_after)
+    return and_(*conditions)
+
+
+def sqlite_search(q: str, where):
+    fts = literal_column(f'"{FTS_TABLE}"')
+    long_terms = [term for term in terms(q) if len(term) >= MIN_TRIGRAM]
+    # Terms too short for the trigram index only narrow rows the other conditions already picked.
+    short = [contains(term) for term in terms(q) if len(term) < MIN_TRIGRAM]
+
+    if not long_terms:
+        return select(Todo).where(where, *short).order_by(Todo.created_at, Todo.id)
+
+    match = " AND ".join('"' + term.replace('"', '""') + '"' for term in long_terms)
+    # bm25 ranks better matches lower, a hit in the task weighs ten times one in the note.
+    return (select(Todo).join(todo_fts, todo_fts.c.rowid == Todo.id)
+            .where(fts.match(match), where, *short)
+            .order_by(func.bm25(fts, 10.0, 1.0), Todo.created_at, Todo.id))
+
+
+def postgres_search(q: str, where):
+    words = re.findall(r"\w+", q)
+    conditions = [contains(term) for term in terms(q)]
+    query = select(Todo).where(where, *conditions)
+    if not words:
+        return query.order_by(Todo.created_at, Todo.id)
+
+    document = func.to_tsvector("simple", func.coalesce(Todo.task, "") + " " + func.coalesce(Todo.note, ""))
+    prefix = func.to_tsquery("simple", " & ".join(f"{word}:*" for word in words))
+    return query.order_by(func.ts_rank_cd(document, prefix).desc(), Todo.created_at, Todo.id)
+
+
+def search_query(dialect: str, q: str, where=true()):
+    """Todos matching every term of q as a substring of task or note, best matches first."""
+    if dialect == "postgresql":
+        return postgres_search(q, where)
+    if dialect == "sqlite":
+        return sqlite_search(q, where)
+    return select(Todo).where(where, *[contains(term) for term in terms(q)]).order_by(Todo.created_at, Todo.id)
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import Annotated, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Annotated
+from datetime import datetime
 
 
 
@@ -11,6 +12,88 @@ class CreateTodo(BaseModel):
 
 class UpdateTodo(BaseModel):
     tasks: Annotated[str, Field(max_length=50)]
-    completed: Annotated[bool, Field(Optional)]
+    completed: Annotated[bool, Field(default=False)]
     note: Annotated[str, Field(max_length=50)]
-    due: Annotated[Da]
+    due: Annotated[datetime, Field()]
+
+
+
+class BulkUpdateTodo(UpdateTodo):
+    id: Annotated[int, Field(gt=0)]
+
+
+
+class BulkCompleteTodo(BaseModel):
+    id: Annotated[int, Field(gt=0)]
+    completed: bool
+
+
+
+class BulkResult(BaseModel):
+    index: int
+    id: int | None
+    result: str
+
+
+
+class BulkResponse(BaseModel):
+    results: list[BulkResult]
+
+
+
+class TodoResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    task: str
+    note: str | None
+    status: bool
+    priority: int
+    created_at: datetime
+    due: datetime
+    user_id: str | None
+
+
+
+class TodoFields(BaseModel):
+    """A Todo restricted to the columns picked with fields=, unset columns are left out."""
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int | None = None
+    task: str | None = None
+    note: str | None = None
+    status: bool | None = None
+    priority: int | None = None
+    created_at: datetime | None = None
+    due: datetime | None = None
+    user_id: str | None = None
+
+
+
+class TodoPage(BaseModel):
+    todos: list[TodoFields]
+    next_cursor: str | None
+
+
+
+class TodoSearchPage(BaseModel):
+    todos: list[TodoResponse]
+    next_offset: int | None
+
+
+
+class ArchivedTodoResponse(TodoResponse):
+    archived_at: datetime
+
+
+
+class TodoArchivePage(BaseModel):
+    todos: list[ArchivedTodoResponse]
+    next_cursor: str | None
+
+
+
+class TodoQueryPage(BaseModel):
+    todos: list[TodoResponse]
+    next_offset: int | None
+    warnings: list[str]
@@ -1,5 +1,5 @@
 import re
-from pydantic import BaseModel, EmailStr, Field, field_validator
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
 from typing import Annotated
 
 
@@ -94,9 +94,16 @@ class OTPGeneration(BaseModel):
 class OTPVerification(BaseModel):
     otp: Annotated[str, Field]
 
+
+
+class OTPEmailVerification(OTPVerification):
+    email: Annotated[EmailStr, Field]
+
     
     
 class UserDetails(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     firstname: str
     lastname: str
     username: str
@@ -107,4 +114,13 @@ class UserDetails(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
-    
\ No newline at end of file
+
+
+
+class OTPToken(BaseModel):
+    token: str
+
+
+
+class Message(BaseModel):
+    message: str
@@ -0,0 +1,129 @@
+from .utils import *
+from datetime import date
+from sqlalchemy import event, update
+from sqlalchemy.dialects import postgresql
+from starlette import status
+from api import scheduler as maintenance
+from api.config import get_user, get_db, get_read_db
+from api.scheduler import Scheduler, Job, purge_completed_todos, delete_accounts
+from database import archive
+from database.model_db import TodoArchive
+
+app.dependency_overrides[get_db] = overide_get_db
+app.dependency_overrides[get_user] = overide_get_user
+
+
+@pytest.fixture
+def todos(test_user):
+    db = test_begin()
+    db.add_all([Todo(id=i, task=f"Task {i}", note="", status=i % 2 == 0, due=datetime(2030, 1, 1), user_id="1")
+                for i in range(1, 7)])
+    db.commit()
+    db.close()
+    yield
+    with engine.connect() as connection:
+        connection.execute(text("DELETE FROM 'Todo';"))
+        connection.execute(text("DELETE FROM 'TodoArchive';"))
+        connection.commit()
+
+
+@pytest.fixture
+def archiving(monkeypatch):
+    monkeypatch.setattr(archive, "TODO_ARCHIVE", True)
+
+
+@pytest.fixture
+def statements():
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append(statement)
+
+    event.listen(session_engine, "before_cursor_execute", capture)
+    yield captured
+    event.remove(session_engine, "before_cursor_execute", capture)
+
+
+def test_delete_completed_is_one_statement(todos, statements):
+    response = client.delete("/todo/delete/all/true")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    todo_statements = [statement for statement in statements if '"Todo"' in statement and "User" not in statement]
+    assert len(todo_statements) == 1
+    assert todo_statements[0].startswith("DELETE") and "RETURNING" in todo_statements[0]
+
+    db = test_begin()
+    assert sorted(todo.id for todo in db.query(Todo).all()) == [1, 3, 5]
+    assert db.query(User).filter(User.id == "1").one().todo_version == 1
+    db.close()
+
+    response = client.delete("/todo/delete/all/true")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_delete_completed_moves_to_archive(todos, archiving):
+    response = client.delete("/todo/delete/all/true")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    db = test_begin()
+    assert db.query(Todo).count() == 3
+    assert sorted(row.id for row in db.query(TodoArchive).all()) == [2, 4, 6]
+    db.close()
+
+    app.dependency_overrides[get_read_db] = overide_get_db
+    try:
+        response = client.get("/todo/archive", params={"limit": 2})
+        assert response.status_code == status.HTTP_200_OK
+        page = response.json()
+        assert [item["id"] for item in page["todos"]] == [6, 4] and page["next_cursor"]
+        assert all(item["status"] and item["archived_at"] for item in page["todos"])
+
+        response = client.get("/todo/archive", params={"limit": 2, "cursor": page["next_cursor"]})
+        assert [item["id"] for item in response.json()["todos"]] == [2] and response.json()["next_cursor"] is None
+    finally:
+        del app.dependency_overrides[get_read_db]
+
+
+def test_postgres_archive_is_one_statement():
+    statement = archive.move_statement(Todo.user_id == "1", datetime.now())
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    assert sql.startswith('WITH moved AS \n(DELETE FROM "Todo"')
+    assert 'INSERT INTO "TodoArchive"' in sql and 'RETURNING "TodoArchive".user_id, "TodoArchive".id' in sql
+
+
+def test_partition_ddl_covers_one_month():
+    assert archive.month_start(date(2026, 12, 15), 1) == date(2027, 1, 1)
+    assert archive.partition_ddl(date(2026, 12, 1)) == (
+        'CREATE TABLE IF NOT EXISTS "TodoArchive_2026_12" PARTITION OF "TodoArchive" '
+        "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')")
+
+
+@pytest.mark.asyncio
+async def test_retention_purge_archives(todos, archiving, monkeypatch):
+    monkeypatch.setattr(maintenance, "TODO_RETENTION_DAYS", 30)
+    with engine.begin() as connection:
+        connection.execute(update(Todo).values(created_at=datetime.now() - timedelta(days=31)))
+
+    assert await Scheduler(engine).run(Job("completed_todo_purge", 60, purge_completed_todos)) == 3
+
+    db = test_begin()
+    assert db.query(Todo).count() == 3
+    assert db.query(TodoArchive).count() == 3
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_account_deletion_removes_archive(todos, archiving):
+    client.delete("/todo/delete/all/true")
+    with engine.begin() as connection:
+        connection.execute(update(User).where(User.id == "1").values(deleted_at=datetime.now()))
+
+    # 3 todos, 3 archived todos and the account.
+    assert await Scheduler(engine, batch_size=2).run(Job("account_deletion", 60, delete_accounts)) == 7
+
+    db = test_begin()
+    assert db.query(Todo).count() == 0
+    assert db.query(TodoArchive).count() == 0
+    assert db.query(User).count() == 0
+    db.close()
@@ -0,0 +1,21 @@
+from .utils import *
+import asyncio
+from api import hashing, metrics
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify():
+    password_hash = await hashing.hash_password("Interstellar.")
+
+    assert await hashing.verify_password("Interstellar.", password_hash)
+    assert not await hashing.verify_password("Interstellar", password_hash)
+
+
+@pytest.mark.asyncio
+async def test_hash_metrics():
+    before = metrics.histogram("hash_duration_seconds", operation="hash").count
+    await asyncio.gather(*(hashing.hash_password("Interstellar.") for _ in range(3)))
+
+    assert metrics.histogram("hash_duration_seconds", operation="hash").count == before + 3
+    assert hashing.queue_depth.value == 0
+    assert hashing.in_flight.value == 0
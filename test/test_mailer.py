@@ -0,0 +1,59 @@
+from .utils import *
+import asyncio
+import smtplib
+from api import metrics
+from api.mailer import Outbox, MemoryTransport
+
+
+class FlakyTransport(MemoryTransport):
+    failures = 0
+
+    def send(self, messages):
+        if FlakyTransport.failures:
+            FlakyTransport.failures -= 1
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        return super().send(messages)
+
+
+@pytest.mark.asyncio
+async def test_outbox_batches_messages():
+    timed = metrics.histogram("section_seconds", section="email").count
+    outbox = Outbox(transport=MemoryTransport, workers=1, batch_size=10)
+    for i in range(5):
+        outbox.enqueue(f"user{i}@gmail.com", "Subject", "Body")
+    outbox.start()
+    transport = outbox.transports[0]
+    await outbox.stop()
+
+    assert [message.to for message in transport.sent] == [f"user{i}@gmail.com" for i in range(5)]
+    # The email section times the transport delivering the batch, not the enqueue.
+    assert metrics.histogram("section_seconds", section="email").count == timed + 1
+
+
+@pytest.mark.asyncio
+async def test_outbox_retries_then_delivers():
+    FlakyTransport.failures = 2
+    outbox = Outbox(transport=FlakyTransport, workers=1, retry_delay=0.01)
+    outbox.start()
+    outbox.enqueue("isongrichard234@gmail.com", "Subject", "Body")
+    transport = outbox.transports[0]
+    while not transport.sent:
+        await asyncio.sleep(0.01)
+    await outbox.stop()
+
+    assert transport.sent[0].attempts == 2
+    assert not outbox.dead_letters
+
+
+@pytest.mark.asyncio
+async def test_outbox_dead_letters():
+    FlakyTransport.failures = 3
+    outbox = Outbox(transport=FlakyTransport, workers=1, max_attempts=3, retry_delay=0.01)
+    outbox.start()
+    outbox.enqueue("isongrichard234@gmail.com", "Subject", "Body")
+    while not outbox.dead_letters:
+        await asyncio.sleep(0.01)
+    await outbox.stop()
+
+    assert outbox.dead_letters[0].attempts == 3
+    assert outbox.transports == []
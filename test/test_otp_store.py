@@ -0,0 +1,112 @@
+from .utils import *
+import asyncio
+from starlette import status
+from api.config import get_db
+from api import otp_store as store
+from api.otp_store import OtpStore, MemoryBackend, RedisBackend, SqlBackend, PASSWORD, DELETION, VALID, INVALID, EXPIRED, USED
+from database.database import SyncSession
+from database.model_db import Otp
+from sqlalchemy.exc import IntegrityError
+
+app.dependency_overrides[get_db] = overide_get_db
+
+
+@pytest.fixture(params=["memory", "redis", "sql"])
+def backend(request, test_user):
+    if request.param == "memory":
+        return MemoryBackend()
+    if request.param == "redis":
+        return RedisBackend(FakeRedis())
+    return SqlBackend()
+
+
+@pytest.fixture
+def db():
+    session = test_begin()
+    yield SyncSession(session)
+    session.close()
+
+
+@pytest.mark.asyncio
+async def test_consume_once(backend, db):
+    otp = OtpStore(backend)
+    await otp.issue(db, "1", PASSWORD, "123456")
+
+    assert await otp.consume(db, "1", PASSWORD, "654321") == INVALID
+    assert await otp.consume(db, "1", DELETION, "123456") == INVALID
+    assert await otp.consume(db, "2", PASSWORD, "123456") == INVALID
+    assert await otp.consume(db, "1", PASSWORD, "123456") == VALID
+    assert await otp.consume(db, "1", PASSWORD, "123456") == USED
+
+
+@pytest.mark.asyncio
+async def test_new_code_replaces_the_old_one(backend, db):
+    otp = OtpStore(backend)
+    await otp.issue(db, "1", PASSWORD, "111111")
+    await otp.issue(db, "1", PASSWORD, "222222")
+
+    assert await otp.consume(db, "1", PASSWORD, "111111") == INVALID
+    assert await otp.consume(db, "1", PASSWORD, "222222") == VALID
+
+
+@pytest.mark.asyncio
+async def test_expired_code(backend, db):
+    otp = OtpStore(backend, ttl=0)
+    await otp.issue(db, "1", PASSWORD, "123456")
+
+    # Redis has already dropped the key, the other backends can still tell it expired.
+    expected = INVALID if isinstance(backend, RedisBackend) else EXPIRED
+    assert await otp.consume(db, "1", PASSWORD, "123456") == expected
+
+
+@pytest.mark.asyncio
+async def test_concurrent_consume_has_one_winner(backend, db):
+    otp = OtpStore(backend)
+    await otp.issue(db, "1", DELETION, "123456")
+
+    results = await asyncio.gather(*(otp.consume(db, "1", DELETION, "123456") for _ in range(5)))
+    assert sorted(results) == [USED] * 4 + [VALID]
+
+
+@pytest.mark.asyncio
+async def test_discard(backend, db):
+    otp = OtpStore(backend)
+    await otp.issue(db, "1", PASSWORD, "123456")
+    await otp.issue(db, "1", DELETION, "654321")
+    await otp.discard(db, "1")
+
+    assert await otp.consume(db, "1", PASSWORD, "123456") == INVALID
+    assert await otp.consume(db, "1", DELETION, "654321") == INVALID
+
+
+@pytest.mark.asyncio
+async def test_sql_backend_keeps_one_row_per_purpose(test_user, db):
+    otp = OtpStore(SqlBackend())
+    for code in ("111111", "222222", "333333"):
+        await otp.issue(db, "1", PASSWORD, code)
+    await otp.issue(db, "1", DELETION, "444444")
+
+    rows = db.session.query(Otp).filter(Otp.user_id == "1").all()
+    assert sorted((row.tag, row.otp) for row in rows) == [(DELETION, "444444"), (PASSWORD, "333333")]
+
+
+def test_one_code_per_purpose_is_enforced(test_user, db):
+    db.session.add_all([Otp(otp="111111", tag=PASSWORD, user_id="1"), Otp(otp="222222", tag=PASSWORD, user_id="1")])
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_verify_otp_is_scoped_to_the_email(test_user, outbox, monkeypatch):
+    monkeypatch.setattr(store.otp_store, "backend", MemoryBackend())
+
+    response = client.request("GET", "/user/generate-otp", json={"email": "isongrichard234@gmail.com"})
+    assert response.status_code == status.HTTP_200_OK
+    code = store.otp_store.backend.entries[("1", PASSWORD)][0]
+
+    response = client.request("GET", "/user/verify-otp", json={"otp": code, "email": "someoneelse@gmail.com"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {"detail": "Invalid otp!"}
+
+    response = client.request("GET", "/user/verify-otp", json={"otp": code, "email": "isongrichard234@gmail.com"})
+    assert response.status_code == status.HTTP_200_OK
@@ -0,0 +1,123 @@
+from .utils import *
+import logging
+from starlette import status
+from sqlalchemy import event
+from api import metrics, profiling
+from api.config import get_user, get_db
+
+app.dependency_overrides[get_db] = overide_get_db
+
+
+@pytest.fixture
+def counted_queries():
+    engines = {engine, session_engine}
+    for target in engines:
+        event.listen(target, "before_cursor_execute", profiling.query_started)
+        event.listen(target, "after_cursor_execute", profiling.query_finished)
+    yield
+    for target in engines:
+        event.remove(target, "before_cursor_execute", profiling.query_started)
+        event.remove(target, "after_cursor_execute", profiling.query_finished)
+
+
+@pytest.fixture
+def admin_user():
+    app.dependency_overrides[get_user] = lambda: {"role": "admin", "user_id": "1"}
+    yield
+    app.dependency_overrides[get_user] = overide_get_user
+
+
+def test_request_metrics_use_route_template(test_todo, counted_queries):
+    app.dependency_overrides[get_user] = overide_get_user
+    latency = metrics.histogram("http_request_seconds", method="GET", route="/todo/get-todo/id/{todo_id}")
+    queries = metrics.histogram("http_request_queries", buckets=profiling.QUERY_BUCKETS, method="GET", route="/todo/get-todo/id/{todo_id}")
+    seen, total = latency.count, queries.sum
+
+    response = client.get("/todo/get-todo/id/1")
+    assert response.status_code == status.HTTP_200_OK
+    assert latency.count == seen + 1
+    assert queries.sum > total
+    assert "x-profile" not in response.headers
+
+
+def test_failed_statement_leaves_no_timer(counted_queries):
+    timed = metrics.histogram("db_query_seconds").count
+    with engine.connect() as connection:
+        with pytest.raises(Exception):
+            connection.exec_driver_sql("SELECT * FROM missing_table")
+        connection.rollback()
+        connection.exec_driver_sql("SELECT 1")
+        assert not connection.info.get("query_started")
+
+    assert metrics.histogram("db_query_seconds").count == timed + 1
+
+
+def test_unmatched_requests_share_one_label():
+    latency = metrics.histogram("http_request_seconds", method="GET", route="unmatched")
+    seen = latency.count
+    client.get("/no/such/page/123")
+    assert latency.count == seen + 1
+
+
+def test_profile_header(test_todo, counted_queries, monkeypatch, admin_user):
+    monkeypatch.setattr(profiling, "PROFILE_HEADER_ENABLED", True)
+
+    response = client.get("/todo/get-todo/all", headers={"X-Profile": "1"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["todos"][0]["task"] == "Trying to test out my todo test"
+    assert "sql=" in response.headers["x-profile"]
+
+    report = client.get(f"/admin/profiles/{response.headers['x-profile-id']}")
+    assert report.status_code == status.HTTP_200_OK
+    assert "SELECT" in report.text
+    assert "function calls" in report.text
+    assert client.get("/admin/profiles/missing").status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_profile_header_ignored_when_disabled(test_todo):
+    app.dependency_overrides[get_user] = overide_get_user
+    response = client.get("/todo/get-todo/all", headers={"X-Profile": "1"})
+    assert response.status_code == status.HTTP_200_OK
+    assert "x-profile" not in response.headers
+
+
+def test_sections_are_attributed_to_the_request(test_user):
+    app.dependency_overrides[get_user] = overide_get_user
+    hashing = metrics.histogram("section_seconds", section="hashing")
+    seen = hashing.count
+
+    response = client.post("/user/login", json={"username": "Imisioluwa23", "password": "Interstellar."})
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert hashing.count == seen + 1
+
+
+def test_n_plus_one_warning(caplog):
+    profile = profiling.Profile()
+    profile.statements["SELECT * FROM Todo WHERE id = ?"] = profiling.N_PLUS_ONE_THRESHOLD
+    profile.statements["SELECT * FROM User WHERE id = ?"] = 1
+    detected = metrics.counter("n_plus_one_total", route="/test")
+    seen = detected.value
+
+    with caplog.at_level(logging.WARNING, logger="todoapi.profiling"):
+        profiling.report_n_plus_one(profile, "/test")
+    assert detected.value == seen + 1
+    assert "FROM Todo" in caplog.text
+    assert "FROM User" not in caplog.text
+
+
+def test_prometheus_exposition(admin_user):
+    histogram = metrics.histogram("test_prometheus_seconds", "Test \"histogram\"", buckets=(0.1, 1.0), kind='a"b')
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    response = client.get("/admin/metrics/prometheus")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert '# HELP test_prometheus_seconds Test \\"histogram\\"' in lines
+    assert "# TYPE test_prometheus_seconds histogram" in lines
+    assert 'test_prometheus_seconds_bucket{kind="a\\"b",le="0.1"} 1' in lines
+    assert 'test_prometheus_seconds_bucket{kind="a\\"b",le="1.0"} 2' in lines
+    assert 'test_prometheus_seconds_bucket{kind="a\\"b",le="+Inf"} 3' in lines
+    assert 'test_prometheus_seconds_count{kind="a\\"b"} 3' in lines
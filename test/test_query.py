@@ -0,0 +1,84 @@
+from .utils import *
+from sqlalchemy import event
+from starlette import status
+from api.config import get_user, get_db
+
+app.dependency_overrides[get_db] = overide_get_db
+app.dependency_overrides[get_user] = overide_get_user
+
+
+@pytest.fixture
+def todos():
+    db = test_begin()
+    db.add_all([
+        Todo(id=1, task="Renew passport", note="", status=False, priority=3, due=datetime(2030, 1, 1), created_at=datetime(2026, 1, 1), user_id="1"),
+        Todo(id=2, task="Pay rent", note="Before the 5th", status=True, priority=1, due=datetime(2030, 2, 1), created_at=datetime(2026, 1, 2), user_id="1"),
+        Todo(id=3, task="Book dentist", note="Ask about the passport photo", status=False, priority=2, due=datetime(2030, 3, 1), created_at=datetime(2026, 1, 3), user_id="1"),
+        Todo(id=4, task="Walk dog", note="", status=False, priority=2, due=datetime(2030, 1, 15), created_at=datetime(2026, 1, 4), user_id="1"),
+        Todo(id=5, task="Renew passport", note="", status=False, priority=3, due=datetime(2030, 1, 1), created_at=datetime(2026, 1, 1), user_id="2"),
+    ])
+    db.commit()
+    db.close()
+    yield
+    with engine.connect() as connection:
+        connection.execute(text("DELETE FROM 'Todo';"))
+        connection.commit()
+
+
+@pytest.fixture
+def statements():
+    captured = []
+    listener = lambda conn, cursor, statement, parameters, *args: captured.append((statement, parameters))
+    event.listen(session_engine, "before_cursor_execute", listener)
+    yield captured
+    event.remove(session_engine, "before_cursor_execute", listener)
+
+
+def query(**params):
+    return client.get("/todo/query", params=params)
+
+
+def ids(response):
+    assert response.status_code == status.HTTP_200_OK, response.json()
+    return [todo["id"] for todo in response.json()["todos"]]
+
+
+def test_query_combines_filters_and_sort(todos, statements):
+    response = query(filter="status:false priority>=2 due<2030-02-01", sort="-priority,due")
+    assert ids(response) == [1, 4]
+    assert len([statement for statement, _ in statements if '"Todo"' in statement]) == 1
+
+    assert ids(query(filter="created>=2026-01-02 created<2026-01-04")) == [2, 3]
+    assert ids(query(filter='text:passport', sort="-created")) == [3, 1]
+    assert ids(query(filter='task:"Pay rent"')) == [2]
+    assert ids(query(filter="status!=true", sort="due,-id", limit=2)) == [1, 4]
+
+
+def test_query_reports_unindexed_filters(todos):
+    response = query(filter="status:false", sort="created")
+    assert response.json()["warnings"] == []
+
+    response = query(filter="priority>=2", sort="due")
+    assert response.json()["warnings"] == ["priority has no index", "sorting by due needs a separate sort step"]
+
+    response = query(filter="priority>=2", strict=True)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {"detail": "Query cannot use an index: priority has no index"}
+
+    assert query(filter="status:false created>=2026-01-02", strict=True).status_code == status.HTTP_200_OK
+
+
+def test_query_rejects_bad_input():
+    for params in ({"filter": "colour:red"}, {"filter": "priority>=high"}, {"filter": "status>true"},
+                   {"filter": "text>=x"}, {"filter": 'text:"open'}, {"sort": "colour"}):
+        assert query(**params).status_code == status.HTTP_400_BAD_REQUEST, params
+
+
+def test_indexed_query_plan(todos, statements):
+    query(filter="status:false created>=2026-01-02", strict=True)
+
+    statement, parameters = statements[-1]
+    with engine.connect() as connection:
+        plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()]
+    assert [step for step in plan if step.startswith("SEARCH Todo USING INDEX")]
+    assert not [step for step in plan if step.startswith("SCAN")]
@@ -0,0 +1,90 @@
+from .utils import *
+from sqlalchemy import event
+from alembic.migration import MigrationContext
+from alembic.autogenerate import compare_metadata
+from alembic.script import ScriptDirectory
+from starlette import status
+from api.config import get_user, get_db
+from database.database import data
+from database.model_db import Otp
+from database.search import include_name
+
+app.dependency_overrides[get_db] = overide_get_db
+app.dependency_overrides[get_user] = overide_get_user
+
+
+@pytest.fixture
+def seeded(test_user):
+    db = test_begin()
+    db.add_all([User(id=str(i), firstname="Seed", lastname="User", username=f"seeduser{i}", email=f"seed{i}@gmail.com", password="x") for i in range(2, 50)])
+    db.add_all([Todo(task=f"Task {i}", note="", status=i % 3 == 0, user_id=str(i % 50)) for i in range(5000)])
+    db.add_all([Otp(otp=f"{100000 + i}", user_id=str(i)) for i in range(1000)])
+    db.commit()
+    db.close()
+    with engine.connect() as connection:
+        connection.exec_driver_sql("ANALYZE")
+    yield
+    with engine.connect() as connection:
+        connection.execute(text("DELETE FROM 'Todo';"))
+        connection.execute(text("DELETE FROM 'Otp';"))
+        connection.execute(text("DELETE FROM 'User' WHERE id != '1';"))
+        connection.commit()
+
+
+@pytest.fixture
+def statements():
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            captured.append((statement, parameters))
+
+    event.listen(session_engine, "before_cursor_execute", capture)
+    yield captured
+    event.remove(session_engine, "before_cursor_execute", capture)
+
+
+def test_migrations_match_models():
+    with engine.connect() as connection:
+        diff = compare_metadata(MigrationContext.configure(connection, opts={"include_name": include_name}), data.metadata)
+
+    assert diff == []
+
+
+def test_legacy_schema_is_stamped_before_upgrading():
+    legacy = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    # Stand in for a database built by the old metadata.create_all: the baseline tables without alembic_version.
+    with legacy.begin() as connection:
+        migrations.upgrade(connection, migrations.BASELINE)
+        connection.execute(text("DROP TABLE alembic_version"))
+        connection.execute(text("INSERT INTO 'User' (id, firstname, lastname, username, email, password, timezone, created_at, role) VALUES ('7', 'Old', 'User', 'olduser', 'old@gmail.com', 'x', 'UTC', '2026-01-01', 'user')"))
+
+    with legacy.begin() as connection:
+        migrations.upgrade(connection)
+
+    with legacy.connect() as connection:
+        assert connection.scalar(text("SELECT version_num FROM alembic_version")) == ScriptDirectory.from_config(migrations.alembic_config()).get_current_head()
+        assert connection.scalar(text("SELECT username FROM 'User'")) == "olduser"
+    legacy.dispose()
+
+
+def test_router_queries_use_indexes(seeded, statements, outbox):
+    client.get("/todo/get-todo/all", params={"limit": 5})
+    client.get("/todo/get-todo/id/1")
+    client.get("/todo/get-todo/name/Task 1")
+    client.get("/todo/get-todo/status/true")
+    client.put("/todo/update-todo/complete-todo/1", params={"status": True})
+    client.delete("/todo/delete-todo/51")
+    client.delete("/todo/delete/all/true")
+    client.get("/user/get-user-details")
+    client.post("/user/login", json={"username": "Imisioluwa23", "password": "Interstellar."})
+    client.request("GET", "/user/generate-otp", json={"email": "isongrichard234@gmail.com"})
+    client.request("GET", "/user/verify-otp", json={"otp": "100001", "email": "isongrichard234@gmail.com"})
+    client.request("DELETE", "/user/delete-user", json={"otp": "100001"})
+    assert len(statements) > 10
+
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            scans = [row[-1] for row in plan if row[-1].startswith("SCAN")]
+            assert not scans, f"{statement} falls back to {scans}"
@@ -0,0 +1,67 @@
+from .utils import *
+from starlette import status
+from api import metrics
+from api.config import get_db
+from api.ratelimit import RateLimiter, RedisBackend
+
+app.dependency_overrides[get_db] = overide_get_db
+
+
+def login(username):
+    return client.post("/user/login", json={"username": username, "password": "Wrong password."})
+
+
+def test_login_is_throttled_per_username(test_user):
+    for _ in range(5):
+        assert login("Imisioluwa23").status_code == status.HTTP_401_UNAUTHORIZED
+
+    response = login("imisioluwa23 ")
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert response.json() == {"detail": "Too many requests"}
+    assert 0 < int(response.headers["retry-after"]) <= 12
+
+    # Another username from the same address still has its own bucket.
+    assert login("Someoneelse").status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_login_is_throttled_per_ip(test_user):
+    statuses = [login(f"user{index}").status_code for index in range(21)]
+    assert statuses[:20] == [status.HTTP_401_UNAUTHORIZED] * 20
+    assert statuses[20] == status.HTTP_429_TOO_MANY_REQUESTS
+    assert metrics.counter("rate_limited_total", route="/user/login", scope="ip").value >= 1
+
+
+def test_oversized_body_is_refused():
+    response = client.post("/user/login", json={"username": "x" * 20000, "password": "x"})
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+@pytest.mark.asyncio
+async def test_route_bucket_is_shared_between_clients(fresh_rate_limits):
+    limiter = RateLimiter(fresh_rate_limits.backend, limits={"/user/verify-otp": (("ip", "10/60"), ("route", "3/60"))})
+    waits = [await limiter.check("/user/verify-otp", f"10.0.0.{index}") for index in range(4)]
+    assert waits[:3] == [0, 0, 0]
+    assert waits[3] == pytest.approx(20, rel=0.01)
+
+
+@pytest.mark.parametrize("redis", [False, True])
+@pytest.mark.asyncio
+async def test_refused_client_does_not_drain_shared_bucket(fresh_rate_limits, redis):
+    backend = RedisBackend(FakeRedis()) if redis else fresh_rate_limits.backend
+    limiter = RateLimiter(backend, limits={"/user/verify-otp": (("ip", "2/60"), ("route", "5/60"))})
+    waits = [await limiter.check("/user/verify-otp", "10.0.0.1") for _ in range(10)]
+    assert waits[:2] == [0, 0] and all(waits[2:])
+
+    # The flooding address only ever took its own 2 tokens from the shared bucket.
+    waits = [await limiter.check("/user/verify-otp", f"10.0.1.{index}") for index in range(4)]
+    assert waits[:3] == [0, 0, 0] and waits[3]
+
+
+@pytest.mark.asyncio
+async def test_redis_backend():
+    limiter = RateLimiter(RedisBackend(FakeRedis()), limits={"/user/login": (("username", "2/60"),)})
+    body = {"username": "Imisioluwa23"}
+    waits = [await limiter.check("/user/login", "127.0.0.1", body) for _ in range(3)]
+    assert waits[:2] == [0, 0]
+    assert waits[2] == pytest.approx(30, rel=0.01)
+    assert await limiter.check("/user/login", "127.0.0.1", {"password": "no username"}) == 0
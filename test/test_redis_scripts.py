@@ -0,0 +1,51 @@
+from .utils import *
+import uuid
+from api.ratelimit import RateLimiter, RedisBackend as RateLimitRedis
+from api.otp_store import RedisBackend as OtpRedis, PASSWORD, VALID, INVALID, USED
+
+# The other tests use FakeRedis, which mirrors the Lua in Python. These run the real scripts,
+# against TEST_REDIS_URL when it is set, otherwise through fakeredis with its Lua runtime.
+TEST_REDIS_URL = os.getenv("TEST_REDIS_URL")
+
+
+@pytest.fixture
+def redis_client():
+    if TEST_REDIS_URL:
+        import redis.asyncio as redis
+        return redis.Redis.from_url(TEST_REDIS_URL)
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return fakeredis.FakeAsyncRedis()
+
+
+@pytest.fixture
+def prefix():
+    # Keys are scoped per test so a shared Redis needs no flushing.
+    return f"todoapi:test:{uuid.uuid4().hex}:"
+
+
+@pytest.mark.asyncio
+async def test_bucket_script(redis_client, prefix):
+    limiter = RateLimiter(RateLimitRedis(redis_client, prefix), limits={"/user/verify-otp": (("ip", "2/60"), ("route", "5/60"))})
+    waits = [await limiter.check("/user/verify-otp", "10.0.0.1") for _ in range(4)]
+    assert waits[:2] == [0, 0]
+    assert waits[2] == pytest.approx(30, rel=0.01) and waits[3]
+
+    # Refused requests charged neither bucket, so the shared one still has 3 tokens.
+    waits = [await limiter.check("/user/verify-otp", f"10.0.1.{index}") for index in range(4)]
+    assert waits[:3] == [0, 0, 0]
+    assert waits[3] == pytest.approx(12, rel=0.01)
+
+
+@pytest.mark.asyncio
+async def test_consume_script(redis_client, prefix):
+    backend = OtpRedis(redis_client, prefix)
+    await backend.put(None, "1", PASSWORD, "123456", 60)
+
+    assert await backend.consume(None, "1", PASSWORD, "654321") == INVALID
+    assert await backend.consume(None, "1", PASSWORD, "123456") == VALID
+    assert await backend.consume(None, "1", PASSWORD, "123456") == USED
+    assert await redis_client.ttl(backend.key("1", PASSWORD)) > 0
+
+    await backend.discard(None, "1")
+    assert await backend.consume(None, "1", PASSWORD, "123456") == INVALID
@@ -0,0 +1,98 @@
+from .utils import *
+import time
+from starlette import status
+from api.config import get_user, get_db
+from database import replicas
+from database.replicas import Replica, ReplicaSet, replica_set
+
+app.dependency_overrides[get_db] = overide_get_db
+app.dependency_overrides[get_user] = overide_get_user
+
+
+def make_replica(tmp_path, name, task):
+    replica = Replica(name, f"sqlite:///{tmp_path / f'{name}.sqlite'}", is_async=False)
+    with replica.engine.begin() as connection:
+        migrations.upgrade(connection)
+    db = replica.begin()
+    db.add(Todo(id=1, task=task, status=False, note="", due=datetime(2030, 1, 1), user_id="1"))
+    db.commit()
+    db.close()
+    return replica
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    replica = make_replica(tmp_path, "replica_test", "Replicated task")
+    monkeypatch.setattr(replica_set, "replicas", [replica])
+    monkeypatch.setattr(replica_set, "writes", {})
+    client.cookies.clear()
+    yield replica
+    client.cookies.clear()
+    replica.engine.dispose()
+
+
+def test_reads_go_to_replica(test_todo, replica):
+    response = client.get("/todo/get-todo/id/1")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["task"] == "Replicated task"
+
+
+def test_reads_stick_to_primary_after_write(test_todo, replica):
+    response = client.put("/todo/update-todo/complete-todo/1", params={"status": True})
+    assert response.status_code == status.HTTP_202_ACCEPTED
+
+    response = client.get("/todo/get-todo/id/1")
+    assert response.json()["task"] == test_todo.task
+    assert response.json()["status"] is True
+
+    # Other users are not pinned by this user's write.
+    assert replica_set.choose("2") is replica
+
+
+def test_stickiness_expires(replica, monkeypatch):
+    replica_set.mark_write("1")
+    assert replica_set.choose("1") is None
+
+    monkeypatch.setattr(replicas.time, "monotonic", lambda: float("inf"))
+    assert replica_set.choose("1") is replica
+
+
+def test_stickiness_follows_cookie_to_other_workers(test_todo, replica):
+    response = client.put("/todo/update-todo/complete-todo/1", params={"status": True})
+    assert replica_set.cookie in response.cookies
+
+    # Another worker never saw the write, the cookie still keeps the read on the primary.
+    replica_set.writes.clear()
+    response = client.get("/todo/get-todo/id/1")
+    assert response.json()["status"] is True
+
+    assert replica_set.choose("1") is replica
+
+
+def test_stickiness_cookie_is_bounded(replica):
+    assert replica_set.choose("1", replica_set.sticky_until()) is None
+    assert replica_set.choose("1", f"{time.time() + 3600}") is replica
+    assert replica_set.choose("1", "not a time") is replica
+
+
+def test_round_robin(tmp_path):
+    first, second = make_replica(tmp_path, "first", "First"), make_replica(tmp_path, "second", "Second")
+    replica_set = ReplicaSet([first, second], selection="round_robin")
+
+    assert [replica_set.choose().name for _ in range(4)] == ["first", "second", "first", "second"]
+
+
+def test_least_connections(tmp_path):
+    first, second = make_replica(tmp_path, "first", "First"), make_replica(tmp_path, "second", "Second")
+    replica_set = ReplicaSet([first, second], selection="least_connections")
+
+    with first.engine.connect():
+        assert replica_set.choose() is second
+    with second.engine.connect():
+        assert replica_set.choose() is first
+
+
+def test_no_replicas_reads_primary(test_todo):
+    assert ReplicaSet([]).choose("1") is None
+    response = client.get("/todo/get-todo/id/1")
+    assert response.json()["task"] == test_todo.task
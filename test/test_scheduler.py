@@ -0,0 +1,148 @@
+from .utils import *
+import asyncio
+from starlette import status
+from api import metrics
+from api import scheduler as maintenance
+from api.config import get_user, get_db
+from api.scheduler import Scheduler, Job, purge_otps, purge_completed_todos, announce_deleted_todos, delete_accounts, refresh_stats
+from database.model_db import Otp
+
+app.dependency_overrides[get_db] = overide_get_db
+
+
+@pytest.fixture
+def rows(test_user):
+    yield
+    with engine.connect() as connection:
+        connection.execute(text("DELETE FROM 'Todo';"))
+        connection.execute(text("DELETE FROM 'Otp';"))
+        connection.commit()
+
+
+@pytest.mark.asyncio
+async def test_otp_purge_runs_in_batches(rows):
+    now = datetime.now()
+    db = test_begin()
+    db.add_all([Otp(otp=f"{100000 + i}", user_id=f"expired{i}", expiring=now - timedelta(minutes=1)) for i in range(7)])
+    db.add_all([Otp(otp="200000", user_id="1", is_used=True, expiring=now + timedelta(minutes=5)),
+                Otp(otp="300000", user_id="1", tag="Deletion", expiring=now + timedelta(minutes=5))])
+    db.commit()
+
+    batches = []
+    job = Job("otp_purge_test", 60, lambda connection, size: batches.append(size) or purge_otps(connection, size))
+    assert await Scheduler(engine, batch_size=3).run(job) == 7
+    assert len(batches) == 3
+
+    assert sorted(otp.otp for otp in db.query(Otp).all()) == ["200000", "300000"]
+    db.close()
+    assert job.last_run["rows"] == 7 and job.last_run["result"] == "ok"
+    assert metrics.counter("maintenance_rows_total", job="otp_purge_test").value == 7
+
+
+@pytest.mark.asyncio
+async def test_completed_todo_purge_bumps_versions(rows, monkeypatch):
+    monkeypatch.setattr(maintenance, "TODO_RETENTION_DAYS", 30)
+    old = datetime.now() - timedelta(days=31)
+    db = test_begin()
+    db.add_all([Todo(id=1, task="Old and done", status=True, created_at=old, user_id="1"),
+                Todo(id=2, task="Old and open", status=False, created_at=old, user_id="1"),
+                Todo(id=3, task="New and done", status=True, user_id="1")])
+    db.commit()
+
+    announced = []
+    monkeypatch.setattr(maintenance.bus, "publish_change", lambda user_id, event, ids: asyncio.sleep(0, announced.append((user_id, ids))))
+    job = Job("completed_todo_purge", 60, purge_completed_todos, announce_deleted_todos)
+    assert await Scheduler(engine).run(job) == 1
+
+    assert sorted(todo.id for todo in db.query(Todo).all()) == [2, 3]
+    assert db.query(User).filter(User.id == "1").one().todo_version == 1
+    assert announced == [("1", [1])]
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_account_deletion_in_chunks(rows):
+    db = test_begin()
+    db.add(User(id="2", firstname="Kept", lastname="User", username="keptuser", email="kept@gmail.com", password="x"))
+    db.add_all([Todo(task=f"Task {i}", user_id="1") for i in range(7)] + [Todo(task="Kept", user_id="2")])
+    db.add(Otp(otp="123456", user_id="1"))
+    db.query(User).filter(User.id == "1").update({"deleted_at": datetime.now()})
+    db.commit()
+
+    batches = []
+    job = Job("account_deletion_test", 60, lambda connection, size: batches.append(size) or delete_accounts(connection, size))
+    assert await Scheduler(engine, batch_size=3).run(job) == 8
+    assert len(batches) == 3
+
+    assert [user.id for user in db.query(User).all()] == ["2"]
+    assert [todo.task for todo in db.query(Todo).all()] == ["Kept"]
+    assert db.query(Otp).count() == 0
+    assert metrics.gauge("accounts_pending_deletion").value == 0
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_failing_job_is_recorded():
+    def broken(connection, size):
+        raise RuntimeError("boom")
+
+    job = Job("broken_test", 60, broken)
+    await Scheduler(engine).run(job)
+    assert job.last_run["result"] == "error"
+    assert metrics.counter("maintenance_runs_total", job="broken_test", result="error").value == 1
+
+
+@pytest.mark.asyncio
+async def test_loop_runs_due_jobs():
+    ran = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def signal(connection, size):
+        loop.call_soon_threadsafe(ran.set)
+        return []
+
+    scheduler = Scheduler(engine, [Job("stats_test", 3600, refresh_stats), Job("loop_test", 3600, signal)], tick=0.01)
+
+    scheduler.start()
+    await asyncio.wait_for(ran.wait(), 5)
+    await scheduler.stop()
+    assert scheduler.status()["leader"] is False
+    assert scheduler.jobs["stats_test"].last_run["result"] == "ok"
+
+
+def test_maintenance_status():
+    app.dependency_overrides[get_user] = lambda: {"role": "admin", "user_id": "1"}
+    response = client.get("/admin/maintenance")
+    app.dependency_overrides[get_user] = overide_get_user
+    assert response.status_code == status.HTTP_200_OK
+    assert {"otp_purge", "stats_refresh"} <= set(response.json()["jobs"])
+
+
+class LockConnection:
+    """Stands in for the Postgres session holding the advisory lock."""
+
+    def __init__(self):
+        self.statements = []
+        self.in_transaction = False
+
+    def scalar(self, statement, parameters=None):
+        self.statements.append(str(statement))
+        self.in_transaction = True
+        return True
+
+    def commit(self):
+        self.in_transaction = False
+
+    def close(self):
+        pass
+
+
+def test_leader_keepalive_leaves_no_open_transaction():
+    connection = LockConnection()
+    engine = type("Engine", (), {"dialect": type("Dialect", (), {"name": "postgresql"}), "connect": lambda self: connection})()
+    scheduler = Scheduler(engine)
+
+    assert scheduler.elect() and scheduler.elect()
+    assert connection.statements[-1] == "SELECT 1"
+    assert not connection.in_transaction
+    scheduler.resign()
@@ -0,0 +1,79 @@
+from .utils import *
+from sqlalchemy import event
+from starlette import status
+from api.config import get_user, get_db
+
+app.dependency_overrides[get_db] = overide_get_db
+app.dependency_overrides[get_user] = overide_get_user
+
+
+@pytest.fixture
+def todos():
+    db = test_begin()
+    db.add_all([
+        Todo(id=1, task="Read a book", note="Chapter four", status=False, priority=1, due=datetime(2030, 1, 1), user_id="1"),
+        Todo(id=2, task="Groceries", note="Milk and a cookbook", status=True, priority=2, due=datetime(2030, 2, 1), user_id="1"),
+        Todo(id=3, task="Bookshelf", note="Assemble it", status=False, priority=2, due=datetime(2030, 3, 1), user_id="1"),
+        Todo(id=4, task="Book flights", note="", status=False, priority=1, due=datetime(2030, 1, 1), user_id="2"),
+        Todo(id=5, task="Call mum", note="50% off deal ends", status=False, priority=1, due=datetime(2030, 1, 1), user_id="1"),
+    ])
+    db.commit()
+    db.close()
+    yield
+    with engine.connect() as connection:
+        connection.execute(text("DELETE FROM 'Todo';"))
+        connection.commit()
+
+
+def search(**params):
+    response = client.get("/todo/search", params=params)
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+
+def test_search_substring_and_ranking(todos):
+    page = search(q="ook")
+    # Task matches rank above the note-only match, other users' todos never show up.
+    assert [todo["id"] for todo in page["todos"]][-1] == 2
+    assert sorted(todo["id"] for todo in page["todos"]) == [1, 2, 3]
+    assert page["next_offset"] is None
+
+
+def test_search_every_term_must_match(todos):
+    assert [todo["id"] for todo in search(q="book chapter")["todos"]] == [1]
+    assert sorted(todo["id"] for todo in search(q="book a")["todos"]) == [1, 2, 3]
+    assert [todo["id"] for todo in search(q="50%")["todos"]] == [5]
+    assert search(q="zz")["todos"] == []
+
+
+def test_search_filters_and_pagination(todos):
+    assert [todo["id"] for todo in search(q="book", completed=False, priority=2)["todos"]] == [3]
+    assert [todo["id"] for todo in search(q="book", due_before="2030-01-15T00:00:00")["todos"]] == [1]
+
+    first = search(q="book", limit=2)
+    second = search(q="book", limit=2, offset=first["next_offset"])
+    assert first["next_offset"] == 2
+    assert len(first["todos"]) == 2 and len(second["todos"]) == 1
+    assert second["next_offset"] is None
+
+
+def test_search_follows_writes(todos):
+    client.put("/todo/update-todo/details/5", json={"tasks": "Call the bookshop", "note": "", "completed": False, "due": "2030-01-01T00:00:00"})
+    assert 5 in [todo["id"] for todo in search(q="bookshop")["todos"]]
+
+    client.delete("/todo/delete-todo/5")
+    assert search(q="bookshop")["todos"] == []
+
+
+def test_search_uses_fts_index(todos):
+    captured = []
+    listener = lambda conn, cursor, statement, parameters, *args: captured.append((statement, parameters))
+    event.listen(session_engine, "before_cursor_execute", listener)
+    search(q="book", completed=False)
+    event.remove(session_engine, "before_cursor_execute", listener)
+
+    statement, parameters = captured[-1]
+    with engine.connect() as connection:
+        plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()]
+    assert any("VIRTUAL TABLE INDEX" in step for step in plan)
+    assert not [step for step in plan if step.startswith("SCAN Todo ") or step == "SCAN Todo"]
@@ -0,0 +1,148 @@
+from .utils import *
+from datetime import timedelta
+from starlette import status
+from starlette.websockets import WebSocketDisconnect
+from api.config import get_user, get_db, authentication
+from api.events import EventBus, PostgresBroker
+from api.routes import stream
+from api import metrics
+
+app.dependency_overrides[get_db] = overide_get_db
+app.dependency_overrides[get_user] = overide_get_user
+
+
+@pytest.fixture
+def token():
+    return authentication("user", "1", timedelta(minutes=5))
+
+
+def test_websocket_receives_changes(test_user, test_todo, token):
+    with client.websocket_connect("/todo/stream", headers={"Authorization": f"Bearer {token}"}) as websocket:
+        client.put("/todo/update-todo/complete-todo/1", params={"status": True})
+        assert websocket.receive_json() == {"event": "updated", "ids": [1]}
+
+        client.post("/todo/create-todo", json={"tasks": "Streamed", "note": ""})
+        assert websocket.receive_json() == {"event": "created", "ids": [2]}
+
+        client.delete("/todo/delete-todo/1")
+        assert websocket.receive_json() == {"event": "deleted", "ids": [1]}
+
+
+def test_websocket_only_sees_own_changes(test_todo):
+    token = authentication("user", "2", timedelta(minutes=5))
+    with client.websocket_connect(f"/todo/stream?token={token}") as websocket:
+        client.delete("/todo/delete-todo/1")
+        stream.bus.deliver("2", {"event": "deleted", "ids": [7]})
+        assert websocket.receive_json() == {"event": "deleted", "ids": [7]}
+
+
+def test_stream_requires_token():
+    response = client.get("/todo/stream")
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    response = client.get("/todo/stream", params={"token": "not-a-jwt"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/todo/stream") as websocket:
+            websocket.receive_json()
+
+
+@pytest.mark.asyncio
+async def test_sse_events(monkeypatch):
+    monkeypatch.setattr(stream, "EVENT_KEEPALIVE", 0.01)
+    events = stream.sse_events("1")
+
+    assert await anext(events) == b"retry: 3000\n\n"
+    await stream.bus.publish_change("1", "deleted", [1, 2])
+    assert await anext(events) == b'event: deleted\ndata: {"event":"deleted","ids":[1,2]}\n\n'
+    assert await anext(events) == b": keepalive\n\n"
+
+    await events.aclose()
+    assert "1" not in stream.bus.subscribers
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_gets_resync():
+    bus = EventBus(None, buffer_size=2)
+    with bus.subscribe("1") as subscription:
+        for todo_id in range(4):
+            await bus.publish_change("1", "created", [todo_id])
+        events = subscription.events()
+
+        assert await anext(events) == {"event": "resync"}
+        assert await anext(events) == {"event": "created", "ids": [3]}
+
+        await bus.stop()
+        assert [event async for event in events] == []
+
+    assert bus.subscribers == {}
+
+
+class FakeConnection:
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.notified = []
+        self.closed = False
+
+    async def execute(self, query, *args):
+        if self.fail:
+            raise ConnectionError("connection was closed")
+        self.notified.append(args)
+
+    async def close(self):
+        self.closed = True
+
+    def is_closed(self):
+        return self.closed
+
+
+@pytest.mark.asyncio
+async def test_broker_reconnects_on_publish(monkeypatch):
+    broker = PostgresBroker("postgresql://localhost/todo")
+    connections = [FakeConnection(fail=True), FakeConnection()]
+
+    async def connect():
+        broker.connection = connections.pop(0)
+    monkeypatch.setattr(broker, "connect", connect)
+
+    await broker.start(EventBus(broker))
+    await broker.publish("1", {"event": "resync"})
+
+    assert broker.connection.notified == [("todo_events", '{"user_id": "1", "event": {"event": "resync"}}')]
+    await broker.stop()
+
+
+@pytest.mark.asyncio
+async def test_broker_reconnects_when_terminated(monkeypatch):
+    broker = PostgresBroker("postgresql://localhost/todo", reconnect_delay=0)
+    attempts = []
+
+    async def connect():
+        attempts.append(1)
+        if len(attempts) == 2:
+            raise ConnectionError("database is restarting")
+        broker.connection = FakeConnection()
+    monkeypatch.setattr(broker, "connect", connect)
+
+    await broker.start(EventBus(broker))
+    broker.connection.closed = True
+    broker.terminated(broker.connection)
+    await broker.reconnecting
+
+    assert len(attempts) == 3 and not broker.connection.is_closed()
+    await broker.stop()
+
+
+def test_broker_failure_does_not_fail_write(test_user, test_todo, monkeypatch):
+    class BrokenBroker:
+        async def publish(self, user_id, event):
+            raise ConnectionError("connection was closed")
+
+    failures = metrics.counter("events_publish_failures_total").value
+    monkeypatch.setattr(stream.bus, "broker", BrokenBroker())
+
+    response = client.put("/todo/update-todo/complete-todo/1", params={"status": True})
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert metrics.counter("events_publish_failures_total").value == failures + 1
@@ -1,50 +1,85 @@
 from .utils import *
+import io
+import csv
+import json
 from starlette import status
-from app.routers.todo import get_user, get_db
+from api.config import get_user, get_db, BULK_TODO_LIMIT
 
 app.dependency_overrides[get_db] = overide_get_db
 app.dependency_overrides[get_user] = overide_get_user
 
 
 def test_get_all_task(test_todo):
-    response = client.get("/todo/all-todo")
+    response = client.get("/todo/get-todo/all")
     assert response.status_code == status.HTTP_200_OK
-    assert response.json() == [
-        {
-            "id": 1,
-            "task": "Trying to test out my todo test",
-            "completed": False,
-            "note": "This is kinda getting boring, Front-end sucks",
-            "due": "Today",
-            "user_id": 1
-        }
-    ]
+    assert response.json() == {
+        "todos": [
+            {
+                "id": 1,
+                "task": "Trying to test out my todo test",
+                "status": False,
+                "note": "This is kinda getting boring",
+                "priority": 1,
+                "created_at": response.json()["todos"][0]["created_at"],
+                "due": "2030-01-01T00:00:00",
+                "user_id": "1"
+            }
+        ],
+        "next_cursor": None
+    }
+
+
+def test_get_all_task_pages(test_todo):
+    db = test_begin()
+    db.add_all([Todo(task=f"Task {i}", note="", user_id="1", created_at=datetime(2031, 1, 1, 0, i)) for i in range(5)])
+    db.add(Todo(task="Not mine", note="", user_id="2"))
+    db.commit()
+    db.close()
+
+    seen, cursor = [], None
+    while True:
+        response = client.get("/todo/get-todo/all", params={"limit": 2, "fields": "task", **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == status.HTTP_200_OK
+        seen.extend(response.json()["todos"])
+        cursor = response.json()["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [{"task": "Trying to test out my todo test"}] + [{"task": f"Task {i}"} for i in range(5)]
+
+
+def test_get_all_task_bad_params(test_todo):
+    response = client.get("/todo/get-todo/all", params={"fields": "task,password"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {"detail": "Unknown fields: password"}
+
+    response = client.get("/todo/get-todo/all", params={"cursor": "not-a-cursor"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
 
 
 def test_get_task_id(test_todo):
-    response = client.get("/todo/get-todo/1")
+    response = client.get("/todo/get-todo/id/1")
     assert response.status_code == status.HTTP_200_OK
-    assert response.json() == {
-        "id": 1,
-        "task": "Trying to test out my todo test",
-        "completed": False,
-        "note": "This is kinda getting boring, Front-end sucks",
-        "due": "Today",
-        "user_id": 1
-    }
+    assert response.json()["task"] == "Trying to test out my todo test"
+    assert response.json()["user_id"] == "1"
 
 
 def test_get_task_id_fail(test_todo):
-    response = client.get("/todo/get-todo/9")
+    response = client.get("/todo/get-todo/id/9")
     assert response.status_code == status.HTTP_404_NOT_FOUND
-    assert response.json() == {"detail": "Todo not found"}
+    assert response.json() == {"detail": "Task not found"}
+
+
+def test_get_task_by_status(test_todo):
+    response = client.get("/todo/get-todo/status/false")
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == 1
 
 
 def test_create_todo(test_todo):
     todo_form = {
         "tasks": "Get it done",
         "note": "Getting things",
-        "due": "Wednesday",
     }
     response = client.post("/todo/create-todo", json=todo_form)
     assert response.status_code == status.HTTP_201_CREATED
@@ -52,13 +87,13 @@ def test_create_todo(test_todo):
 
 
 def test_update_todo(test_todo):
-    response = client.put("/todo/update-todo/complete-todo/1", params={"complete": True})
+    response = client.put("/todo/update-todo/complete-todo/1", params={"status": True})
     assert response.status_code == status.HTTP_202_ACCEPTED
     assert response.json() is None
 
 
 def test_update_todo_fail(test_todo):
-    response = client.put("/todo/update-todo/complete-todo/2", params={"complete": True})
+    response = client.put("/todo/update-todo/complete-todo/2", params={"status": True})
     assert response.status_code == status.HTTP_404_NOT_FOUND
     assert response.json() == {"detail": "Todo not found"}
 
@@ -67,7 +102,8 @@ def test_update_todo_details(test_todo):
     form = {
         "tasks": "Getting things done",
         "note": "Please get things done",
-        "due": "Monday"
+        "completed": True,
+        "due": "2030-02-01T00:00:00"
     }
     response = client.put("/todo/update-todo/details/1", json=form)
     assert response.status_code == status.HTTP_202_ACCEPTED
@@ -81,3 +117,157 @@ def test_delete_todo(test_todo):
 def test_delete_all_todo(test_todo):
     response = client.delete("/todo/delete/all/True")
     assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_bulk_create_todo(test_todo):
+    response = client.post("/todo/bulk", json=[{"tasks": f"Bulk {i}", "note": "Imported"} for i in range(3)])
+    assert response.status_code == status.HTTP_201_CREATED
+    results = response.json()["results"]
+    assert [item["result"] for item in results] == ["created"] * 3
+    assert len({item["id"] for item in results}) == 3
+
+    response = client.get("/todo/get-todo/all", params={"fields": "task"})
+    assert {"task": "Bulk 2"} in response.json()["todos"]
+
+
+def test_bulk_create_todo_limit(test_todo):
+    response = client.post("/todo/bulk", json=[])
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = client.post("/todo/bulk", json=[{"tasks": "Bulk", "note": ""}] * (BULK_TODO_LIMIT + 1))
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_bulk_update_todo(test_todo):
+    form = [
+        {"id": 1, "tasks": "Bulk updated", "note": "", "completed": True, "due": "2030-02-01T00:00:00"},
+        {"id": 9, "tasks": "Missing", "note": "", "completed": True, "due": "2030-02-01T00:00:00"},
+    ]
+    response = client.put("/todo/bulk", json=form)
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.json()["results"] == [
+        {"index": 0, "id": 1, "result": "updated"},
+        {"index": 1, "id": 9, "result": "not_found"},
+    ]
+
+    response = client.get("/todo/get-todo/id/1")
+    assert response.json()["task"] == "Bulk updated"
+    assert response.json()["status"] is True
+
+
+def test_bulk_complete_todo(test_todo):
+    response = client.put("/todo/bulk/complete", json=[{"id": 1, "completed": True}, {"id": 2, "completed": True}])
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert [item["result"] for item in response.json()["results"]] == ["updated", "not_found"]
+
+    response = client.get("/todo/get-todo/status/true")
+    assert [item["id"] for item in response.json()] == [1]
+
+
+def test_export_todo_ndjson(test_todo):
+    client.post("/todo/bulk", json=[{"tasks": f"Export {i}", "note": ""} for i in range(3)])
+
+    response = client.get("/todo/export")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["task"] for row in rows] == ["Trying to test out my todo test", "Export 0", "Export 1", "Export 2"]
+    assert rows[0]["due"] == "2030-01-01T00:00:00"
+
+
+def test_export_todo_csv(test_todo):
+    response = client.get("/todo/export", params={"format": "csv"})
+    assert response.status_code == status.HTTP_200_OK
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 1
+    assert rows[0]["task"] == "Trying to test out my todo test"
+    assert rows[0]["user_id"] == "1"
+
+    response = client.get("/todo/export", params={"format": "xml"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_import_todo_ndjson(test_todo):
+    lines = [json.dumps({"tasks": f"Imported {i}", "note": "From NDJSON"}) for i in range(5)]
+    lines.insert(2, "{not json")
+    lines.insert(4, json.dumps({"tasks": "x" * 60, "note": ""}))
+    upload = ("todos.ndjson", "\n".join(lines).encode(), "application/x-ndjson")
+
+    response = client.post("/todo/import", files={"file": upload}, params={"chunk_size": 2})
+    assert response.status_code == status.HTTP_200_OK
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event["line"] for event in events if event["event"] == "error"] == [3, 5]
+    assert [event["inserted"] for event in events if event["event"] == "progress"] == [2, 4]
+    assert events[-1] == {"event": "done", "rows": 7, "inserted": 5, "failed": 2}
+
+    response = client.get("/todo/get-todo/all", params={"fields": "task"})
+    assert len(response.json()["todos"]) == 6
+
+
+def test_import_todo_csv_round_trip(test_todo):
+    exported = client.get("/todo/export", params={"format": "csv"}).content
+
+    response = client.post("/todo/import", files={"file": ("todos.csv", exported, "text/csv")})
+    assert json.loads(response.text.splitlines()[-1]) == {"event": "done", "rows": 1, "inserted": 1, "failed": 0}
+
+    response = client.get("/todo/get-todo/name/Trying to test out my todo test")
+    assert len(response.json()) == 2
+
+
+def test_import_todo_atomic(test_todo):
+    upload = ("todos.csv", b"tasks,note\nGood,\n" + b"x" * 60 + b",\n", "text/csv")
+
+    response = client.post("/todo/import", files={"file": upload}, params={"atomic": True})
+    assert json.loads(response.text.splitlines()[-1]) == {"event": "done", "rows": 2, "inserted": 0, "failed": 1}
+
+    response = client.get("/todo/get-todo/all")
+    assert len(response.json()["todos"]) == 1
+
+
+def test_import_todo_unreadable(test_todo):
+    lines = [json.dumps({"tasks": f"Imported {i}", "note": "From NDJSON"}).encode() for i in range(3000)]
+    lines[-10] = b'{"tasks": "\xff\xfe", "note": ""}'
+    upload = ("todos.ndjson", b"\n".join(lines), "application/x-ndjson")
+
+    response = client.post("/todo/import", files={"file": upload}, params={"chunk_size": 100, "atomic": True})
+    assert response.status_code == status.HTTP_200_OK
+    last = json.loads(response.text.splitlines()[-1])
+    assert last["event"] == "aborted" and last["detail"].startswith("Unreadable upload")
+
+    response = client.get("/todo/get-todo/all")
+    assert len(response.json()["todos"]) == 1
+
+
+def test_get_todo_etag(test_user, test_todo):
+    response = client.get("/todo/get-todo/all")
+    etag = response.headers["etag"]
+    assert etag == '"1-0"'
+
+    response = client.get("/todo/get-todo/all", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = client.get("/todo/get-todo/id/1", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+def test_get_todo_etag_changes_on_write(test_user, test_todo):
+    etag = client.get("/todo/get-todo/status/false").headers["etag"]
+
+    client.put("/todo/update-todo/complete-todo/1", params={"status": True})
+
+    response = client.get("/todo/get-todo/status/true", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] == '"1-1"'
+    assert response.json()[0]["status"] is True
+
+
+def test_get_todo_etag_kept_when_bulk_matches_nothing(test_user, test_todo):
+    etag = client.get("/todo/get-todo/all").headers["etag"]
+
+    client.put("/todo/bulk", json=[{"id": 9, "tasks": "Missing", "note": "", "completed": True, "due": "2030-02-01T00:00:00"}])
+    client.put("/todo/bulk/complete", json=[{"id": 9, "completed": True}])
+
+    response = client.get("/todo/get-todo/all", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
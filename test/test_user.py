@@ -1,5 +1,10 @@
 from .utils import *
-from app.routers.user import get_user, get_db, authorization, authentication, jwt, timedelta, SECRET, Algorithm
+import time
+import asyncio
+import httpx
+from fastapi import HTTPException
+from api.config import get_user, get_db, authorization, authentication, revoke_sessions, otp_authentication, jwt, timedelta, SECRET, Algorithm
+from database.model_db import Otp
 from starlette import status
 
 app.dependency_overrides[get_db] = overide_get_db
@@ -12,12 +17,70 @@ def test_user_signup(test_user):
         "lastname": "Isong",
         "username": "Imiuwa2345",
         "email": "isongrichard2@gmail.com",
-        "password": hashed.hash("Imisioluwa234.")
+        "password": "Imisioluwa234."
     }
 
     response = client.post("/user/signup", json=form)
     assert response.status_code == status.HTTP_201_CREATED
-    assert response.json() == "User has been created successfully"
+    assert response.json() == {"message": "User Signed up sucessfully"}
+
+
+def test_user_signup_taken(test_user):
+    form = {
+        "firstname": "Imisioluwa",
+        "lastname": "Isong",
+        "username": "Imisioluwa23",
+        "email": "isongrichard234@gmail.com",
+        "password": "Imisioluwa234."
+    }
+
+    response = client.post("/user/signup", json=form)
+    assert response.status_code == status.HTTP_226_IM_USED
+    assert response.json() == {"detail": "username and email already in use!"}
+
+
+def test_user_signup_email_taken(test_user):
+    form = {
+        "firstname": "Imisioluwa",
+        "lastname": "Isong",
+        "username": "Imiuwa2345",
+        "email": "isongrichard234@gmail.com",
+        "password": "Imisioluwa234."
+    }
+
+    response = client.post("/user/signup", json=form)
+    assert response.status_code == status.HTTP_226_IM_USED
+    assert response.json() == {"detail": "email is already in use!"}
+
+
+@pytest.mark.asyncio
+async def test_user_signup_race(test_user):
+    forms = [{
+        "firstname": "Imisioluwa",
+        "lastname": "Isong",
+        "username": "Racer2345",
+        "email": f"racer{i}@gmail.com",
+        "password": "Imisioluwa234."
+    } for i in range(5)]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as racing:
+        responses = await asyncio.gather(*(racing.post("/user/signup", json=form) for form in forms))
+
+    assert sorted(response.status_code for response in responses) == [status.HTTP_201_CREATED] + [status.HTTP_226_IM_USED] * 4
+    assert {response.json()["detail"] for response in responses if response.status_code == status.HTTP_226_IM_USED} == {"username is already in use!"}
+
+
+def test_user_login(test_user):
+    response = client.post("/user/login", json={"username": "Imisioluwa23", "password": "Interstellar."})
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.json()["token_type"] == "bearer"
+
+
+def test_user_login_fail(test_user):
+    response = client.post("/user/login", json={"username": "Imisioluwa23", "password": "Interstellar"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert response.json() == {"detail": "Invalid username or password!"}
 
 
 def test_get_user_details(test_user):
@@ -35,12 +98,29 @@ def test_update_user(test_user):
     form = {
         "firstname": "Imisi",
         "lastname": "Emma",
-        "username": "Bankai",
+        "username": "Bankai2345",
         "email": "isongimisioluwa@gmail.com"
     }
     response = client.put("/user/update-user-details", json=form)
     assert response.status_code == status.HTTP_202_ACCEPTED
-    assert response.json() == "User details have been Updated successfully"
+    assert response.json() == {"message": "User details has been updated successfully."}
+
+
+def test_update_user_taken(test_user):
+    db = test_begin()
+    db.add(User(id="2", firstname="Other", lastname="User", username="Otheruser2", email="other@gmail.com", password="x"))
+    db.commit()
+    db.close()
+
+    form = {"firstname": "Imisi", "lastname": "Emma", "username": "Otheruser2", "email": "isongrichard234@gmail.com"}
+    response = client.put("/user/update-user-details", json=form)
+    assert response.status_code == status.HTTP_226_IM_USED
+    assert response.json() == {"detail": "username is already in use"}
+
+    form = {"firstname": "Imisi", "lastname": "Emma", "username": "Imisioluwa23", "email": "other@gmail.com"}
+    response = client.put("/user/update-user-details", json=form)
+    assert response.status_code == status.HTTP_226_IM_USED
+    assert response.json() == {"detail": "email is already in use"}
 
 
 def test_change_user_password(test_user):
@@ -49,67 +129,174 @@ def test_change_user_password(test_user):
         "new_password": "Interstellar23.",
         "confirm_password": "Interstellar23."
     }
-    response = client.put("/user/change-user-password", json=form)
+    response = client.put("/user/update-user-password", json=form)
     assert response.status_code == status.HTTP_202_ACCEPTED
-    assert response.json() == "Password has been Changed Successfully"
+    assert response.json() == {"message": "Password has been updated successfully"}
 
 
-def test_forgot_password(test_user):
+def test_change_user_password_wrong(test_user):
     form = {
-        "email": "isongrichard234@gmail.com",
-        "username": "Imisioluwa23",
-        "new_password": "Interstellar.",
-        "confirm_password": "Interstellar."
+        "password": "Interstellar.",
+        "new_password": "Interstellar23.",
+        "confirm_password": "Interstellar24."
     }
+    response = client.put("/user/update-user-password", json=form)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert response.json() == {"detail": "Password does not match"}
 
-    response = client.put("/user/forgot-password", json=form)
-    assert response.status_code == status.HTTP_202_ACCEPTED
-    assert response.json() == "User password has been updated successfully"
 
+def test_forgot_password(test_user, outbox):
+    response = client.request("GET", "/user/generate-otp", json={"email": "isongrichard234@gmail.com"})
+    assert response.status_code == status.HTTP_200_OK
+    assert len(outbox) == 1
+
+    db = test_begin()
+    otp = db.query(Otp).filter(Otp.user_id == test_user.id).first()
+    db.close()
+
+    response = client.request("GET", "/user/verify-otp", json={"otp": otp.otp, "email": "isongrichard234@gmail.com"})
+    assert response.status_code == status.HTTP_200_OK
+    assert jwt.decode(response.json()["token"], SECRET, algorithms=Algorithm)["id"] == test_user.id
 
-def test_forgot_password_wrong(test_user):
+    response = client.request("GET", "/user/verify-otp", json={"otp": otp.otp, "email": "isongrichard234@gmail.com"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {"detail": "Used otp!"}
+
+
+def test_reset_password(test_user):
+    token = otp_authentication(test_user.id)
     form = {
-        "email": "isongrichard234@gmail.com",
-        "username": "Imisioluwa23",
-        "new_password": "Interstellar.",
-        "confirm_password": "Interstellar"
+        "new_password": "Interstellar23.",
+        "confirm_password": "Interstellar23."
     }
 
-    response = client.put("/user/forgot-password", json=form)
-    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
-    assert response.json() == {"detail": "Password does not match"}
+    response = client.put("/user/change-user-password", json=form, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.json() == {"message": "Password Changed Successfully"}
 
 
 def test_delete_user(test_user):
-    response = client.delete("/user/delete-user")
-    assert response.status_code == status.HTTP_204_NO_CONTENT
+    response = client.get("/user/delete-user-request")
+    assert response.status_code == status.HTTP_200_OK
 
+    db = test_begin()
+    otp = db.query(Otp).filter(Otp.user_id == test_user.id).first()
+    db.close()
+
+    response = client.request("DELETE", "/user/delete-user", json={"otp": otp.otp})
+    assert response.status_code == status.HTTP_204_NO_CONTENT
 
-def test_authentication(test_user):
     db = test_begin()
+    assert db.query(User).filter(User.id == test_user.id).one().deleted_at is not None
+    db.close()
+
+    response = client.post("/user/login", json={"username": "Imisioluwa23", "password": "Interstellar."})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
 
-    authenticated = authorization(test_user.username, "Interstellar.", db)
+@pytest.mark.asyncio
+async def test_authentication(test_user):
+    db = SyncSession(test_begin())
+
+    authenticated = await authorization(test_user.username, "Interstellar.", db)
     assert authenticated is not None
     assert authenticated.username == test_user.username
+    await db.close()
 
 
 def test_access():
-    username = "Imisioluwa23"
-    user_id = 1
+    role = "user"
+    user_id = "1"
     expired = timedelta(minutes=15)
 
-    token = authentication(username, user_id, expired)
+    token = authentication(role, user_id, expired)
 
     decode = jwt.decode(token, SECRET, algorithms=Algorithm)
 
-    assert decode['sub'] == username
+    assert decode['sub'] == role
     assert decode['id'] == user_id
 
 
 @pytest.mark.asyncio
 async def test_get_user(test_user):
-    encode = {'sub': 'Imisioluwa23', 'id': 1}
-    token = jwt.encode(encode, SECRET, algorithm=Algorithm)
+    token = authentication("user", "1", timedelta(minutes=15))
 
     user = await get_user(token=token)
-    assert user == {"username": "Imisioluwa23", "user_id": 1}
+    assert user == {"role": "user", "user_id": "1"}
+
+
+@pytest.mark.asyncio
+async def test_get_user_cached(fresh_token_cache):
+    token = authentication("user", "1", timedelta(minutes=15))
+    hits = fresh_token_cache.hits.value
+
+    assert await get_user(token=token) == {"role": "user", "user_id": "1"}
+    assert await get_user(token=token) == {"role": "user", "user_id": "1"}
+    assert fresh_token_cache.hits.value == hits + 1
+
+
+@pytest.mark.asyncio
+async def test_password_reset_revokes_sessions(test_user, fresh_token_cache):
+    token = jwt.encode({'sub': 'user', 'id': test_user.id, 'iat': int(time.time()) - 5, 'exp': datetime.now() + timedelta(minutes=15)}, SECRET, algorithm=Algorithm)
+    otp_token = otp_authentication(test_user.id)
+    assert await get_user(token=token)
+
+    form = {
+        "new_password": "Interstellar23.",
+        "confirm_password": "Interstellar23."
+    }
+    response = client.put("/user/change-user-password", json=form, headers={"Authorization": f"Bearer {otp_token}"})
+    assert response.status_code == status.HTTP_202_ACCEPTED
+
+    with pytest.raises(HTTPException) as error:
+        await get_user(token=token)
+    assert error.value.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+async def test_revocation_covers_same_second_tokens(fresh_token_cache):
+    token = authentication("user", "1", timedelta(minutes=15))
+    assert await get_user(token=token)
+
+    await revoke_sessions("1")
+    with pytest.raises(HTTPException):
+        await get_user(token=token)
+
+    # Issued a few milliseconds after the revocation, so within the same second more often than not.
+    time.sleep(0.002)
+    assert await get_user(token=authentication("user", "1", timedelta(minutes=15)))
+
+
+@pytest.mark.asyncio
+async def test_revocation_shared_between_workers():
+    from api.token_cache import TokenCache, RedisRevocations
+
+    redis = FakeRedis()
+    worker_a, worker_b = TokenCache(revocations=RedisRevocations(redis)), TokenCache(revocations=RedisRevocations(redis))
+    claims = {"id": "1", "iat": time.time(), "exp": time.time() + 60}
+    assert not await worker_b.is_revoked(claims)
+
+    await worker_a.revoke_user("1")
+    assert await worker_b.is_revoked(claims)
+
+
+def test_deleted_account_cannot_write(test_user):
+    db = test_begin()
+    db.query(User).filter(User.id == "1").update({"deleted_at": datetime.now()})
+    db.commit()
+    db.close()
+
+    response = client.post("/todo/create-todo", json={"tasks": "Written after deletion", "note": ""})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_token_cache_bounded():
+    from api.token_cache import TokenCache
+
+    cache = TokenCache(maxsize=2)
+    for i in range(3):
+        cache.put(f"token{i}", {"id": str(i), "exp": time.time() + 60})
+
+    assert cache.get("token0") is None
+    assert cache.get("token2")["id"] == "2"
+    assert cache.get("token3") is None
@@ -1,35 +1,119 @@
+import os
+import time
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("ASYNC_DATABASE", "false")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("SCHEME", "bcrypt")
+
+from datetime import datetime, timedelta
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
-from app.schemas.database import data
-from app.schemas.model_db import Todo, User
+from sqlalchemy.pool import StaticPool, NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from database.database import SyncSession, ASYNC_DATABASE
+from database import migrations
+from database.model_db import Todo, User
 import pytest
-from app.main import app
+from api.main import app
 from fastapi.testclient import TestClient
-from app.routers.user import hashed
+from api.config import hashed
 
-database = "sqlite:///testdb.sqlite"
-engine = create_engine(
-    database,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool
-)
+if ASYNC_DATABASE:
+    # ASYNC_DATABASE=true runs the suite through AsyncSession on aiosqlite, fixtures keep seeding
+    # through a sync engine so both share one file database.
+    database = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+    engine = create_engine(database, connect_args={"check_same_thread": False})
+    # TestClient runs each request on its own event loop, so no aiosqlite connection is pooled across them.
+    async_engine = create_async_engine(database.replace("sqlite://", "sqlite+aiosqlite://"), poolclass=NullPool)
+    async_test_begin = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    session_engine = async_engine.sync_engine
+else:
+    database = "sqlite://"
+    engine = create_engine(
+        database,
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    session_engine = engine
 
 test_begin = sessionmaker(bind=engine, autocommit=False, autoflush=False)
-data.metadata.create_all(bind=engine)
+with engine.begin() as connection:
+    migrations.upgrade(connection)
 
 
-def overide_get_db():
-    db = test_begin()
+async def overide_get_db():
+    if ASYNC_DATABASE:
+        async with async_test_begin() as db:
+            yield db
+        return
+
+    db = SyncSession(test_begin())
     try:
         yield db
 
     finally:
-        db.close
+        await db.close()
 
 
 def overide_get_user():
-    return {"username": "Imisioluwa23", "user_id": 1}
+    return {"role": "user", "user_id": "1"}
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio.Redis for the Redis backends, bytes values with expiry.
+
+    The rate limit and OTP scripts are run in Python here, test_redis_scripts runs the real Lua.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+
+    def live(self, key):
+        value, expires = self.values.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            self.values.pop(key)
+            return None
+        return value
+
+    async def get(self, key):
+        return self.live(key)
+
+    async def set(self, key, value, ex=None):
+        value = value if isinstance(value, bytes) else str(value).encode()
+        self.values[key] = (value, time.monotonic() + ex if ex is not None else None)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    async def eval(self, script, numkeys, *args):
+        keys, argv = args[:numkeys], args[numkeys:]
+        if "HMGET" in script:
+            return self.take_buckets(keys, argv)
+        assert "KEEPTTL" in script and numkeys == 1
+        return self.consume_code(keys[0], argv[0])
+
+    def take_buckets(self, keys, rates):
+        from api.ratelimit import take
+        now = time.monotonic()
+        states = [(*self.hashes.get(key, (rates[2 * i], now)), rates[2 * i], rates[2 * i + 1]) for i, key in enumerate(keys)]
+        levels, waits = take(states, now)
+        for key, tokens in zip(keys, levels):
+            self.hashes[key] = (tokens, now)
+        return [str(wait).encode() for wait in waits]
+
+    def consume_code(self, key, code):
+        value = self.live(key)
+        if value is None or value[2:].decode() != code:
+            return b"invalid"
+        if value.startswith(b"1:"):
+            return b"used"
+        self.values[key] = (b"1:" + code.encode(), self.values[key][1])
+        return b"valid"
 
 
 client = TestClient(app)
@@ -40,10 +124,10 @@ def test_todo():
     todo = Todo(
         id=1,
         task="Trying to test out my todo test",
-        completed=False,
-        note="This is kinda getting boring, Front-end sucks",
-        due="Today",
-        user_id=1,
+        status=False,
+        note="This is kinda getting boring",
+        due=datetime(2030, 1, 1),
+        user_id="1",
     )
 
     db = test_begin()
@@ -58,7 +142,7 @@ def test_todo():
 @pytest.fixture
 def test_user():
     user = User(
-        id=1,
+        id="1",
         firstname="Imisioluwa",
         lastname="Isong",
         username="Imisioluwa23",
@@ -71,5 +155,34 @@ def test_user():
     db.commit()
     yield user
     with engine.connect() as connection:
+        connection.execute(text("DELETE FROM 'Otp';"))
         connection.execute(text("DELETE FROM 'User';"))
         connection.commit()
+
+
+@pytest.fixture(autouse=True)
+def outbox(monkeypatch):
+    sent = []
+    monkeypatch.setattr("api.config.send_email", lambda *args: sent.append(args))
+    yield sent
+
+
+@pytest.fixture(autouse=True)
+def fresh_token_cache():
+    from api.token_cache import token_cache
+    token_cache.clear()
+    yield token_cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_todo_cache(monkeypatch):
+    from api.todo_cache import todo_cache, MemoryBackend
+    monkeypatch.setattr(todo_cache, "backend", MemoryBackend())
+    yield todo_cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limits(monkeypatch):
+    from api.ratelimit import limiter, MemoryBackend
+    monkeypatch.setattr(limiter, "backend", MemoryBackend())
+    yield limiter